@@ -2,7 +2,11 @@
 https://github.com/slacgismo/speech/tree/main.
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 import pandas as pd
+from sg2t.utils.accumulators import RunningMoments, RunningQuantiles
 from sg2t.transportation.speech import DataSetConfigurations
 from sg2t.transportation.speech import SPEECh
 from sg2t.transportation.speech import SPEEChGeneralConfiguration
@@ -16,15 +20,18 @@ class EV:
         self.dataset = 'Original16' # 'NewData' not implemented yet
         self.path_to_data = 'inputs/'
         self.ng = 16 # default number of groups for Original16 dataset
+        self.use_manifest = False # cache the data set files in SG2T_CACHE, see DataSetManifest
         self.g_weights = None # weight for each group
         # self.b_weights = None # weight for each behavior
         self.config = None
         self.loadshapes = None
+        self.ensemble = None # summary of the hourly loadshapes of an ensemble
+        self.ensemble_peaks = None # summary of the daily peaks of an ensemble
 
     def create_config(self):
         data = DataSetConfigurations(self.dataset, ng=self.ng,
                                      path_to_data=self.path_to_data)
-        model = SPEECh(data)
+        model = SPEECh(data, use_manifest=self.use_manifest)
         self.config = SPEEChGeneralConfiguration(model)
         return self.config
 
@@ -52,7 +59,155 @@ class EV:
 
         return self.config
 
-    def generate_loads(self, config=None):
+    def generate_loads(self, config=None, expected=False):
+        """Loadshapes of one day, hourly.
+
+        Parameters
+        ----------
+        config : SPEEChGeneralConfiguration
+            Configuration to use, optional. Created if not given.
+
+        expected : bool
+            Calculate the expected (mean) load from the GMMs instead of
+            sampling one realization, default is False. The expected load
+            is deterministic: use generate_ensemble for seeded, parallel
+            realizations.
+
+        Returns
+        -------
+        loadshapes : pd.DataFrame
+            Load of each charging segment in kW, indexed by "Hour". Also
+            stored in self.loadshapes.
+        """
+        self._set_up_config(config)
+
+        self.config.run_all(weekday=self.weekday_option, expected=expected)
+
+        self.loadshapes = self._format_data(self.config.total_load_dict)
+
+        return self.loadshapes
+
+    def generate_days(self, start, end, freq="1h", seed=None, chunk_days=7, config=None):
+        """Loadshapes over consecutive days, e.g. a year-long 8760 (hourly)
+        or 35040 (15-minute) EV load.
+
+        Each day is simulated as a weekday or a weekend day according to its
+        date, and sessions going on past midnight are carried over into the
+        next day (see SPEEChGeneralConfiguration.iter_days). Days are
+        simulated chunk_days at a time and averaged to freq as they finish.
+
+        Parameters
+        ----------
+        start, end : str or pd.Timestamp
+            First and last day, e.g. "2023-01-01" and "2023-12-31".
+
+        freq : str
+            Frequency of the loadshapes, a multiple of the time step of the
+            simulation that divides a day, default is "1h".
+
+        seed : int
+            Seed of the simulation, optional.
+
+        chunk_days : int
+            Number of days simulated at a time, default is 7.
+
+        config : SPEEChGeneralConfiguration
+            Configuration to use, optional. Created if not given.
+
+        Returns
+        -------
+        loadshapes : pd.DataFrame
+            Load of each charging segment in kW, with a pd.DatetimeIndex
+            named "Datetime" at freq. Also stored in self.loadshapes.
+        """
+        dates = pd.date_range(start, end, freq="D")
+        if not len(dates):
+            raise ValueError("End has to be on or after start.")
+        self._set_up_config(config)
+
+        steps = pd.Timedelta(freq) / (pd.Timedelta(hours=1) / self.config.time_steps_per_hour)
+        if steps != int(steps) or self.config.num_time_steps % int(steps):
+            raise ValueError("Frequency has to be a multiple of the time step that divides a day.")
+        steps = int(steps)
+
+        chunks = []
+        for load in self.config.iter_days(dates, seed=seed, chunk_days=chunk_days):
+            chunks.append(load.reshape(-1, steps, load.shape[1]).mean(axis=1))
+        loads = np.concatenate(chunks)
+        index = pd.date_range(dates[0], periods=len(loads), freq=freq, name="Datetime")
+        self.loadshapes = pd.DataFrame(loads, index=index, columns=list(self.config.speech.data.labels))
+        return self.loadshapes
+
+    def generate_ensemble(self, n_realizations=100, seed=None, quantiles=(0.1, 0.5, 0.9),
+                          config=None, max_workers=None):
+        """Monte Carlo ensemble of loadshapes: run n_realizations seeded
+        realizations of the model and summarize their hourly loadshapes.
+
+        Each realization gets its own independent random stream
+        (np.random.SeedSequence.spawn), which draws the session numbers of
+        every driver group again and samples the sessions (see
+        SPEEChGeneralConfiguration.run_realization), so results for a given
+        seed don't depend on max_workers. Realizations are simulated in
+        parallel and added to running moment and quantile accumulators in
+        order, and aren't kept.
+
+        Parameters
+        ----------
+        n_realizations : int
+            Number of realizations, default is 100.
+
+        seed : int
+            Seed of the ensemble, optional.
+
+        quantiles : sequence of float
+            Quantiles of the uncertainty bands, default is P10/P50/P90.
+            Quantiles are estimated with the P-square algorithm
+            (see RunningQuantiles).
+
+        config : SPEEChGeneralConfiguration
+            Configuration to use, optional. Created if not given.
+
+        max_workers : int
+            Number of realizations simulated at the same time, optional.
+
+        Returns
+        -------
+        ensemble : pd.DataFrame
+            Hourly summary, indexed by "Hour", with columns
+            (segment, statistic) for every charging segment and the "Total",
+            where the statistics are "mean", "std", "min", "max" and the
+            quantiles (e.g. "p10"). Also stored in self.ensemble, and the
+            same summary of the daily peak of the hourly loadshapes is stored
+            in self.ensemble_peaks, indexed by segment.
+        """
+        if n_realizations < 1:
+            raise ValueError("Number of realizations must be at least 1.")
+        self._set_up_config(config)
+
+        labels = list(self.config.speech.data.labels)
+        moments, bands = RunningMoments(), RunningQuantiles(quantiles)
+        peak_moments, peak_bands = RunningMoments(), RunningQuantiles(quantiles)
+        seeds = np.random.SeedSequence(seed).spawn(n_realizations)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            realizations = executor.map(self.config.run_realization, [self.weekday_option] * n_realizations, seeds)
+            for total_load_dict in realizations:
+                hourly = self._hourly(total_load_dict, labels)
+                moments.update(hourly)
+                bands.update(hourly)
+                peak_moments.update(hourly.max(axis=0))
+                peak_bands.update(hourly.max(axis=0))
+
+        segments = labels + ["Total"]
+        stats = self._statistics(moments, bands)
+        columns = pd.MultiIndex.from_product([segments, list(stats)], names=["Segment", "Statistic"])
+        self.ensemble = pd.DataFrame(np.stack(list(stats.values()), axis=-1).reshape(24, -1),
+                                     index=pd.Index(np.arange(24), name="Hour"), columns=columns)
+        stats = self._statistics(peak_moments, peak_bands)
+        self.ensemble_peaks = pd.DataFrame(np.column_stack(list(stats.values())),
+                                           index=pd.Index(segments, name="Segment"), columns=list(stats))
+        return self.ensemble
+
+    def _set_up_config(self, config=None):
         if not config:
             self.config = self.create_config()
         else:
@@ -67,11 +222,16 @@ class EV:
         # if self.b_weights: # TODO
         #     self.change_ps_zg()
 
-        self.config.run_all(weekday=self.weekday_option)
+    def _hourly(self, loadshapes, labels):
+        """Hourly mean of the segment loadshapes and their total, shaped (24, segments + 1)."""
+        loads = np.column_stack([loadshapes[label] for label in labels])
+        loads = np.column_stack([loads, loads.sum(axis=1)])
+        return loads.reshape(24, -1, loads.shape[1]).mean(axis=1)
 
-        self.loadshapes = self._format_data(self.config.total_load_dict)
-
-        return self.loadshapes
+    def _statistics(self, moments, bands):
+        stats = {"mean": moments.mean, "std": moments.std, "min": moments.min, "max": moments.max}
+        stats.update((f"p{100 * q:g}", val) for q, val in zip(bands.quantiles, bands.result()))
+        return stats
 
     def _format_data(self, loadshapes):
         loadshapes = pd.DataFrame.from_dict(loadshapes)
@@ -81,6 +241,6 @@ class EV:
         )
         loadshapes.set_index('Datetime', inplace=True)
         loadshapes = loadshapes.resample('h').mean()
-        loadshapes["Hour"] = pd.date_range("00:00", "23:45", freq="1H").hour
+        loadshapes["Hour"] = pd.date_range("00:00", "23:45", freq="1h").hour
         loadshapes.set_index('Hour', inplace=True)
         return loadshapes
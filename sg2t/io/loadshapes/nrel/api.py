@@ -5,19 +5,26 @@ https://data.openei.org/s3_viewer?bucket=oedi-data-lake
 """
 
 import io
+import os
+import tempfile
 import boto3
+import pyarrow.parquet as pq
 from botocore import UNSIGNED
 from botocore.client import Config
 import pandas as pd
 
 from sg2t.config import load_config
+from sg2t.io.loadshapes.nrel.cache import APICache
+from sg2t.utils.cube import LoadshapeCube
 
 
 class API():
     def __init__(self,
                 # source: str,
                  config_name = "config.ini",
-                 config_key = "io.nrel.api"
+                 config_key = "io.nrel.api",
+                 cache = None,
+                 float32 = None
                  ):
         """ API object initialization.
 
@@ -28,11 +35,21 @@ class API():
 
         config_name : str
             Name of configuration file in sg2t.config or cache directory to obtain API path settings.
+
+        cache : APICache
+            On-disk cache for pulled files, optional. If not given, one is created
+            with the settings in config_name.
+
+        float32 : bool
+            If True, energy columns are stored and returned as float32 instead
+            of float64, optional. Defaults to the float32 config setting.
         """
         self.source = None
         self.config_name = config_name
         self.config_key = config_key
         self.config = self.load_config(self.config_name, self.config_key)
+        self.cache = cache if cache is not None else APICache(config_name=self.config_name)
+        self.float32 = self.config.get("float32", False) if float32 is None else float32
         # API paths
         self.paths_amy_2018_v1 = {
             "end_use_loads": "https://oedi-data-lake.s3.amazonaws.com/"
@@ -73,9 +90,86 @@ class API():
         """
         return load_config(config_name, key)
 
+    def _read_data(self, url, key, index_col, columns=None, cube=False):
+        """Read data from the cache, pulling the CSV from the API first if needed.
+
+        The first time a CSV is read it's converted to a Parquet file next to it
+        in the cache, and the data is served from that file afterwards. This cuts
+        the read time, not the disk space: the CSV is kept in the cache entry (its
+        checksum is validated and the float32 copy is converted from it), so the
+        Parquet files and cube add to its size (see max_size_mb in config.ini).
+
+        PARAMETERS
+        ----------
+        url : str
+            URL of the CSV file.
+
+        key : str
+            Cache key of the file.
+
+        index_col : int
+            Position of the timestamp column in the CSV.
+
+        columns : list of str
+            Columns to read, optional. All columns are read if not given,
+            columns that are not in the data are ignored.
+
+        cube : bool
+            If True, the LoadshapeCube of the data is returned instead. It's built
+            the first time and stored in the cache next to the data.
+
+        RETURNS
+        -------
+        df : pd.DataFrame
+            Data with a pd.DatetimeIndex (or LoadshapeCube if cube).
+        """
+        try:
+            filename = self.cache.fetch(url, key)
+        except Exception as err:
+            raise Exception(f"{err} (URL='{url}')")
+
+        suffix = ".float32.parquet" if self.float32 else ".parquet"
+        parquet_filename = os.path.splitext(filename)[0] + suffix
+        if not os.path.exists(parquet_filename):
+            self._to_parquet(filename, parquet_filename, index_col)
+
+        if cube:
+            return LoadshapeCube.cached(parquet_filename)
+
+        if columns is not None:
+            # Only read the requested columns that exist (the index is always read)
+            schema = pq.read_schema(parquet_filename)
+            index_cols = schema.pandas_metadata["index_columns"]
+            columns = [col for col in columns if col in schema.names and col not in index_cols]
+        return pd.read_parquet(parquet_filename, columns=columns)
+
+    def _to_parquet(self, filename, parquet_filename, index_col):
+        """Convert pulled CSV to Parquet, with the timestamps parsed as the index."""
+        df = pd.read_csv(filename, index_col=index_col)
+        df.index = pd.to_datetime(df.index)
+        if self.float32:
+            energy_cols = [col for col in df.columns
+                           if col.startswith("out.") and df[col].dtype == "float64"]
+            df[energy_cols] = df[energy_cols].astype("float32")
+
+        # Write then rename so readers never see a partial file
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(parquet_filename), suffix=".part")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_filename)
+            os.replace(tmp_filename, parquet_filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+    def _key(self, source, aggregation, upgrade, geography, building_type):
+        """Cache key for a file of the given source ("resstock" or "comstock")."""
+        release = self.paths_amy_2018_v1[source].strip("/").split("/")[-1]
+        return self.cache.make_key(release, aggregation, upgrade, geography, building_type)
+
     # TODO: validate that options exist in class attribute sets
-    def get_data_resstock_by_climatezone(self, climate, home_type, upgrade=0):
-        """Pulls CSV"""
+    def get_data_resstock_by_climatezone(self, climate, home_type, upgrade=0, columns=None, cube=False):
+        """Pulls CSV, only returning the given columns if any (or its LoadshapeCube if cube)"""
         climate_zone = climate.title()
 
         # for some reason "Very Cold" climate zone naming is set up differently
@@ -83,8 +177,6 @@ class API():
             climate = "very_cold"
             climate_zone = "Very%20Cold"
 
-        # TODO: check if in cache, if not, pull from AWS
-        # TODO: save tp cache after pulling
         filename = f"up{upgrade:02}-{climate}-{home_type}.csv"
         timeseries_aggregate_climate = f"timeseries_aggregates/" \
                                        f"by_building_america_climate_zone/" \
@@ -96,12 +188,11 @@ class API():
         url =  self.paths_amy_2018_v1["end_use_loads"] +\
                self.paths_amy_2018_v1["resstock"] + \
                timeseries_aggregate_climate
-        df = pd.read_csv(url, index_col=3)
-        df.index = pd.to_datetime(df.index)
-        return df
+        key = self._key("resstock", "by_building_america_climate_zone", upgrade, climate, home_type)
+        return self._read_data(url, key, index_col=3, columns=columns, cube=cube)
 
-    def get_data_resstock_by_climatezone_iecc(self, climate, home_type, upgrade=0):
-        """Pulls CSV"""
+    def get_data_resstock_by_climatezone_iecc(self, climate, home_type, upgrade=0, columns=None, cube=False):
+        """Pulls CSV, only returning the given columns if any (or its LoadshapeCube if cube)"""
 
         filename = f"up{upgrade:02}-{climate.lower()}-{home_type}.csv"
         timeseries_aggregate_climate = f"timeseries_aggregates/" \
@@ -114,12 +205,11 @@ class API():
                self.paths_amy_2018_v1["resstock"] + \
                timeseries_aggregate_climate
 
-        df = pd.read_csv(url, index_col=3)
-        df.index = pd.to_datetime(df.index)
-        return df
+        key = self._key("resstock", "by_ashrae_iecc_climate_zone_2004", upgrade, climate.upper(), home_type)
+        return self._read_data(url, key, index_col=3, columns=columns, cube=cube)
 
-    def get_data_resstock_by_state(self, state, home_type, upgrade=0):
-        """Pulls CSV"""
+    def get_data_resstock_by_state(self, state, home_type, upgrade=0, columns=None, cube=False):
+        """Pulls CSV, only returning the given columns if any (or its LoadshapeCube if cube)"""
         state = state.upper()
 
         filename = f"up{upgrade:02}-{state.lower()}-{home_type}.csv"
@@ -133,16 +223,12 @@ class API():
         url =  self.paths_amy_2018_v1["end_use_loads"] +\
                self.paths_amy_2018_v1["resstock"] + \
                timeseries_aggregate_state
-        try:
-            df = pd.read_csv(url, index_col=3)
-        except Exception as err:
-            raise Exception(f"{err} (URL='{url}')")
-        df.index = pd.to_datetime(df.index)
-        return df
+        key = self._key("resstock", "by_state", upgrade, state, home_type)
+        return self._read_data(url, key, index_col=3, columns=columns, cube=cube)
 
     # TODO: update comstock API calls (only state one is updated)
-    def get_data_comstock_by_climatezone(self, climate, building_type, upgrade=0):
-        """Pulls CSV"""
+    def get_data_comstock_by_climatezone(self, climate, building_type, upgrade=0, columns=None, cube=False):
+        """Pulls CSV, only returning the given columns if any (or its LoadshapeCube if cube)"""
         climate = climate.lower()
 
         # for some reason "Very Cold" climate zone naming is set up differently
@@ -157,12 +243,11 @@ class API():
         url = self.paths_amy_2018_v1["end_use_loads"] +\
               self.paths_amy_2018_v1["comstock"] +\
               timeseries_aggregate_climate
-        df = pd.read_csv(url, index_col=2)
-        df.index = pd.to_datetime(df.index)
-        return df
+        key = self._key("comstock", "by_building_america_climate_zone", upgrade, climate, building_type)
+        return self._read_data(url, key, index_col=2, columns=columns, cube=cube)
 
-    def get_data_comstock_by_climatezone_iecc(self, climate, building_type, upgrade=0):
-        """Pulls CSV"""
+    def get_data_comstock_by_climatezone_iecc(self, climate, building_type, upgrade=0, columns=None, cube=False):
+        """Pulls CSV, only returning the given columns if any (or its LoadshapeCube if cube)"""
         
         filename = f"up{upgrade:00}-{climate.lower()}-{building_type}.csv"
         timeseries_aggregate_climate = f"timeseries_aggregates/" \
@@ -173,12 +258,11 @@ class API():
               self.paths_amy_2018_v1["comstock"] +\
               timeseries_aggregate_climate
 
-        df = pd.read_csv(url, index_col=2)
-        df.index = pd.to_datetime(df.index)
-        return df
+        key = self._key("comstock", "by_ashrae_iecc_climate_zone_2004", upgrade, climate.upper(), building_type)
+        return self._read_data(url, key, index_col=2, columns=columns, cube=cube)
 
-    def get_data_comstock_by_state(self, state, building_type, upgrade=0):
-        """Pulls CSV"""
+    def get_data_comstock_by_state(self, state, building_type, upgrade=0, columns=None, cube=False):
+        """Pulls CSV, only returning the given columns if any (or its LoadshapeCube if cube)"""
         state = state.upper()
 
         filename = f"up{upgrade:02}-{state.lower()}-{building_type}.csv"
@@ -192,13 +276,5 @@ class API():
         url =  self.paths_amy_2018_v1["end_use_loads"] +\
                self.paths_amy_2018_v1["comstock"] + \
                timeseries_aggregate_state
-        df = pd.read_csv(url, index_col=3)
-        df.index = pd.to_datetime(df.index)
-        return df
-
-api = API()
-df = api.get_data_resstock_by_state(state='CA', home_type='single-family_detached')
-
-from sg2t.utils.timeseries import Timeseries
-
-df_agg = Timeseries.timeseries_aggregate(df, aggregation='avg', month_start=1, month_end=2)
+        key = self._key("comstock", "by_state", upgrade, state, building_type)
+        return self._read_data(url, key, index_col=3, columns=columns, cube=cube)
@@ -0,0 +1,406 @@
+"""
+Module for caching files pulled by the NREL API on local disk.
+
+Each downloaded file is stored under the sg2t cache directory
+(os.environ["SG2T_CACHE"]) in its own entry directory, keyed by
+(release, aggregation level, upgrade, geography, building type):
+
+    <cache>/<directory>/<release>/<aggregation>/upgrade=<upgrade>/<geography>/<building_type>/
+
+Files derived from the download (e.g. converted or aggregated data) can be
+stored in the same entry directory so that they are evicted together with
+the source file.
+
+An index (index.json) keeps the ETag/Last-Modified headers of every entry
+for revalidation with the server, the size and sha256 of the downloaded
+file for content validation and the last access time for LRU eviction.
+The size is checked every time a file is served, the sha256 when a file is
+revalidated with the server or served offline, so a corrupted copy is
+downloaded again (or reported offline) instead of being served.
+
+The index is updated under a lock file (index.lock, with fcntl) so several
+processes (e.g. batch jobs) can share a cache directory. Where fcntl is not
+available (Windows), only the threads of a single process are synchronized.
+"""
+
+import os
+import json
+import contextlib
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+import warnings
+import urllib.error
+import urllib.request
+
+from sg2t.config import load_config
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: the index is only locked within the process
+    fcntl = None
+
+
+# Settings used when the config file has no (or a partial) cache section
+DEFAULT_CONFIG = {
+    "directory": "nrel",
+    "max_size_mb": 2048,
+    "max_age": 86400,
+    "offline": False,
+}
+
+# Index updates are shared between all cache objects of the process
+_index_lock = threading.RLock()
+# Lock files held by the process (by path), with the number of nested holds
+_index_files = {}
+# Concurrent fetches of the same entry wait for a single download
+_entry_locks = {}
+
+
+class APICache():
+    """On-disk cache for files pulled from the NREL API.
+
+    Methods:
+        - fetch (returns local path of a remote file, downloading if needed)
+        - entry_dir
+        - entry
+        - evict
+        - clear
+    """
+    def __init__(self,
+                 config_name="config.ini",
+                 config_key="io.nrel.cache",
+                 cache_dir=None,
+                 max_size_mb=None,
+                 max_age=None,
+                 offline=None,
+                 ):
+        """ APICache object initialization.
+
+        Parameters
+        ----------
+        config_name : str
+            Name of configuration file in sg2t.config or cache directory to obtain
+            cache settings.
+
+        config_key : str
+            Key in config corresponding to this class. Settings missing from
+            the config (or the whole section) take the values in DEFAULT_CONFIG.
+
+        cache_dir : str
+            Root directory of the cache, optional. Defaults to the configured
+            sub-directory of os.environ["SG2T_CACHE"].
+
+        max_size_mb : float
+            Maximum size of the cache in MB, optional. Least recently used
+            entries are evicted once it is exceeded.
+
+        max_age : float
+            Number of seconds a cached file is served without revalidating it
+            with the server, optional.
+
+        offline : bool
+            If True, only files already in the cache are served and the
+            network is never accessed, optional.
+        """
+        try:
+            config = load_config(config_name, config_key)
+        except KeyError:
+            # Config files written before the cache existed have no cache section
+            config = None
+        self.config = {**DEFAULT_CONFIG, **(config or {})}
+        if cache_dir is None:
+            cache_dir = os.path.join(os.environ["SG2T_CACHE"], self.config["directory"])
+        self.cache_dir = os.path.abspath(cache_dir)
+        self.max_size_mb = self.config["max_size_mb"] if max_size_mb is None else max_size_mb
+        self.max_age = self.config["max_age"] if max_age is None else max_age
+        self.offline = self.config["offline"] if offline is None else offline
+        self.index_filename = os.path.join(self.cache_dir, "index.json")
+        self.lock_filename = os.path.join(self.cache_dir, "index.lock")
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(release, aggregation, upgrade, geography, building_type):
+        """Make the cache key of a file.
+
+        PARAMETERS
+        ----------
+        release : str
+            Data release, e.g. "resstock_amy2018_release_1".
+
+        aggregation : str
+            Aggregation level, e.g. "by_state".
+
+        upgrade : int
+            Upgrade number.
+
+        geography : str
+            State or climate zone.
+
+        building_type : str
+            Home or building type.
+
+        RETURNS
+        -------
+        key : str
+            Key of the entry, which is also its path relative to the cache root.
+        """
+        return "/".join([str(release), str(aggregation), f"upgrade={upgrade}",
+                         str(geography), str(building_type)])
+
+    def entry_dir(self, key):
+        """Absolute path to the directory holding the files of an entry."""
+        return os.path.join(self.cache_dir, *key.split("/"))
+
+    def entry(self, key):
+        """Get the index record of an entry.
+
+        RETURNS
+        -------
+        entry : dict
+            Record with the url, filename, etag, last_modified, size, sha256,
+            fetched and accessed fields, or None if the key is not cached.
+        """
+        with self._locked():
+            return self._load_index().get(key)
+
+    def fetch(self, url, key):
+        """Get the local path of a remote file, pulling it from the server
+        only if it's not in the cache or it has changed.
+
+        PARAMETERS
+        ----------
+        url : str
+            URL of the file.
+
+        key : str
+            Cache key of the file, see `make_key`.
+
+        RETURNS
+        -------
+        filename : str
+            Full path to the cached file.
+        """
+        with _index_lock:
+            lock = _entry_locks.setdefault((self.cache_dir, key), threading.Lock())
+        with lock:
+            return self._fetch(url, key)
+
+    def evict(self, keep=None):
+        """Remove least recently used entries until the cache is under
+        its maximum size.
+
+        PARAMETERS
+        ----------
+        keep : str
+            Key of an entry that should never be evicted, optional.
+        """
+        max_size = self.max_size_mb * 1024 * 1024
+        with self._locked():
+            index = self._load_index()
+            sizes = {key: self._dir_size(self.entry_dir(key)) for key in index}
+            total = sum(sizes.values())
+            for key in sorted(index, key=lambda k: index[k]["accessed"]):
+                if total <= max_size:
+                    break
+                if key == keep:
+                    continue
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+                total -= sizes[key]
+                del index[key]
+            self._save_index(index)
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._locked():
+            for key in self._load_index():
+                shutil.rmtree(self.entry_dir(key), ignore_errors=True)
+            self._save_index({})
+
+    def _fetch(self, url, key):
+        """Get the local path of a remote file, see `fetch`."""
+        with self._locked():
+            entry = self._load_index().get(key)
+        filename = self._valid_filename(key, entry)
+
+        if filename and not self.offline and time.time() - entry["fetched"] < self.max_age:
+            self._touch(key)
+            return filename
+
+        # Check the content before serving it offline or keeping it on revalidation
+        if filename and not self._valid_digest(filename, entry):
+            warnings.warn(f"Cached file does not match its checksum (URL='{url}')")
+            filename = None
+
+        if self.offline:
+            if filename:
+                self._touch(key)
+                return filename
+            raise FileNotFoundError("File not in cache (or corrupted) and offline mode is on.")
+
+        try:
+            self._download(url, key, entry if filename else None)
+        except (urllib.error.URLError, OSError) as err:
+            if not filename:
+                raise
+            # Serve the stale copy if the server can't be reached
+            warnings.warn(f"Could not revalidate cached file ({err}), "
+                          f"using cached copy (URL='{url}')")
+            self._touch(key)
+            return filename
+
+        self.evict(keep=key)
+        return self._valid_filename(key, self.entry(key))
+
+    def _download(self, url, key, entry=None):
+        """Pull file from the server into the cache. If an entry is given,
+        the request is conditional on the file having changed since."""
+        request = urllib.request.Request(url)
+        if entry:
+            if entry.get("etag"):
+                request.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.add_header("If-Modified-Since", entry["last_modified"])
+
+        try:
+            response = urllib.request.urlopen(request)
+        except urllib.error.HTTPError as err:
+            if err.code == 304 and entry:
+                # Not modified: the cached copy is still valid
+                entry["fetched"] = entry["accessed"] = time.time()
+                self._update_entry(key, entry)
+                return
+            raise
+
+        entry_dir = self.entry_dir(key)
+        os.makedirs(entry_dir, exist_ok=True)
+        filename = os.path.basename(urllib.request.urlparse(url).path)
+        sha256 = hashlib.sha256()
+        size = 0
+        with response:
+            fd, tmp_filename = tempfile.mkstemp(dir=entry_dir, suffix=".part")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    for chunk in iter(lambda: response.read(1 << 20), b""):
+                        sha256.update(chunk)
+                        size += len(chunk)
+                        f.write(chunk)
+                length = response.headers.get("Content-Length")
+                if length is not None and int(length) != size:
+                    raise IOError(f"Incomplete download: got {size} of {length} bytes (URL='{url}')")
+                now = time.time()
+                with self._locked():
+                    # Old copy and files derived from it are no longer valid
+                    # (downloads in progress in other processes are left alone)
+                    for name in os.listdir(entry_dir):
+                        path = os.path.join(entry_dir, name)
+                        if path != tmp_filename and not name.endswith(".part"):
+                            if os.path.isdir(path):
+                                shutil.rmtree(path, ignore_errors=True)
+                            else:
+                                os.remove(path)
+                    os.replace(tmp_filename, os.path.join(entry_dir, filename))
+                    self._update_entry(key, {
+                        "url": url,
+                        "filename": filename,
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                        "size": size,
+                        "sha256": sha256.hexdigest(),
+                        "fetched": now,
+                        "accessed": now,
+                    })
+            except BaseException:
+                if os.path.exists(tmp_filename):
+                    os.remove(tmp_filename)
+                raise
+
+    def _valid_filename(self, key, entry):
+        """Path to cached file if it exists and matches the indexed size."""
+        if not entry:
+            return None
+        filename = os.path.join(self.entry_dir(key), entry["filename"])
+        if not os.path.exists(filename) or os.path.getsize(filename) != entry["size"]:
+            return None
+        return filename
+
+    @staticmethod
+    def _valid_digest(filename, entry):
+        """Whether the cached file matches the indexed sha256 (entries without one are not checked)."""
+        if not entry.get("sha256"):
+            return True
+        sha256 = hashlib.sha256()
+        with open(filename, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(chunk)
+        return sha256.hexdigest() == entry["sha256"]
+
+    def _touch(self, key):
+        """Update the last access time of an entry."""
+        with self._locked():
+            index = self._load_index()
+            if key in index:
+                index[key]["accessed"] = time.time()
+                self._save_index(index)
+
+    def _update_entry(self, key, entry):
+        with self._locked():
+            index = self._load_index()
+            index[key] = entry
+            self._save_index(index)
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """Hold the index lock of the process and the lock file of the cache directory
+        (shared with other processes), reentrant within the process."""
+        with _index_lock:
+            held = _index_files.get(self.lock_filename)
+            if held:
+                held[1] += 1
+                try:
+                    yield
+                finally:
+                    held[1] -= 1
+                return
+
+            f = open(self.lock_filename, "a")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                _index_files[self.lock_filename] = [f, 1]
+                try:
+                    yield
+                finally:
+                    del _index_files[self.lock_filename]
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+            finally:
+                f.close()
+
+    def _load_index(self):
+        if not os.path.exists(self.index_filename):
+            return {}
+        try:
+            with open(self.index_filename) as f:
+                return json.load(f)
+        except ValueError:
+            # Corrupted index, start over
+            return {}
+
+    def _save_index(self, index):
+        fd, tmp_filename = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        with os.fdopen(fd, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_filename, self.index_filename)
+
+    @staticmethod
+    def _dir_size(path):
+        size = 0
+        for root, _, files in os.walk(path):
+            for name in files:
+                size += os.path.getsize(os.path.join(root, name))
+        return size
@@ -5,10 +5,14 @@ TODO: add import options through API.
 """
 
 import os, sys
+import glob
+import logging
 import datetime
 
 import json
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
 import pyarrow.parquet as pq
 
 from sg2t.io.base import IOBase
@@ -21,6 +25,11 @@ package_dir = os.environ["SG2T_HOME"]
 # Package cache
 temp_dir =  os.environ["SG2T_CACHE"]
 
+logger = logging.getLogger(__name__)
+
+# Format of the "timestamp" column when it's stored as strings
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
 class ResStock(IOBase):
     """Class for importing data from NREL's ResStock
      dataset into sg2t tools.
@@ -99,16 +108,61 @@ class ResStock(IOBase):
         self._format_data()
 
         # Add to metadata.json
-        self.metadata["columns"] = self.keys_map
-
-        # update col_units in metadata to use new keys
-        cols_list = list(self.keys_map.keys())
-        units_list = [self._units(key) for key in cols_list]
-        iterable = zip(cols_list, units_list)
-        self.metadata["col_units"] = {key: value for (key, value) in iterable}
+        self._update_metadata_columns()
 
         return self.data
 
+    def iter_data(self, filename, batch_size=None):
+        """Import ResStock data in chunks, reading only the mapped columns.
+        Chunks are in the standard format (see `get_data`) and only one is
+        held in memory at a time, which keeps memory constant when going
+        through a large number of building files.
+
+        PARAMETERS
+        ----------
+        filename : str
+            Filename, as "ST_bldg_000000-0.parquet".
+
+        batch_size : int
+            Maximum number of rows per chunk, optional. By default each
+            row group of the file is a chunk.
+
+        RETURNS
+        -------
+        out : generator of pd.DataFrame
+            Chunks of data, in file order.
+        """
+        if not filename:
+            raise FileNotFoundError(f"No data file provided.")
+        if not os.path.exists(filename):
+            raise FileNotFoundError(f"File not found: {filename}")
+
+        self.data_filename = filename
+        self.metadata["file"]["filename"] = self.data_filename
+        self.keys_map = get_map(self.metadata_file)
+        self._update_metadata_columns()
+
+        parquet_file = pq.ParquetFile(filename)
+        # Building ID is stored as the pandas index of the file, if any
+        pandas_metadata = parquet_file.schema_arrow.pandas_metadata or {}
+        index_columns = [col for col in pandas_metadata.get("index_columns", [])
+                         if isinstance(col, str)]
+        columns = list(dict.fromkeys(list(self.keys_map.values()) + index_columns))
+
+        if batch_size is None:
+            batches = (parquet_file.read_row_group(i, columns=columns)
+                       for i in range(parquet_file.num_row_groups))
+        else:
+            batches = parquet_file.iter_batches(batch_size=batch_size, columns=columns)
+
+        self.bldg_id = None
+        for batch in batches:
+            chunk = batch.to_pandas()
+            if self.bldg_id is None and index_columns and len(chunk):
+                self.bldg_id = chunk.index[0]
+                self.metadata["file"]["Building ID"] = self.bldg_id
+            yield self._format_chunk(chunk)
+
     def _format_data(self):
         """Changes the format of the loaded tmy3 data self.data to follow
         a standard format with standard column names. See `mapping.py`.
@@ -117,21 +171,130 @@ class ResStock(IOBase):
         next, and removes redundant/unused columns.
         """
         self.keys_map = get_map(self.metadata_file)
-        # Save original dataframe
-        raw_data = self.data
-        # Create new dataframe
-        cols = list(self.keys_map.keys())
-        data = pd.DataFrame(columns=cols)
-        print(raw_data.head(1))
-        print(raw_data["timestamp"])
-        for key in list(self.keys_map.keys()):
-            print(key, self.keys_map[key])
-            data[key] = raw_data[self.keys_map[key]]
+        logger.debug("ResStock column mapping: %s", self.keys_map)
 
+        data = self._format_chunk(self.data)
+        # Files are normally already in time order
+        if not data.index.is_monotonic_increasing:
+            logger.debug("Sorting ResStock data by timestamp")
+            data = data.sort_index(kind="stable")
         self.data = data
-        self.data["Datetime"] = self.make_datetime(self.data["Datetime"])
-        self.data.sort_values("Datetime", inplace=True, ascending=True)
-        self.data.set_index("Datetime", inplace=True, drop=True)
+
+    def get_dataset(self, path, start=None, end=None, aggregation=None, use_threads=True):
+        """Import ResStock data of many buildings at once, scanning a directory
+        (or glob) of building parquet files as one Arrow dataset.
+
+        Only the mapped columns are read, rows outside of the timestamp range
+        are filtered while scanning the files and files are decoded in parallel
+        on the Arrow thread pool. With an aggregation, buildings are summed up
+        batch by batch, so the data of all the buildings is never held in memory.
+
+        PARAMETERS
+        ----------
+        path : str
+            Directory with building files, as "ST_bldg_000000-0.parquet", or
+            glob pattern matching them.
+
+        start, end : str or datetime
+            Timestamp range to import (end is excluded), optional.
+
+        aggregation : str
+            'sum' or 'mean' of all the buildings at each timestamp, optional.
+            If not given, the data of every building is returned, with a
+            "Building ID" column if the files have one.
+
+        use_threads : bool
+            Decode files in parallel, default is True.
+
+        RETURNS
+        -------
+        out : pd.DataFrame
+            DataFrame of data, sorted by timestamp.
+        """
+        if aggregation not in (None, 'sum', 'mean'):
+            raise ValueError('Error: Aggregation input is not right; have to use one of the following: "sum", "mean" ')
+
+        pattern = os.path.join(path, "*.parquet") if os.path.isdir(path) else path
+        files = sorted(glob.glob(pattern))
+        if not files:
+            raise FileNotFoundError(f"No data files found: {pattern}")
+
+        self.data_filename = path
+        self.metadata["file"]["filename"] = path
+        self.keys_map = get_map(self.metadata_file)
+        self._update_metadata_columns()
+
+        dataset = ds.dataset(files, format="parquet")
+        timestamp = self.keys_map["Datetime"]
+        columns = list(self.keys_map.values())
+        # Building ID is stored as the pandas index of the files, if any
+        pandas_metadata = dataset.schema.pandas_metadata or {}
+        bldg_columns = [col for col in pandas_metadata.get("index_columns", [])
+                        if isinstance(col, str) and col in dataset.schema.names]
+        if aggregation is None:
+            columns = columns + bldg_columns[:1]
+
+        row_filter = None
+        if start is not None:
+            row_filter = ds.field(timestamp) >= pd.Timestamp(start)
+        if end is not None:
+            end_filter = ds.field(timestamp) < pd.Timestamp(end)
+            row_filter = end_filter if row_filter is None else row_filter & end_filter
+
+        self.bldg_id = None
+        if aggregation is None:
+            raw_data = dataset.to_table(columns=columns, filter=row_filter, use_threads=use_threads).to_pandas(ignore_metadata=True)
+            data = self._format_chunk(raw_data)
+            if bldg_columns:
+                data["Building ID"] = raw_data[bldg_columns[0]].to_numpy()
+        else:
+            values = [col for col in columns if col != timestamp]
+            aggregates = [(col, "sum") for col in values] + [([], "count_all")]
+            totals = None
+            for batch in dataset.to_batches(columns=columns, filter=row_filter, use_threads=use_threads):
+                # filtered out files still give (empty) batches
+                if not batch.num_rows:
+                    continue
+                batch_totals = pa.Table.from_batches([batch]).group_by(timestamp) \
+                    .aggregate(aggregates).to_pandas().set_index(timestamp)
+                totals = batch_totals if totals is None else totals.add(batch_totals, fill_value=0)
+            if totals is None:
+                raise ValueError("No data in the timestamp range.")
+
+            counts = totals.pop("count_all")
+            totals.columns = values
+            if aggregation == 'mean':
+                totals = totals.div(counts, axis=0)
+            data = self._format_chunk(totals.reset_index())
+
+        self.metadata["file"]["Building ID"] = self.bldg_id
+        self.data = data.sort_index(kind="stable")
+        return self.data
+
+    def _format_chunk(self, raw_data):
+        """Standard format of a chunk of raw data (see `_format_data`),
+        selecting and renaming the mapped columns in one step."""
+        keys = [key for key in self.keys_map if key != "Datetime"]
+        data = raw_data[[self.keys_map[key] for key in keys]]
+        data.columns = keys
+        timestamps = raw_data[self.keys_map["Datetime"]]
+        if not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = self.make_datetime(timestamps, format=TIMESTAMP_FORMAT)
+        data.index = pd.DatetimeIndex(timestamps, name="Datetime")
+        return data
+
+    def _update_metadata_columns(self):
+        """Set the columns and col_units of the metadata to the standard format."""
+        if self.metadata["columns"] == self.keys_map:
+            # Already done for a previous file
+            return
+        self.metadata["columns"] = self.keys_map
+
+        # update col_units in metadata to use new keys
+        cols_list = list(self.keys_map.keys())
+        units_list = [self._units(key) for key in cols_list]
+        iterable = zip(cols_list, units_list)
+        self.metadata["col_units"] = {key: value for (key, value) in iterable}
 
     def export_data(self,
                 columns=None,
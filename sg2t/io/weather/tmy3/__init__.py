@@ -1,3 +1,4 @@
 #from .tmy3 import TMY3
 from sg2t.io.weather.tmy3.tmy3 import TMY3
 from sg2t.io.weather.tmy3.tmy3_nrel_stock import TMY3Stock
+from sg2t.io.weather.tmy3.catalog import TMY3Catalog
@@ -0,0 +1,130 @@
+"""Module for caching formatted weather data on local disk.
+
+Formatted data (the output of TMY3.get_data or TMY3Stock.get_data) is stored
+as an uncompressed Feather (Arrow IPC) file under the sg2t cache directory
+(os.environ["SG2T_CACHE"]), which is memory-mapped when read back.
+
+Cache files are keyed by the path, modification time and size of the source
+file, the type of data, the formatting version (see mapping.MAPPING_VERSION)
+and a hash of the column mapping (see mapping.mapping_hash), so they are
+rebuilt whenever any of them changes.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+
+import pyarrow as pa
+import pyarrow.feather as feather
+
+from sg2t.utils.saving import NpEncoder as NpEncoder
+from sg2t.io.weather.tmy3.mapping import MAPPING_VERSION, mapping_hash
+
+
+# Key of the sg2t information in the schema metadata of cache files
+INFO_KEY = b"sg2t"
+
+
+class WeatherCache():
+    """On-disk cache for formatted weather data.
+
+    Methods:
+        - load
+        - save
+    """
+    def __init__(self, cache_dir=None):
+        """ WeatherCache object initialization.
+
+        Parameters
+        ----------
+        cache_dir : str
+            Directory of the cache, optional. Defaults to the "weather"
+            sub-directory of os.environ["SG2T_CACHE"].
+        """
+        if cache_dir is None:
+            cache_dir = os.path.join(os.environ["SG2T_CACHE"], "weather")
+        self.cache_dir = cache_dir
+
+    def cache_filename(self, filename, kind):
+        """Path to the cache file of a source file.
+
+        PARAMETERS
+        ----------
+        filename : str
+            Full path to the source data file.
+
+        kind : str
+            Type of data, e.g. "tmy3".
+
+        RETURNS
+        -------
+        filename : str
+            Full path to the cache file.
+        """
+        stat = os.stat(filename)
+        key = json.dumps([os.path.abspath(filename), stat.st_mtime_ns, stat.st_size, kind,
+                          MAPPING_VERSION, mapping_hash(stock=kind == "tmy3_stock")])
+        name = os.path.splitext(os.path.basename(filename))[0]
+        return os.path.join(self.cache_dir, f"{name}_{hashlib.sha1(key.encode()).hexdigest()[:16]}.feather")
+
+    def load(self, filename, kind):
+        """Load the cached formatted data of a source file.
+
+        PARAMETERS
+        ----------
+        filename : str
+            Full path to the source data file.
+
+        kind : str
+            Type of data, e.g. "tmy3".
+
+        RETURNS
+        -------
+        data : pd.DataFrame
+            Formatted data, None if it's not in the cache.
+
+        info : dict
+            Information saved with the data, None if it's not in the cache.
+        """
+        cache_filename = self.cache_filename(filename, kind)
+        if not os.path.exists(cache_filename):
+            return None, None
+        table = feather.read_table(cache_filename, memory_map=True)
+        info = json.loads(table.schema.metadata[INFO_KEY])
+        return table.to_pandas(), info
+
+    def save(self, filename, kind, data, info):
+        """Save the formatted data of a source file to the cache.
+
+        PARAMETERS
+        ----------
+        filename : str
+            Full path to the source data file.
+
+        kind : str
+            Type of data, e.g. "tmy3".
+
+        data : pd.DataFrame
+            Formatted data.
+
+        info : dict
+            JSON serializable information to save with the data
+            (e.g. station information, column mapping).
+        """
+        cache_filename = self.cache_filename(filename, kind)
+        table = pa.Table.from_pandas(data)
+        metadata = dict(table.schema.metadata or {})
+        metadata[INFO_KEY] = json.dumps(info, cls=NpEncoder).encode()
+        table = table.replace_schema_metadata(metadata)
+
+        # Write then rename so readers never see a partial file
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=self.cache_dir, suffix=".part")
+        os.close(fd)
+        try:
+            feather.write_feather(table, tmp_filename, compression="uncompressed")
+            os.replace(tmp_filename, cache_filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
@@ -0,0 +1,171 @@
+"""Module for the catalog of TMY3 weather stations.
+
+The catalog is built from the index of TMY3 files, reading only the station
+information line of each file, and is cached in the sg2t cache
+(os.environ["SG2T_CACHE"]) so files are only opened again when the index
+changes.
+"""
+
+import os
+import hashlib
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from sg2t.io.weather.tmy3.tmy3 import TMY3
+from sg2t.io.weather.tmy3.reader import STATION_KEYS, read_tmy3_station
+
+
+# Package cache
+cache_dir = os.environ["SG2T_CACHE"]
+
+# Mean Earth radius in km
+EARTH_RADIUS = 6371.0
+
+
+class TMY3Catalog:
+    """Catalog of TMY3 weather stations, with nearest station queries
+    and loading of many stations at once.
+
+    Methods:
+        - nearest
+        - get_data
+    """
+    def __init__(self, data_dir=cache_dir, max_workers=8):
+        """ TMY3Catalog object initialization.
+
+        Parameters
+        ----------
+        data_dir : str
+            Directory with the TMY3 files and their index (see TMY3.get_index).
+
+        max_workers : int
+            Maximum number of files read concurrently, default is 8.
+        """
+        self.data_dir = data_dir
+        self.max_workers = max_workers
+        self.stations = self.load_stations()
+        self._vectors = self._unit_vectors(self.stations["latitude"].to_numpy(),
+                                           self.stations["longitude"].to_numpy())
+
+    def load_stations(self):
+        """Load the table of stations from the cache, building it first if
+        it doesn't exist or if it's older than the index.
+
+        RETURNS
+        -------
+        stations : pd.DataFrame
+            One row per station file, with the filename and the
+            station information (see reader.STATION_KEYS).
+        """
+        tmy3 = TMY3()
+        filenames = tmy3.get_index(self.data_dir)
+        index_filename = os.path.join(self.data_dir, tmy3.metadata["file"]["index_filename"])
+        catalog_filename = self._catalog_filename()
+        if os.path.exists(catalog_filename) and (not os.path.exists(index_filename) or
+                os.path.getmtime(catalog_filename) >= os.path.getmtime(index_filename)):
+            return pd.read_parquet(catalog_filename)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            infos = list(executor.map(self._read_station, filenames))
+        records = [{"filename": filename, **info} for filename, info in zip(filenames, infos) if info]
+        stations = pd.DataFrame.from_records(records, columns=["filename"] + STATION_KEYS)
+        stations["state"] = stations["state"].astype("category")
+
+        # Write then rename so readers never see a partial file
+        os.makedirs(os.path.dirname(catalog_filename), exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(catalog_filename), suffix=".part")
+        os.close(fd)
+        try:
+            stations.to_parquet(tmp_filename, index=False)
+            os.replace(tmp_filename, catalog_filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        return stations
+
+    def nearest(self, latitude, longitude, k=1):
+        """Find the nearest stations to one or more locations,
+        by great-circle distance.
+
+        PARAMETERS
+        ----------
+        latitude, longitude : float or array-like
+            Location(s) in degrees.
+
+        k : int
+            Number of stations to return per location, default is 1.
+
+        RETURNS
+        -------
+        out : pd.DataFrame
+            k rows per location, nearest first, with the station information,
+            the "location" (position in the inputs) and the "distance" in km.
+        """
+        if not len(self.stations):
+            raise ValueError("No stations in the catalog.")
+        latitude = np.atleast_1d(np.asarray(latitude, dtype=float))
+        longitude = np.atleast_1d(np.asarray(longitude, dtype=float))
+        k = min(k, len(self.stations))
+        queries = self._unit_vectors(latitude, longitude)
+
+        nearest = np.empty((len(queries), k), dtype=np.intp)
+        # Locations are processed in blocks to bound the memory of the
+        # location x station matrix
+        block = max(1, 2**22 // max(len(self.stations), 1))
+        for start in range(0, len(queries), block):
+            dots = queries[start:start + block] @ self._vectors.T
+            candidates = np.argpartition(-dots, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(dots, candidates, axis=1), axis=1, kind="stable")
+            nearest[start:start + block] = np.take_along_axis(candidates, order, axis=1)
+
+        # Great-circle distance from the chord, which is accurate for close stations
+        chords = np.linalg.norm(self._vectors[nearest] - queries[:, None], axis=2)
+
+        out = self.stations.iloc[nearest.ravel()].reset_index(drop=True)
+        out.insert(0, "location", np.repeat(np.arange(len(queries)), k))
+        out["distance"] = 2 * EARTH_RADIUS * np.arcsin(np.minimum(chords.ravel() / 2, 1))
+        return out
+
+    def get_data(self, filenames):
+        """Load the data of many stations in parallel into one long-format frame.
+
+        PARAMETERS
+        ----------
+        filenames : list of str
+            Station filenames, as in the "filename" column of the catalog.
+
+        RETURNS
+        -------
+        out : pd.DataFrame
+            Formatted data (see TMY3.get_data) of every station, one after the
+            other, with a "Station" column with the filename.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = list(executor.map(self._read_data, filenames))
+        data = pd.concat(frames, keys=filenames, names=["Station", "Datetime"])
+        return data.reset_index(level="Station")
+
+    def _read_station(self, filename):
+        """Station information of a file, None if the file is missing."""
+        path = os.path.join(self.data_dir, filename)
+        if not os.path.exists(path):
+            return None
+        return read_tmy3_station(path)
+
+    def _read_data(self, filename):
+        return TMY3().get_data(os.path.join(self.data_dir, filename))
+
+    def _catalog_filename(self):
+        """Cache file of the catalog, one per data directory."""
+        key = hashlib.sha1(os.path.abspath(self.data_dir).encode()).hexdigest()[:12]
+        return os.path.join(cache_dir, "tmy3", f"catalog_{key}.parquet")
+
+    @staticmethod
+    def _unit_vectors(latitude, longitude):
+        """Locations as 3D unit vectors, shaped (n, 3)."""
+        lat = np.radians(latitude)
+        lon = np.radians(longitude)
+        return np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
@@ -12,6 +12,8 @@ Optional columns for weather
 - Any other data
 """
 import os
+import json
+import hashlib
 
 from sg2t.utils.io import load_metadata
 
@@ -20,6 +22,11 @@ from sg2t.utils.io import load_metadata
 package_dir =  os.environ["SG2T_HOME"]
 metadata_path = f"{package_dir}/io/weather/tmy3/"
 
+# Version of the formatting of the data, to be increased on every change of
+# the formatting code so that cached formatted data is rebuilt (changes of the
+# mapping itself are detected by `mapping_hash`)
+MAPPING_VERSION = 1
+
 def get_map(stock=False):
     # Raw columns from tmy3 data
     if not stock:
@@ -52,4 +59,12 @@ def get_map(stock=False):
         # Renaming keys to remove units
         sg2t_cols[tmy3_cols[key]] = key
 
-    return sg2t_cols
\ No newline at end of file
+    return sg2t_cols
+
+
+def mapping_hash(stock=False):
+    """Hash of the mapping and of the metadata it's loaded from, which changes
+    whenever tmy3_nrel.json (or tmy3_nrel_stock.json) is edited."""
+    md = load_metadata(metadata_path + ("tmy3_nrel_stock.json" if stock else "tmy3_nrel.json"))
+    key = json.dumps([get_map(stock), md], sort_keys=True)
+    return hashlib.sha1(key.encode()).hexdigest()
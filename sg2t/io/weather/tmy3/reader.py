@@ -0,0 +1,129 @@
+"""This module reads NREL's TMY3 files in a single pass.
+
+A TMY3 file has one line with the station information followed by the
+hourly data (with a header line). Hours follow the 01:00-24:00 convention,
+where 24:00 is midnight at the end of the day, i.e. 00:00 of the next day.
+"""
+import csv
+
+import numpy as np
+import pandas as pd
+
+
+DATE_COLUMN = "Date (MM/DD/YYYY)"
+TIME_COLUMN = "Time (HH:MM)"
+
+# Station information in the first line of the file
+STATION_KEYS = ["station_number",
+                "station_name",
+                "state",
+                "tzoffset",
+                "latitude",
+                "longitude",
+                "elevation"]
+STATION_TYPES = [int, str, str, float, float, float, float]
+
+
+def read_tmy3(filename, columns=None):
+    """Read station information and data of a TMY3 file, opening it once.
+
+    PARAMETERS
+    ----------
+    filename : str
+        Full path to TMY3 file.
+
+    columns : list of str
+        Data columns to read, optional. All columns are read if not given.
+        Date and time columns are always read.
+
+    RETURNS
+    -------
+    station : dict
+        Station information, with keys as in STATION_KEYS.
+
+    data : pd.DataFrame
+        Data as in the file, with the date and time columns as strings,
+        all other requested columns as float, and a "Datetime" column.
+    """
+    with open(filename, "rt", newline="") as f:
+        station = _parse_station(f.readline())
+
+        if columns is not None:
+            columns = list(dict.fromkeys([DATE_COLUMN, TIME_COLUMN] + list(columns)))
+        dtype = {DATE_COLUMN: str, TIME_COLUMN: str}
+        if columns is not None:
+            dtype.update({col: float for col in columns if col not in dtype})
+        data = pd.read_csv(f, usecols=columns, dtype=dtype)
+
+    data["Datetime"] = make_tmy3_datetime(data[DATE_COLUMN], data[TIME_COLUMN])
+    return station, data
+
+
+def read_tmy3_station(filename):
+    """Read only the station information of a TMY3 file (first line).
+
+    PARAMETERS
+    ----------
+    filename : str
+        Full path to TMY3 file.
+
+    RETURNS
+    -------
+    station : dict
+        Station information, with keys as in STATION_KEYS.
+    """
+    with open(filename, "rt", newline="") as f:
+        return _parse_station(f.readline())
+
+
+def make_tmy3_datetime(dates, times):
+    """Make datetimes from TMY3 dates (MM/DD/YYYY) and times (HH:MM)
+    arithmetically, with 24:00 rolled to 00:00 of the next day.
+
+    PARAMETERS
+    ----------
+    dates, times : pd.Series
+        Dates and times as strings.
+
+    RETURNS
+    -------
+    out : np.ndarray
+        Array of datetime64[ns].
+    """
+    date_digits = _digits(dates, 10, {2: "/", 5: "/"})
+    time_digits = _digits(times, 5, {2: ":"})
+
+    month = date_digits[:, 0] * 10 + date_digits[:, 1]
+    day = date_digits[:, 3] * 10 + date_digits[:, 4]
+    year = date_digits[:, 6] * 1000 + date_digits[:, 7] * 100 + date_digits[:, 8] * 10 + date_digits[:, 9]
+    hour = time_digits[:, 0] * 10 + time_digits[:, 1]
+    minute = time_digits[:, 3] * 10 + time_digits[:, 4]
+    if ((month < 1) | (month > 12) | (day < 1) | (day > 31) | (hour > 24) | (minute > 59)).any():
+        raise ValueError("TMY3 date or time out of range.")
+
+    months = (year - 1970) * 12 + month - 1
+    days = months.astype("datetime64[M]").astype("datetime64[D]") + (day - 1)
+    return (days.astype("datetime64[m]") + (hour * 60 + minute)).astype("datetime64[ns]")
+
+
+def _parse_station(line):
+    info = next(csv.reader([line]))
+    return {key: type_(value) for key, type_, value in zip(STATION_KEYS, STATION_TYPES, info)}
+
+
+def _digits(series, width, separators):
+    """Digits of fixed width strings as an int array shaped (len(series), width),
+    checking the separators (position: character)."""
+    # one extra character so that longer strings aren't silently truncated
+    chars = np.asarray(series, dtype=f"S{width + 1}")
+    valid = np.char.str_len(chars) == width
+    chars = chars.view(np.uint8).reshape(-1, width + 1)[:, :width]
+    digits = chars.astype(np.int64) - ord("0")
+    for position in range(width):
+        if position in separators:
+            valid &= chars[:, position] == ord(separators[position])
+        else:
+            valid &= (digits[:, position] >= 0) & (digits[:, position] <= 9)
+    if not valid.all():
+        raise ValueError(f"TMY3 date or time not in the expected format: {series[~valid].iloc[0]}")
+    return digits
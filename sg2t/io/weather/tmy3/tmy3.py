@@ -14,6 +14,8 @@ from sg2t.config import load_config
 from sg2t.io.schemas import weather_schema
 from sg2t.utils.saving import NpEncoder as NpEncoder
 from sg2t.io.weather.tmy3.mapping import get_map
+from sg2t.io.weather.tmy3.reader import read_tmy3
+from sg2t.io.weather.tmy3.cache import WeatherCache
 
 
 package_dir = os.environ["SG2T_HOME"]
@@ -69,7 +71,7 @@ class TMY3(IOBase):
 
         return sorted(indices.strip().split("\n"))
 
-    def get_data(self, filename, save_json=False):
+    def get_data(self, filename, save_json=False, use_cache=True):
         """Get raw TMY3 data in DataFrame format.
 
         PARAMETERS
@@ -77,6 +79,10 @@ class TMY3(IOBase):
         filename : str
             Filename, as "STATE-weather_station_name.tmy3".
 
+        use_cache : bool
+            Load the formatted data from the weather cache if the file was
+            already read, and save it there otherwise, default is True.
+
         RETURNS
         -------
         out : pd.DataFrame
@@ -92,29 +98,30 @@ class TMY3(IOBase):
         # Add source filename to metadata
         self.metadata["file"]["filename"] = self.data_filename
 
-        # Data loaded into pandas df
-        metadata_rows = 1
-        self.data = pd.read_csv(self.data_filename, skiprows=metadata_rows)
+        cache = WeatherCache()
+        data, info = cache.load(self.data_filename, "tmy3") if use_cache else (None, None)
+        if data is not None:
+            self.data = data
+            self.keys_map = info["keys_map"]
+            station = info["station"]
+        else:
+            # Station info (first row of TMY3) and data loaded in one read,
+            # only the mapped columns are kept
+            self.keys_map = get_map()
+            station, self.data = read_tmy3(self.data_filename, columns=list(self.keys_map.values()))
+
+            # Returned data has to be a pd.DataFrame
+            # This is the data as-is from the tmy3 files
+            # Convert to standard format
+            self._format_data()
+            if use_cache:
+                cache.save(self.data_filename, "tmy3", self.data,
+                           {"keys_map": self.keys_map, "station": station})
 
-        # Parse metadata from first row of TMY3
         self.metadata["station"] = {}
-        metadata_keys = ["station_number",
-                         "station_name",
-                         "state",
-                         "tzoffset",
-                         "latitude",
-                         "longitude",
-                         "elevation"]
-        info = pd.read_csv(self.data_filename, nrows=1, names=metadata_keys)
-
-        for item in info.columns:
-            setattr(self, item, info[item][0])
-            self.metadata["station"][item] = info[item][0]
-
-        # Returned data has to be a pd.DataFrame
-        # This is the data as-is from the tmy3 files
-        # Convert to standard format
-        self._format_data()
+        for item, value in station.items():
+            setattr(self, item, value)
+            self.metadata["station"][item] = value
 
         # Add to metadata.json
         self.metadata["columns"] = self.keys_map
@@ -142,20 +149,16 @@ class TMY3(IOBase):
         next, and removes redundant/unused columns.
         """
         self.keys_map = get_map()
-        # Save original dataframe
         raw_data = self.data
-        # Create new dataframe
-        cols = list(self.keys_map.keys())
-        data = pd.DataFrame(columns=cols)
-
-        for key in list(self.keys_map.keys()):
-            data[key] = raw_data[self.keys_map[key]]
-
+        # Select and rename the mapped columns, the datetime is already
+        # made from the date and time columns by the reader
+        keys = [key for key in self.keys_map if key not in ("Date", "Time")]
+        data = raw_data[[self.keys_map[key] for key in keys]]
+        data.columns = keys
+        data.index = pd.DatetimeIndex(raw_data["Datetime"], name="Datetime")
+        if not data.index.is_monotonic_increasing:
+            data = data.sort_index(kind="stable")
         self.data = data
-        self.data = self.merge_date_time(self.data, "Date", "Time")
-        self.data["Datetime"] = self.make_datetime(self.data["Datetime"])
-        self.data.sort_values("Datetime", inplace=True, ascending=True)
-        self.data.set_index("Datetime", inplace=True, drop=True)
 
     def export_data(self,
                     columns=None,
@@ -14,6 +14,7 @@ from sg2t.config import load_config
 from sg2t.io.schemas import weather_schema
 from sg2t.utils.saving import NpEncoder as NpEncoder
 from sg2t.io.weather.tmy3.mapping import get_map
+from sg2t.io.weather.tmy3.cache import WeatherCache
 
 
 package_dir = os.environ["SG2T_HOME"]
@@ -23,6 +24,8 @@ cache_dir = f"{package_dir}/weather/data/tmy3/nrel_stock/"
 # Package cache
 temp_dir =  os.environ["SG2T_CACHE"]
 
+# Format of the "date_time" column of the ResStock/ComStock weather files
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
 
 class TMY3Stock(IOBase):
     """TMY3 weather data file type implementation for basic i/o."""
@@ -48,7 +51,7 @@ class TMY3Stock(IOBase):
         """
         super().__init__(config_name, config_key, metadata_file)
 
-    def get_data(self, filename, save_json=False):
+    def get_data(self, filename, save_json=False, use_cache=True):
         """Get raw TMY3 data in DataFrame format.
 
         PARAMETERS
@@ -56,6 +59,10 @@ class TMY3Stock(IOBase):
         filename : str
             Filename, as "STATE-weather_station_name.tmy3".
 
+        use_cache : bool
+            Load the formatted data from the weather cache if the file was
+            already read, and save it there otherwise, default is True.
+
         RETURNS
         -------
         out : pd.DataFrame
@@ -71,13 +78,21 @@ class TMY3Stock(IOBase):
         # Add source filename to metadata
         self.metadata["file"]["filename"] = self.data_filename
 
-        # Data loaded into pandas df
-        self.data = pd.read_csv(self.data_filename)
-
-        # Returned data has to be a pd.DataFrame
-        # This is the data as-is from the tmy3 files
-        # Convert to standard format
-        self._format_data()
+        cache = WeatherCache()
+        data, info = cache.load(self.data_filename, "tmy3_stock") if use_cache else (None, None)
+        if data is not None:
+            self.data = data
+            self.keys_map = info["keys_map"]
+        else:
+            # Data loaded into pandas df
+            self.data = pd.read_csv(self.data_filename)
+
+            # Returned data has to be a pd.DataFrame
+            # This is the data as-is from the tmy3 files
+            # Convert to standard format
+            self._format_data()
+            if use_cache:
+                cache.save(self.data_filename, "tmy3_stock", self.data, {"keys_map": self.keys_map})
 
         # Add to metadata.json
         #self.metadata["columns"] = self.keys_map
@@ -116,7 +131,7 @@ class TMY3Stock(IOBase):
             data[key] = raw_data[self.keys_map[key]]
 
         self.data = data
-        self.data["Datetime"] = self.make_datetime(self.data["Datetime"])
+        self.data["Datetime"] = self.make_datetime(self.data["Datetime"], format=DATETIME_FORMAT)
         self.data.sort_values("Datetime", inplace=True, ascending=True)
         self.data.set_index("Datetime", inplace=True, drop=True)
 
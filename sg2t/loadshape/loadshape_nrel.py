@@ -1,14 +1,16 @@
 from turtle import home
 from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 from sg2t.io.loadshapes.nrel.api import API
 from sg2t.utils.timeseries import Timeseries
+from sg2t.loadshape.rollup import LoadshapeRollup
 from sg2t.io.loadshapes.nrel.naming import CLIMATE_ZONES, HOME_TYPES, BUILDING_TYPES, NREL_COL_MAPPING
 
 class LoadshapeNrel:
     """ Loadshape analysis for Resstock and Comstock energy consumption data from pulled from NREL directly using api.py"""
 
-    def __init__(self, aggregation = 'avg', month_start = 1, month_end = 12, daytype = None):
+    def __init__(self, aggregation = 'avg', month_start = 1, month_end = 12, daytype = None, max_workers = 8, use_cube = False):
         """ 
         PARAMETERS
         ----------
@@ -28,12 +30,23 @@ class LoadshapeNrel:
             filters data based on daytype: if it's weekday (Mon-Fri) or weekend (Sat-Sun)
             default is set to None which doesn't do any daytype filtering
 
+        max_workers: int
+            maximum number of files pulled and aggregated concurrently when summing up
+            all home/building types, default is set to 8 (1 pulls them one at a time)
+
+        use_cube: bool
+            if True, loadshapes are reduced from the month x daytype x hour LoadshapeCube of each file, which is built once
+            and cached next to the file, instead of aggregating the full timeseries every time (not used for 'peak_day')
+            default is set to False
+
         """         
         self.nrel_api = API()
         self.aggregation = aggregation
         self.month_start = month_start
         self.month_end = month_end
         self.daytype = daytype
+        self.max_workers = max_workers
+        self.use_cube = use_cube
 
     def _format_columns_df(self, df):
          # rename columns using NREL_COL_MAPPING and drop the rest of the columns
@@ -41,6 +54,52 @@ class LoadshapeNrel:
         df = df[df.columns.intersection([*NREL_COL_MAPPING.values()])]
         return df
 
+    def loadshape(self, get_data, location, type_) -> pd.DataFrame:
+        """ pulls the data of one location and type using the get_data api method and returns its 24hr loadshape
+
+        PARAMETERS
+        ----------
+        get_data: callable
+            api method pulling the data of one location and type, e.g. API.get_data_resstock_by_state
+
+        location: str
+            state or climate zone
+
+        type_: str
+            home or building type
+
+        RETURNS
+        -------
+        df: pd.DataFrame
+            returns a dataframe with the 24hr loadshape, for the aggregation settings of this object
+        """
+        if self.use_cube and self.aggregation != 'peak_day':
+            cube = get_data(location, type_, cube=True)
+            df = cube.reduce(self.aggregation, self.month_start, self.month_end, self.daytype, columns=[*NREL_COL_MAPPING.keys()])
+            return self._format_columns_df(df)
+        # only read the columns kept by _format_columns_df
+        df_ = get_data(location, type_, columns=[*NREL_COL_MAPPING.keys()])
+        df_ = self._format_columns_df(df_)
+        return Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+
+    def _get_loadshape(self, get_data, location, types) -> pd.DataFrame:
+        """ pulls the data of each type using the get_data api method and sums up their 24hr loadshapes
+        files are pulled and aggregated concurrently (up to max_workers at a time) but always summed in the order of types
+        """
+        def type_loadshape(type_):
+            return self.loadshape(get_data, location, type_)
+
+        if len(types) == 1 or self.max_workers == 1:
+            loadshapes = map(type_loadshape, types)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(types))) as executor:
+                loadshapes = list(executor.map(type_loadshape, types))
+
+        df = 0 # initialization to be able to add all the dataframes together
+        for df_ in loadshapes:
+            df += df_
+        return df
+
     def get_resstock_loadshape_by_state(self, state: str, home_type: Optional[str] = None) -> pd.DataFrame:
         """ pulls resstock energy data by state and home_type and uses the timeseries aggregate function to return a 24hr loadshape dataframe
         
@@ -60,16 +119,10 @@ class LoadshapeNrel:
         """
         if home_type == None:
             # sums up all types of homes (single-family detatched, apartments, etc..)
-            df = 0 # initialization to be able to add all the dataframes together
-            for home_type in HOME_TYPES:
-                df_ = self.nrel_api.get_data_resstock_by_state(state, home_type)
-                df_ = self._format_columns_df(df_)
-                df += Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+            types = HOME_TYPES
         else:
-            df_ = self.nrel_api.get_data_resstock_by_state(state, home_type)
-            df_ = self._format_columns_df(df_)
-            df = Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
-        return df
+            types = (home_type,)
+        return self._get_loadshape(self.nrel_api.get_data_resstock_by_state, state, types)
 
     def get_resstock_loadshape_by_climatezone(self, climate: str, home_type: Optional[str] = None) -> pd.DataFrame:
         """ pulls resstock energy data by climate zone and home_type and uses the aggregate function to return a 24hr loadshape dataframe
@@ -90,16 +143,10 @@ class LoadshapeNrel:
         """
         if home_type == None:
             # sums up all types of homes (single-family detatched, apartments, etc..)
-            df = 0 # initialization to be able to add all the dataframes together
-            for home_type in HOME_TYPES:
-                df_ = self.nrel_api.get_data_resstock_by_climatezone(climate, home_type)
-                df_ = self._format_columns_df(df_)
-                df += Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+            types = HOME_TYPES
         else:
-            df_ = self.nrel_api.get_data_resstock_by_climatezone(climate, home_type)
-            df_ = self._format_columns_df(df_)
-            df = Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
-        return df
+            types = (home_type,)
+        return self._get_loadshape(self.nrel_api.get_data_resstock_by_climatezone, climate, types)
 
     def get_resstock_loadshape_by_climatezone_iecc(self, climate: str, home_type: Optional[str] = None) -> pd.DataFrame:
         """ pulls resstock energy data by iecc climate zone and home_type and uses the aggregate function to return a 24hr loadshape dataframe
@@ -121,23 +168,27 @@ class LoadshapeNrel:
         """
         if home_type == None:
             # sums up all types of homes (single-family detatched, apartments, etc..)
-            df = 0 # initialization to be able to add all the dataframes together
-            for home_type in HOME_TYPES:
-                df_ = self.nrel_api.get_data_resstock_by_climatezone_iecc(climate, home_type)
-                df_ = self._format_columns_df(df_)
-                df += Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+            types = HOME_TYPES
         else:
-            df_ = self.nrel_api.get_data_resstock_by_climatezone_iecc(climate, home_type)
-            df_ = self._format_columns_df(df_)
-            df = Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
-        return df
+            types = (home_type,)
+        return self._get_loadshape(self.nrel_api.get_data_resstock_by_climatezone_iecc, climate, types)
+
+    def get_resstock_loadshape_total(self, restart: bool = False, verbose: bool = False) -> pd.DataFrame:
+        """gets the total residential/resstock loadshape for the whole US by summing up all the climate zones loadshapes for all home types
+
+        all climate zone and home type files are pulled concurrently (up to max_workers at a time) and each completed loadshape
+        is checkpointed to the cache, so an interrupted run resumes where it stopped (see LoadshapeRollup)
 
-    def get_resstock_loadshape_total(self) -> pd.DataFrame:
-        """gets the total residential/resstock loadshape for the whole US by summing up all the climate zones loadshapes for all home types"""
-        total_resstock_df = 0 # initialization to be able to add all the dataframes together
-        for climate in CLIMATE_ZONES:
-            total_resstock_df += self.get_resstock_loadshape_by_climatezone(climate)
-        return total_resstock_df
+        PARAMETERS
+        ----------
+        restart: bool
+            discards the checkpoints of a previous run instead of resuming from them, default is False
+
+        verbose: bool
+            prints progress and throughput, default is False
+        """
+        rollup = LoadshapeRollup(self, verbose=verbose)
+        return rollup.run("resstock_total", self.nrel_api.get_data_resstock_by_climatezone, CLIMATE_ZONES, HOME_TYPES, restart=restart)
 
     def get_comstock_loadshape_by_state(self, state: str, building_type: Optional[str] = None) -> pd.DataFrame:
         """ pulls comstock energy data by state and building_type and uses the timeseries aggregate function to return a 24hr loadshape dataframe
@@ -159,16 +210,10 @@ class LoadshapeNrel:
 
         if building_type == None:
             # sums up all building types (fullservicerestaurant, hospital, largeoffice, etc..)
-            df = 0 # initialization to be able to add all the dataframes together
-            for building_type in BUILDING_TYPES:
-                df_ = self.nrel_api.get_data_comstock_by_state(state, building_type)
-                df_ = self._format_columns_df(df_)
-                df += Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+            types = BUILDING_TYPES
         else:
-            df_ = self.nrel_api.get_data_comstock_by_state(state, building_type)
-            df_ = self._format_columns_df(df_)
-            df = Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
-        return df
+            types = (building_type,)
+        return self._get_loadshape(self.nrel_api.get_data_comstock_by_state, state, types)
 
     def get_comstock_loadshape_by_climatezone(self, climate: str, building_type: Optional[str] = None) -> pd.DataFrame:
         """ pulls comstock energy data by climate zone and building_type and uses the aggregate function to return a 24hr loadshape dataframe
@@ -190,16 +235,10 @@ class LoadshapeNrel:
         """
         if building_type == None:
             # sums up all building types (fullservicerestaurant, clinics, schools, etc..)
-            df = 0 # initialization to be able to add all the dataframes together
-            for building_type in BUILDING_TYPES:
-                df_ = self.nrel_api.get_data_comstock_by_climatezone(climate, building_type)
-                df_ = self._format_columns_df(df_)
-                df += Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+            types = BUILDING_TYPES
         else:
-            df_ = self.nrel_api.get_data_comstock_by_climatezone(climate, building_type)
-            df_ = self._format_columns_df(df_)
-            df = Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)  
-        return df
+            types = (building_type,)
+        return self._get_loadshape(self.nrel_api.get_data_comstock_by_climatezone, climate, types)
 
     def get_comstock_loadshape_by_climatezone_iecc(self, climate: str, building_type: Optional[str] = None) -> pd.DataFrame:
         """ pulls comstock energy data by iecc climate zone and building_type and uses the aggregate function to return a 24hr loadshape dataframe
@@ -222,20 +261,24 @@ class LoadshapeNrel:
         """
         if building_type == None:
             # sums up all building types (fullservicerestaurant, clinics, schools, etc..)
-            df = 0 # initialization to be able to add all the dataframes together
-            for building_type in BUILDING_TYPES:
-                df_ = self.nrel_api.get_data_comstock_by_climatezone_iecc(climate, building_type)
-                df_ = self._format_columns_df(df_)
-                df += Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)
+            types = BUILDING_TYPES
         else:
-            df_ = self.nrel_api.get_data_comstock_by_climatezone_iecc(climate, building_type)
-            df_ = self._format_columns_df(df_)
-            df = Timeseries.timeseries_aggregate(df_, self.aggregation, self.month_start, self.month_end, self.daytype)  
-        return df
+            types = (building_type,)
+        return self._get_loadshape(self.nrel_api.get_data_comstock_by_climatezone_iecc, climate, types)
+
+    def get_comstock_loadshape_total(self, restart: bool = False, verbose: bool = False) -> pd.DataFrame:
+        """gets the total commercial/comstock loadshape for the whole US by summing up all the climate zones loadshapes for all building types
+
+        all climate zone and building type files are pulled concurrently (up to max_workers at a time) and each completed loadshape
+        is checkpointed to the cache, so an interrupted run resumes where it stopped (see LoadshapeRollup)
 
-    def get_comstock_loadshape_total(self) -> pd.DataFrame:
-        """gets the total commercial/comstock loadshape for the whole US by summing up all the climate zones loadshapes for all building types"""
-        total_comstock_df = 0 # initialization to be able to add all the dataframes together
-        for climate in CLIMATE_ZONES:
-            total_comstock_df += self.get_comstock_loadshape_by_climatezone(climate)
-        return total_comstock_df
+        PARAMETERS
+        ----------
+        restart: bool
+            discards the checkpoints of a previous run instead of resuming from them, default is False
+
+        verbose: bool
+            prints progress and throughput, default is False
+        """
+        rollup = LoadshapeRollup(self, verbose=verbose)
+        return rollup.run("comstock_total", self.nrel_api.get_data_comstock_by_climatezone, CLIMATE_ZONES, BUILDING_TYPES, restart=restart)
@@ -0,0 +1,159 @@
+"""Rollup engine for summing NREL loadshapes over a grid of
+locations (states or climate zones) and home/building types.
+
+Every (location, type) loadshape of the grid is pulled and aggregated as
+an independent task across a pool of workers. Completed loadshapes are
+checkpointed to the sg2t cache as Parquet files (keeping their dtypes, e.g.
+float32), so a rollup that is interrupted (or that
+fails on some of the files) resumes where it stopped when run again.
+Checkpoints are removed once the rollup completes, so a later run always
+reads the (possibly updated) cached data again.
+"""
+
+import os
+import re
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+
+
+class LoadshapeRollup:
+    """ Parallel, resumable sum of LoadshapeNrel loadshapes over locations and types"""
+
+    def __init__(self, loadshape, max_workers = None, checkpoint_dir = None, verbose = False, progress = None):
+        """
+        PARAMETERS
+        ----------
+        loadshape: LoadshapeNrel
+            loadshape object used to pull and aggregate each file (see LoadshapeNrel.loadshape),
+            the aggregation settings are taken from it
+
+        max_workers: int
+            maximum number of files pulled and aggregated concurrently, default is loadshape.max_workers
+
+        checkpoint_dir: str
+            directory where completed loadshapes are checkpointed,
+            default is the "rollups" directory of the NREL API cache
+
+        verbose: bool
+            prints progress and throughput after every completed loadshape
+
+        progress: callable
+            optional function called after every completed loadshape as progress(done, total, elapsed),
+            elapsed being the number of seconds since the rollup started
+        """
+        self.loadshape = loadshape
+        self.max_workers = max_workers if max_workers else loadshape.max_workers
+        if checkpoint_dir is None:
+            checkpoint_dir = os.path.join(loadshape.nrel_api.cache.cache_dir, "rollups")
+        self.checkpoint_dir = checkpoint_dir
+        self.verbose = verbose
+        self.progress = progress
+
+    def run(self, name, get_data, locations, types, restart = False) -> pd.DataFrame:
+        """ sums up the 24hr loadshapes of every type in every location
+
+        PARAMETERS
+        ----------
+        name: str
+            name of the rollup, used with the aggregation and read settings to identify its checkpoints,
+            so it should identify the data pulled by get_data (e.g. include the upgrade)
+
+        get_data: callable
+            api method pulling the data of one location and type, e.g. API.get_data_resstock_by_climatezone
+
+        locations: list of str
+            states or climate zones to sum up
+
+        types: list of str
+            home or building types to sum up
+
+        restart: bool
+            discards the checkpoints of a previous run of this rollup, default is False (resume)
+
+        RETURNS
+        -------
+        df: pd.DataFrame
+            returns a dataframe with the 24hr loadshape summed over all locations and types
+            (summed by location first, in the order of locations and types)
+        """
+        rollup_dir = self.rollup_dir(name)
+        if restart:
+            shutil.rmtree(rollup_dir, ignore_errors=True)
+        os.makedirs(rollup_dir, exist_ok=True)
+
+        tasks = [(location, type_) for location in locations for type_ in types]
+        loadshapes = {}
+        for task in tasks:
+            filename = self._checkpoint_filename(rollup_dir, *task)
+            if os.path.exists(filename):
+                loadshapes[task] = pd.read_parquet(filename)
+
+        todo = [task for task in tasks if task not in loadshapes]
+        failed = {}
+        start = time.time()
+        self._report(len(loadshapes), len(tasks), start)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._run_task, rollup_dir, get_data, *task): task for task in todo}
+            for future in as_completed(futures):
+                task = futures[future]
+                try:
+                    loadshapes[task] = future.result()
+                except Exception as err:
+                    failed[task] = err
+                self._report(len(loadshapes), len(tasks), start, len(loadshapes) - (len(tasks) - len(todo)), len(failed))
+
+        if failed:
+            errors = "\n".join(f"{location}, {type_}: {err}" for (location, type_), err in failed.items())
+            raise Exception(f"{len(failed)} of {len(tasks)} loadshapes failed, "
+                            f"run again to resume from the completed ones:\n{errors}")
+
+        df = 0 # initialization to be able to add all the dataframes together
+        for location in locations:
+            df_location = 0
+            for type_ in types:
+                df_location += loadshapes[(location, type_)]
+            df += df_location
+
+        # the rollup is complete: checkpoints are only kept to resume interrupted or failed runs
+        shutil.rmtree(rollup_dir, ignore_errors=True)
+        return df
+
+    def rollup_dir(self, name):
+        """ directory with the checkpoints of the named rollup for the loadshape aggregation and read settings"""
+        ls = self.loadshape
+        dtype = "float32" if ls.nrel_api.float32 else "float64"
+        source = "cube" if ls.use_cube else "data"
+        settings = f"{name}_{ls.aggregation}_{ls.month_start}-{ls.month_end}_{ls.daytype}_{dtype}_{source}"
+        return os.path.join(self.checkpoint_dir, settings)
+
+    def _run_task(self, rollup_dir, get_data, location, type_):
+        """ pulls and aggregates one loadshape and checkpoints it"""
+        df = self.loadshape.loadshape(get_data, location, type_)
+        # write then rename so an interrupted run never leaves a partial checkpoint
+        fd, tmp_filename = tempfile.mkstemp(dir=rollup_dir, suffix=".part")
+        os.close(fd)
+        try:
+            df.to_parquet(tmp_filename)
+            os.replace(tmp_filename, self._checkpoint_filename(rollup_dir, location, type_))
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        return df
+
+    @staticmethod
+    def _checkpoint_filename(rollup_dir, location, type_):
+        name = re.sub(r"[^\w\-]", "_", f"{location}__{type_}")
+        return os.path.join(rollup_dir, f"{name}.parquet")
+
+    def _report(self, done, total, start, fetched = 0, failed = 0):
+        elapsed = time.time() - start
+        if self.progress is not None:
+            self.progress(done, total, elapsed)
+        if self.verbose:
+            rate = fetched / elapsed if elapsed > 0 else 0
+            failures = f", {failed} failed" if failed else ""
+            print(f"{done}/{total} loadshapes done{failures} ({rate:.2f} loadshapes/s)")
@@ -9,9 +9,294 @@ Adapted from https://github.com/slacgismo/speech/tree/main
 import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
+import math
 import pickle
 import copy
 import os
+import hashlib
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+
+# Package cache
+cache_dir = os.environ["SG2T_CACHE"]
+
+
+def session_end_times_and_load(start_times, energies, rate, time_steps_per_hour, num_time_steps):
+    """Calculate the load profile given data on individual sessions, without looping over the sessions.
+
+    Each session charges at the full rate from its start time for as many whole time steps as its energy allows,
+    wrapping around midnight once, and the remaining energy is added at its end time. The number of sessions
+    charging at each time step is counted with difference arrays, and the load is taken from a table of the
+    running sums of the rate, so the result is bit-identical to adding the rate of each session one at a time.
+
+    Parameters:
+         start_times: set of start time indices
+         energies: energy delivered in each session, in kWh
+         rate: uncontrolled max charging rate of the session, in kW
+         time_steps_per_hour: number of time steps per hour
+         num_time_steps: number of time steps in the profile
+
+    Returns:
+         end_times: set of end time indices
+         load: total load from the set of sessions, a time series in kW
+    """
+    start_times = np.asarray(start_times).astype(int)
+    lengths = (time_steps_per_hour * energies / rate).astype(int)
+    extra_charges = energies - lengths * rate / time_steps_per_hour
+
+    # Sessions going past midnight charge from their start time to midnight and from midnight to their end time
+    wraps = (start_times + lengths) > num_time_steps
+    end_times = np.where(wraps, np.minimum(start_times + lengths - num_time_steps, num_time_steps),
+                         start_times + lengths).astype(int)
+
+    starts = np.concatenate([start_times, np.zeros(np.count_nonzero(wraps), dtype=int)])
+    stops = np.concatenate([np.where(wraps, num_time_steps, end_times), end_times[wraps]])
+    size = max(num_time_steps, int(starts.max(initial=0)), int(stops.max(initial=0))) + 1
+    counts = np.cumsum(np.bincount(starts, minlength=size) - np.bincount(stops, minlength=size))[:num_time_steps]
+
+    # running_sums[k] is the rate added k times
+    running_sums = np.zeros((int(counts.max(initial=0)) + 1,))
+    running_sums[1:] = np.cumsum(np.full((len(running_sums) - 1,), rate, dtype=float))
+    load = running_sums[counts]
+
+    after_midnight = end_times >= num_time_steps
+    load[0] += np.sum(extra_charges[after_midnight] * time_steps_per_hour)
+    np.add.at(load, end_times[~after_midnight], extra_charges[~after_midnight] * time_steps_per_hour)
+
+    return end_times, load
+
+
+def timeline_sessions_load(start_times, energies, rate, time_steps_per_hour, num_time_steps):
+    """Calculate the load profile of sessions on a timeline of several days.
+
+    Unlike session_end_times_and_load, sessions don't wrap around midnight: they run on into the following time
+    steps, and the load past the end of the timeline is left out.
+
+    Parameters:
+         start_times: set of start time indices on the timeline
+         energies: energy delivered in each session, in kWh
+         rate: uncontrolled max charging rate of the session, in kW
+         time_steps_per_hour: number of time steps per hour
+         num_time_steps: number of time steps in the timeline
+
+    Returns:
+         load: total load from the set of sessions, a time series in kW
+    """
+    start_times = np.asarray(start_times).astype(int)
+    lengths = (time_steps_per_hour * energies / rate).astype(int)
+    extra_charges = energies - lengths * rate / time_steps_per_hour
+    end_times = start_times + lengths
+
+    size = num_time_steps + 1
+    counts = np.cumsum(np.bincount(np.minimum(start_times, num_time_steps), minlength=size) -
+                       np.bincount(np.minimum(end_times, num_time_steps), minlength=size))[:num_time_steps]
+    inside = end_times < num_time_steps
+    return rate * counts + np.bincount(end_times[inside], extra_charges[inside] * time_steps_per_hour,
+                                       num_time_steps)
+
+
+def sample_gmm(gmm, n_samples, rng):
+    """Generate samples from a fitted sklearn GaussianMixture with a given random generator.
+
+    This follows GaussianMixture.sample, but draws from rng instead of the random state of the model, so the model
+    can be shared between simulations running at the same time.
+
+    Parameters:
+         gmm: fitted GaussianMixture object
+         n_samples: number of samples
+         rng: np.random.Generator
+
+    Returns:
+         samples: array of shape (n_samples, n_features), grouped by component
+    """
+    counts = rng.multinomial(n_samples, gmm.weights_)
+    if gmm.covariance_type == 'full':
+        samples = [rng.multivariate_normal(mean, covariance, int(n))
+                   for mean, covariance, n in zip(gmm.means_, gmm.covariances_, counts)]
+    elif gmm.covariance_type == 'tied':
+        samples = [rng.multivariate_normal(mean, gmm.covariances_, int(n))
+                   for mean, n in zip(gmm.means_, counts)]
+    else:
+        samples = [mean + rng.standard_normal((int(n), len(mean))) * np.sqrt(covariance)
+                   for mean, covariance, n in zip(gmm.means_, gmm.covariances_, counts)]
+    return np.vstack(samples)
+
+
+# Complementary error function on arrays, for the normal cumulative distribution function
+_erfc = np.frompyfunc(math.erfc, 1, 1)
+
+
+def normal_cdf(x):
+    """Standard normal cumulative distribution function of the values of an array."""
+    return np.asarray(0.5 * _erfc(-np.asarray(x, dtype=float) / math.sqrt(2)), dtype=float)
+
+
+def expected_session_load(gmm, rate, energy_clip, time_steps_per_hour, num_time_steps, start_time_scaler,
+                          start_mod):
+    """Calculate the expected load profile of one session generated from a segment GMM, without sampling.
+
+    This is the limit of the mean load per session of LoadProfile.calculate_load for many sessions. For each GMM
+    component, the energy parameter is split into narrow intervals with the same number of full rate time steps.
+    The load of the sessions in each interval, relative to their start time, is added to a kernel with difference
+    arrays, shifted by the change of the conditional mean start time with the energy, and the kernel is convolved
+    with the distribution of the start time (a normal distribution wrapped around the day, binned on the time steps).
+
+    Parameters:
+         gmm: fitted GaussianMixture object, with start time and energy as first two features
+         rate: uncontrolled max charging rate of the sessions, in kW
+         energy_clip: upper bound to energy values generated by GMM
+         time_steps_per_hour: number of time steps per hour
+         num_time_steps: number of time steps in the profile
+         start_time_scaler: adjustment to start time produced by GMM model
+         start_mod: limit when calculating modulo of generated start times (1 if start times are in days)
+
+    Returns:
+         load: expected load of one session, a time series in kW
+    """
+    day = 24 * 3600
+    if int(round(start_time_scaler * day)) != num_time_steps:
+        raise ValueError(f'Expected loads need the start time scaler to map a day to the number of time steps: '
+                         f'{start_time_scaler} * {day} s is not {num_time_steps} time steps.')
+    step_energy = rate / time_steps_per_hour
+    max_length = int(time_steps_per_hour * energy_clip / rate)
+    if max_length >= num_time_steps:
+        raise ValueError(f'Expected loads need sessions shorter than a day: sessions of up to {energy_clip} kWh at '
+                         f'{rate} kW last {max_length} time steps, and a day has {num_time_steps}. Lower the energy '
+                         f'clip, or sample sessions over several days instead (see '
+                         f'SPEEChGeneralConfiguration.iter_days).')
+
+    if gmm.covariance_type == 'full':
+        covariances = gmm.covariances_
+    elif gmm.covariance_type == 'tied':
+        covariances = np.broadcast_to(gmm.covariances_, (len(gmm.weights_),) + gmm.covariances_.shape)
+    elif gmm.covariance_type == 'diag':
+        covariances = np.stack([np.diag(covariance) for covariance in gmm.covariances_])
+    else:
+        covariances = gmm.covariances_[:, None, None] * np.eye(gmm.means_.shape[1])
+    # Start times in time steps
+    scale = np.array([(day if start_mod == 1 else 1) * start_time_scaler, 1])
+
+    edges = np.arange(num_time_steps + 1)
+    load = np.zeros((num_time_steps,))
+    for weight, mean, covariance in zip(gmm.weights_, gmm.means_, covariances):
+        mean = mean[:2] * scale
+        covariance = covariance[:2, :2] * np.outer(scale, scale)
+        sd = np.sqrt(covariance[1, 1])
+
+        # Start time conditional on the energy parameter: its mean changes with slope, its sd is fixed
+        slope = covariance[0, 1] / covariance[1, 1]
+        start_sd = np.sqrt(max(covariance[0, 0] - slope * covariance[0, 1], 1e-12))
+
+        # Intervals [low, high) of |energy parameter|, one time step of energy wide, up to 8 sd from the mean.
+        # Energies above energy_clip are clipped, so the intervals above it all have max_length time steps and
+        # only need to be narrow enough for the conditional mean start time to change by under a time step.
+        top = max(abs(mean[1]) + 8 * sd, energy_clip)
+        low = np.arange(0, energy_clip, step_energy)
+        if slope != 0:
+            low = np.append(low, np.arange(energy_clip, top, max(step_energy, 0.25 / abs(slope))))
+        else:
+            low = np.append(low, energy_clip)
+        high = np.append(low[1:], np.inf)
+        lengths = np.minimum((low / step_energy + 1e-9).astype(int), max_length)
+        clipped = low >= energy_clip
+        # Both signs of the energy parameter, as energies are its absolute value
+        low, high = np.concatenate([low, -high]), np.concatenate([high, -low])
+        lengths, clipped = np.tile(lengths, 2), np.tile(clipped, 2)
+
+        # Probability and mean of the energy parameter in each interval (truncated normal)
+        alpha, beta = (np.minimum(low, high) - mean[1]) / sd, (np.maximum(low, high) - mean[1]) / sd
+        probabilities = normal_cdf(beta) - normal_cdf(alpha)
+        keep = probabilities > 1e-15
+        alpha, beta, probabilities = alpha[keep], beta[keep], probabilities[keep]
+        lengths, clipped = lengths[keep], clipped[keep]
+        energy_mean = mean[1] + sd * (np.exp(-alpha ** 2 / 2) - np.exp(-beta ** 2 / 2)) / np.sqrt(2 * np.pi) / \
+            probabilities
+        extra_charges = np.where(clipped, energy_clip, np.abs(energy_mean)) - lengths * step_energy
+
+        # Shift of the conditional mean start time, split between the two nearest time steps
+        shifts = slope * (energy_mean - mean[1])
+        steps = np.floor(shifts).astype(int)
+        fractions = shifts - steps
+        starts = np.concatenate([steps, steps + 1]) % num_time_steps
+        weights = np.concatenate([probabilities * (1 - fractions), probabilities * fractions])
+        lengths, extra_charges = np.tile(lengths, 2), np.tile(extra_charges, 2)
+
+        # Kernel: full rate from the start time for the session length, remaining energy at the end time
+        size = 2 * num_time_steps + 1
+        kernel = np.cumsum(np.bincount(starts, rate * weights, size) -
+                           np.bincount(starts + lengths, rate * weights, size))[:2 * num_time_steps]
+        kernel = kernel[:num_time_steps] + kernel[num_time_steps:]
+        kernel += np.bincount((starts + lengths) % num_time_steps,
+                              weights * extra_charges * time_steps_per_hour, num_time_steps)
+
+        # Start time without the shifts, wrapped around the day
+        days = np.arange(np.floor((mean[0] - 8 * start_sd) / num_time_steps),
+                         np.floor((mean[0] + 8 * start_sd) / num_time_steps) + 1)
+        cdf = normal_cdf((edges + num_time_steps * days[:, None] - mean[0]) / start_sd)
+        start_probabilities = np.diff(cdf, axis=1).sum(axis=0)
+
+        load += weight * np.fft.irfft(np.fft.rfft(start_probabilities) * np.fft.rfft(kernel), num_time_steps)
+    return load
+
+
+# Expected session loads by GMM object, see LoadProfile.calculate_expected_load
+_expected_session_loads = weakref.WeakKeyDictionary()
+
+
+def _run_group(config, g, weekday, seed):
+    """Calculate the load profiles of one driver group, with its own random generator."""
+    model = LoadProfile(config, config.group_configs[g], weekday=weekday)
+    model.calculate_load(rng=np.random.default_rng(seed))
+    return model.load_segments_dict, model.load_segments_array
+
+
+# General configuration of the processes in run_all, sent once to each process
+_worker_config = None
+
+
+def _init_worker(config):
+    global _worker_config
+    _worker_config = config
+
+
+def _run_worker_group(g, weekday, seed):
+    return _run_group(_worker_config, g, weekday, seed)
+
+
+# Process-wide registry of loaded GMM objects, keyed by (data folder, weekday, segment, group, file mtime).
+# Registered GMMs are shared between configurations and must not be modified; see change_ps_zg.
+_gmm_registry = {}
+_gmm_registry_lock = threading.Lock()
+
+
+def load_gmm(folder, weekday, gmm_name, g):
+    """Load a segment GMM object once per process and share it.
+
+    Parameters:
+         folder: data set folder (DataSetConfigurations.folder)
+         weekday: weekday option
+         gmm_name: part of file name for the segment GMM (DataSetConfigurations.gmm_names)
+         g: driver group
+
+    Returns:
+         gmm: shared GMM object, reloaded if the file changed since it was registered
+    """
+    filename = folder + 'GMMs/' + weekday + '_' + gmm_name + '_' + str(g) + '.p'
+    key = (os.path.abspath(folder), weekday, gmm_name, g, os.stat(filename).st_mtime_ns)
+    with _gmm_registry_lock:
+        if key not in _gmm_registry:
+            with open(filename, "rb") as f:
+                _gmm_registry[key] = pickle.load(f)
+        return _gmm_registry[key]
+
+
+def clear_gmm_registry():
+    """Drop all registered GMM objects, e.g. to free memory."""
+    with _gmm_registry_lock:
+        _gmm_registry.clear()
 
 
 class DataSetConfigurations(object):
@@ -167,6 +452,94 @@ class DataSetConfigurations(object):
             self.cluster_reorder_actodend = {i: i for i in range(self.ng)}
 
 
+class DataSetManifest(object):
+    """Manifest of a data set: which segment GMM files exist, and the pg and pz tables, packed into a single binary
+    file in the sg2t cache (os.environ["SG2T_CACHE"]), so a model is set up without listing or parsing the data files.
+
+    The manifest is stamped with the modification times of the data set folder and of its GMMs folder (one stat each),
+    so it is rebuilt when files are added to, removed from or renamed in either folder (including files replaced by
+    renaming a new copy over them). Files overwritten in place keep the folder times: remove the cache file or use
+    SPEECh(data, use_manifest=False) after such edits.
+
+    Attributes:
+        gmm_files: set of (weekday, category, driver group) with a GMM file
+        pg: driver group probabilities, as in SPEECh.pg
+        pz: segment probabilities, as in SPEECh.pz
+
+    Methods:
+        load(data): load the manifest of a data set from the cache, building it first if needed
+        build(data): build the manifest from the data files
+    """
+
+    version = 2
+
+    def __init__(self, gmm_files, pg, pz):
+        self.gmm_files = gmm_files
+        self.pg = pg
+        self.pz = pz
+
+    @classmethod
+    def load(cls, data):
+        """Load the manifest of a data set (object from DataSetConfiguration class) from the cache."""
+        filename = cls._filename(data)
+        stamps = cls._stamps(data)
+        if os.path.exists(filename):
+            try:
+                with open(filename, 'rb') as f:
+                    packed = pickle.load(f)
+            except Exception:
+                # Truncated file, or written by other versions of pandas/numpy: rebuilt below
+                packed = None
+            if isinstance(packed, dict) and packed.get('version') == cls.version and packed.get('stamps') == stamps:
+                return cls(packed['gmm_files'], packed['pg'], packed['pz'])
+
+        manifest = cls.build(data)
+        packed = {'version': cls.version, 'stamps': stamps, 'gmm_files': manifest.gmm_files,
+                  'pg': manifest.pg, 'pz': manifest.pz}
+
+        # Write then rename so readers never see a partial file
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(filename), suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(packed, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_filename, filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+        return manifest
+
+    @classmethod
+    def build(cls, data):
+        """Build the manifest of a data set (object from DataSetConfiguration class) from the data files."""
+        gmm_folder = data.folder + 'GMMs/'
+        listed = set(os.listdir(gmm_folder)) if os.path.isdir(gmm_folder) else set()
+        gmm_files = {(weekday, cat, g) for weekday in ['weekday', 'weekend'] for cat in data.categories
+                     for g in range(data.ng)
+                     if weekday + '_' + data.gmm_names[cat] + '_' + str(g) + '.p' in listed}
+
+        pg = pd.read_csv(data.folder + 'pg.csv')
+        pz = {'weekday': {}, 'weekend': {}}
+        for i in range(data.ng):
+            pz['weekday'][i] = pd.read_csv(data.folder + 'pz_weekday_g_' + str(i) + '.csv')
+            pz['weekend'][i] = pd.read_csv(data.folder + 'pz_weekend_g_' + str(i) + '.csv')
+        return cls(gmm_files, pg, pz)
+
+    @staticmethod
+    def _filename(data):
+        """Cache file of the manifest, one per data set folder and set-up."""
+        key = repr((os.path.abspath(data.folder), data.ng, sorted(data.gmm_names.items())))
+        return os.path.join(cache_dir, 'speech',
+                            data.data_set + '_' + hashlib.sha1(key.encode()).hexdigest()[:12] + '.manifest.p')
+
+    @staticmethod
+    def _stamps(data):
+        """Modification times of the data set folder and of the GMMs folder."""
+        gmm_folder = data.folder + 'GMMs/'
+        return (os.stat(data.folder).st_mtime_ns,
+                os.stat(gmm_folder).st_mtime_ns if os.path.isdir(gmm_folder) else None)
+
+
 class SPEECh(object):
     """Top-level SPEECh class.
 
@@ -176,24 +549,38 @@ class SPEECh(object):
             e.g. pz['weekday'][0]['Home'] gives the probability a driver in group 0 will charge at home on a weekday
         pg: driver group probabilities
 
+        manifest: object from DataSetManifest class, None if use_manifest is False
+
     Methods:
         pg_(): loads the base distribution for pg
         pz_g(): loads the base values for pz
+        has_gmm(): whether there is a sessions model GMM for a charging segment
     """
 
-    def __init__(self, data):
+    def __init__(self, data, use_manifest=False):
+        """Option use_manifest: load pg, pz and the list of GMM files from the data set manifest (see DataSetManifest),
+        instead of reading them from the data folder. The manifest is written to the sg2t cache
+        (os.environ["SG2T_CACHE"]) the first time, and whenever the data set changes."""
         self.data = data
 
+        self.manifest = DataSetManifest.load(data) if use_manifest else None
         self.pz = {'weekday': {}, 'weekend': {}}
         self.pg_()
         self.pz_g()
 
     def pg_(self):
         """Loads the base distribution over driver groups."""
+        if self.manifest is not None:
+            self.pg = self.manifest.pg.copy()
+            return
         self.pg = pd.read_csv(self.data.folder + 'pg.csv')
 
     def pz_g(self):
         """Loads the segment probabilities."""
+        if self.manifest is not None:
+            for weekday in ['weekday', 'weekend']:
+                self.pz[weekday] = {i: val.copy() for i, val in self.manifest.pz[weekday].items()}
+            return
         for i in range(self.data.ng):
             self.pz['weekday'][i] = pd.read_csv(
                 self.data.folder + 'pz_weekday_g_' + str(i) + '.csv')
@@ -201,6 +588,13 @@ class SPEECh(object):
             self.pz['weekend'][i] = pd.read_csv(
                 self.data.folder + 'pz_weekend_g_' + str(i) + '.csv')
 
+    def has_gmm(self, weekday, cat, g):
+        """Whether there is a sessions model GMM for charging segment cat of driver group g."""
+        if self.manifest is not None:
+            return (weekday, cat, g) in self.manifest.gmm_files
+        return os.path.isfile(self.data.folder + 'GMMs/' + weekday + '_' + self.data.gmm_names[cat] + '_' +
+                              str(g) + '.p')
+
 
 class SPEEChGeneralConfiguration(object):
     """General configuration using the speech class to set up the driver groups and segments.
@@ -229,6 +623,8 @@ class SPEEChGeneralConfiguration(object):
         change_ps_zg: can change the distribution over sessions model components, P(s|z, g)
         change_pg: can change the distribution over driver groups, P(g)
         run_all: calculates the load profiles
+        run_realization: calculates the total load profile with the session numbers drawn again
+        iter_days: calculates the load profiles over consecutive days, in chunks
     """
 
     def __init__(self, speech, remove_timers=False):
@@ -277,13 +673,16 @@ class SPEEChGeneralConfiguration(object):
             weekday: weekday option
             new_weights: dictionary giving new weights for segment cat in driver group g
 
-        The method alters the weights directly in the gmm without saving the original values.
+        The GMMs loaded from disk are shared (see load_gmm), so the weights are changed in a copy of the gmm
+        which replaces it in this configuration only. It is changed even if no sessions are currently drawn from the
+        segment, since session numbers can be drawn again (see run_realization).
         The input need only specify new weights for a subset of the components;
         the remaining weight will be distributed among the remaining components proportionately.
         """
-        if cat in self.group_configs[g].segment_gmms[weekday].keys():
+        if self.speech.has_gmm(weekday, cat, g):
 
-            gmm = self.group_configs[g].segment_gmms[weekday][cat]
+            gmm = copy.copy(self.group_configs[g].segment_gmm(weekday, cat))
+            gmm.weights_ = gmm.weights_.copy()
 
             all_inds = np.arange(0, np.shape(gmm.weights_)[0])
             total_rem = 1
@@ -326,26 +725,170 @@ class SPEEChGeneralConfiguration(object):
                                                       other_keys, new_col] * total_rem / sum(
             self.speech.pg.loc[other_keys, new_col])
 
-    def run_all(self, verbose=False, weekday='weekday'):
+    def run_all(self, verbose=False, weekday='weekday', seed=None, max_workers=None, use_processes=False,
+                expected=False):
         """Calculates the load profiles for each driver group using class LoadProfile.
         Records the results for the separate groups and for the aggregate.
+
+        Parameters:
+            verbose: print each driver group as its results are recorded
+            weekday: weekday option
+            seed: seed (or np.random.SeedSequence) for the random generators, optional. Each driver group gets its
+                own independent stream (np.random.SeedSequence.spawn), so results for a given seed don't depend on
+                max_workers.
+            max_workers: number of driver groups simulated at the same time, optional
+            use_processes: simulate the driver groups in separate processes instead of threads
+            expected: calculate the expected load profiles instead of sampling sessions
+                (see LoadProfile.calculate_expected_load). Nothing is sampled, so seed, max_workers and use_processes
+                can't be given.
+
+        Without a seed or max_workers, the driver groups are simulated one after the other with the global
+        NumPy random state, as before.
         """
+        if expected and (seed is not None or max_workers is not None or use_processes):
+            raise ValueError('Expected load profiles are calculated without sampling: seed, max_workers and '
+                             'use_processes are only used without expected.')
         self.total_load_dict = {x: np.zeros((self.num_time_steps,)) for x in
                                 self.speech.data.labels}
         self.total_load_segments = np.zeros(
             (self.num_time_steps, len(self.speech.data.labels)))
         self.all_load_dicts = {}
         self.all_load_segments = {}
-        for g in range(self.speech.data.ng):
+
+        groups = range(self.speech.data.ng)
+        if expected:
+            results = map(self._run_group_expected, groups, [weekday] * len(groups))
+        elif seed is None and max_workers is None:
+            results = map(self._run_group_legacy, groups, [weekday] * len(groups))
+        else:
+            if not isinstance(seed, np.random.SeedSequence):
+                seed = np.random.SeedSequence(seed)
+            seeds = seed.spawn(len(groups))
+            if max_workers == 1:
+                results = map(_run_group, [self] * len(groups), groups, [weekday] * len(groups), seeds)
+            elif use_processes:
+                with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                                         initargs=(self,)) as executor:
+                    results = list(executor.map(_run_worker_group, groups, [weekday] * len(groups), seeds))
+            else:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(_run_group, [self] * len(groups), groups,
+                                                [weekday] * len(groups), seeds))
+
+        # Results are recorded in group order, so totals don't depend on which group finished first
+        for g, (load_segments_dict, load_segments_array) in zip(groups, results):
             if verbose:
                 print('Group ' + str(g))
-            model = LoadProfile(self, self.group_configs[g], weekday=weekday)
-            model.calculate_load()
-            self.all_load_dicts[g] = model.load_segments_dict
-            self.all_load_segments[g] = model.load_segments_array
-            for key, val in model.load_segments_dict.items():
+            self.all_load_dicts[g] = load_segments_dict
+            self.all_load_segments[g] = load_segments_array
+            for key, val in load_segments_dict.items():
                 self.total_load_dict[key] += val
-            self.total_load_segments += model.load_segments_array
+            self.total_load_segments += load_segments_array
+
+    def run_realization(self, weekday='weekday', seed=None):
+        """Calculates the total load profile of one realization of the model: the session numbers of every driver
+        group are drawn again (see SPEEChGroupConfiguration.resampled) before sampling the sessions. The
+        configuration isn't changed, so several realizations can be calculated at the same time.
+
+        Parameters:
+            weekday: weekday option
+            seed: seed (or np.random.SeedSequence) for the random generators, optional. The session numbers and
+                the sessions of each driver group get their own independent streams (np.random.SeedSequence.spawn).
+
+        Returns:
+            total_load_dict: dictionary with the total load result, as in run_all
+        """
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        groups = range(self.speech.data.ng)
+        numbers_seeds, sessions_seeds = [s.spawn(len(groups)) for s in seed.spawn(2)]
+
+        total_load_dict = {x: np.zeros((self.num_time_steps,)) for x in self.speech.data.labels}
+        for g in groups:
+            group_config = self.group_configs[g].resampled(np.random.default_rng(numbers_seeds[g]))
+            model = LoadProfile(self, group_config, weekday=weekday)
+            model.calculate_load(rng=np.random.default_rng(sessions_seeds[g]))
+            for key, val in model.load_segments_dict.items():
+                total_load_dict[key] += val
+        return total_load_dict
+
+    def iter_days(self, dates, seed=None, chunk_days=7):
+        """Calculates the load profiles over consecutive days, with sessions carried over into the following days.
+
+        Each day is simulated with the weekday or weekend GMMs of every driver group (see groups), according to its
+        date, and session numbers drawn for that day (see SPEEChGroupConfiguration.drivers and session_numbers).
+        Sessions of a day go on past midnight into the next days instead of wrapping around to the start of the same
+        day, and a lead-in day before the first date is simulated for the sessions going on into it. Days are
+        calculated chunk_days at a time, so memory doesn't grow with the number of days.
+
+        Parameters:
+            dates: consecutive days, e.g. pd.date_range('2023-01-01', '2023-12-31')
+            seed: seed for the random generators, optional. Each day gets its own independent streams for its
+                session numbers and sessions (np.random.SeedSequence.spawn), so results for a given seed don't depend
+                on chunk_days.
+            chunk_days: number of days calculated at a time, default is 7
+
+        Yields:
+            load_segments: array with the load of each segment (columns, as in speech.data.labels) for each time
+                step of the next chunk of days
+        """
+        dates = pd.DatetimeIndex(dates).normalize()
+        if not ((dates[1:] - dates[:-1]) == pd.Timedelta(days=1)).all():
+            raise ValueError('Dates have to be consecutive days.')
+        data = self.speech.data
+        steps = self.num_time_steps
+        # Days after its start that a session can go on into
+        max_length = int(self.time_steps_per_hour * self.energy_clip / min(data.rates))
+        margin = max_length // steps + 1
+
+        seeds = np.random.SeedSequence(seed).spawn(len(dates) + 1)
+        lead_in = self._day_load(dates[0] - pd.Timedelta(days=1), seeds[0], 1 + margin) if len(dates) else None
+        carry = lead_in[steps:] if lead_in is not None else None
+        for first in range(0, len(dates), chunk_days):
+            days = dates[first:first + chunk_days]
+            load = np.zeros(((len(days) + margin) * steps, data.num_categories))
+            for i, day in enumerate(days):
+                load[i * steps:(i + 1 + margin) * steps] += self._day_load(day, seeds[first + i + 1], 1 + margin)
+            load[:margin * steps] += carry
+            carry = load[len(days) * steps:]
+            yield load[:len(days) * steps]
+
+    def _day_load(self, day, seed, num_days):
+        """Load of the sessions starting on a day, on a timeline of num_days days from that day. The session numbers
+        of the driver groups are drawn for the day from the pz tables, with a child of seed."""
+        numbers_rng, rng = [np.random.default_rng(s) for s in seed.spawn(2)]
+        data = self.speech.data
+        weekday = 'weekend' if day.dayofweek >= 5 else 'weekday'
+        sessions = {cat: ([], []) for cat in data.categories}
+        for g in range(data.ng):
+            group_config = self.group_configs[g]
+            model = LoadProfile(self, group_config, weekday=weekday)
+            numbers = group_config.session_numbers(weekday, group_config.drivers(numbers_rng))
+            for cat in data.categories:
+                num_sessions = numbers[cat]
+                if num_sessions > 0:
+                    output = sample_gmm(group_config.segment_gmm(weekday, cat), num_sessions, rng)
+                    start_times, energies = model.start_times_and_energies(output)
+                    sessions[cat][0].append(start_times)
+                    sessions[cat][1].append(energies)
+
+        load = np.zeros((num_days * self.num_time_steps, data.num_categories))
+        for segment_number, cat in enumerate(data.categories):
+            if sessions[cat][0]:
+                load[:, segment_number] = timeline_sessions_load(
+                    np.concatenate(sessions[cat][0]), np.concatenate(sessions[cat][1]), data.rates[segment_number],
+                    self.time_steps_per_hour, len(load))
+        return load
+
+    def _run_group_legacy(self, g, weekday):
+        model = LoadProfile(self, self.group_configs[g], weekday=weekday)
+        model.calculate_load()
+        return model.load_segments_dict, model.load_segments_array
+
+    def _run_group_expected(self, g, weekday):
+        model = LoadProfile(self, self.group_configs[g], weekday=weekday)
+        model.calculate_expected_load()
+        return model.load_segments_dict, model.load_segments_array
 
 
 class SPEEChGroupConfiguration(object):
@@ -360,7 +903,11 @@ class SPEEChGroupConfiguration(object):
 
     Methods:
         numbers: calculate the values in segment_session_numbers
+        drivers: draw the drivers of the group
+        session_numbers: number of sessions in each charging segment for a set of drivers
+        resampled: copy of the configuration with the session numbers drawn again
         load_gmms: load the objects in segment_gmms
+        segment_gmm: GMM object of a segment, loaded if needed
     """
 
     def __init__(self, speech_config, g):
@@ -374,7 +921,7 @@ class SPEEChGroupConfiguration(object):
         self.numbers()
         self.load_gmms()
 
-    def numbers(self, total_drivers=None):
+    def numbers(self, total_drivers=None, rng=None):
         """Calculates the number of sessions for this driver group in each of the charging segments.
 
         Some driver groups have a very small number of charging sessions in a certain segment: too small for a sessions
@@ -383,46 +930,68 @@ class SPEEChGroupConfiguration(object):
 
         Parameters:
             total_drivers: gives the option to recalculate with a new value of total_drivers
+            rng: np.random.Generator to draw the drivers with, optional. The global NumPy random state is used if
+                not given.
         """
 
         if total_drivers is not None:
             self.total_drivers = total_drivers
 
-        inds = np.random.choice(
-            range(len(self.speech_config.speech.pz['weekday'][self.g])),
-            int(self.total_drivers), replace=True)
-        for cat in self.speech_config.speech.data.categories:
-            if os.path.isfile(
-                    self.speech_config.speech.data.folder + 'GMMs/' + 'weekday' + '_' +
-                    self.speech_config.speech.data.gmm_names[cat] + '_' + str(
-                            self.g) + '.p'):
-                self.segment_session_numbers['weekday'][cat] = int(sum(
-                    self.speech_config.speech.pz['weekday'][self.g].loc[
-                        inds, cat + self.speech_config.speech.data.zkey_weekday]))
-            else:
-                self.segment_session_numbers['weekday'][cat] = 0
-            if os.path.isfile(
-                    self.speech_config.speech.data.folder + 'GMMs/' + 'weekend' + '_' +
-                    self.speech_config.speech.data.gmm_names[cat] + '_' + str(
-                            self.g) + '.p'):
-                self.segment_session_numbers['weekend'][cat] = int(sum(
-                    self.speech_config.speech.pz['weekend'][self.g].loc[
-                        inds, cat + self.speech_config.speech.data.zkey_weekend]))
+        inds = self.drivers(rng)
+        for weekday in ['weekday', 'weekend']:
+            self.segment_session_numbers[weekday].update(self.session_numbers(weekday, inds))
+
+    def drivers(self, rng=None):
+        """Draws total_drivers drivers (rows of the pz tables) of this driver group, with np.random.Generator rng or
+        with the global NumPy random state if not given."""
+        if rng is None:
+            return np.random.choice(
+                range(len(self.speech_config.speech.pz['weekday'][self.g])),
+                int(self.total_drivers), replace=True)
+        return rng.choice(len(self.speech_config.speech.pz['weekday'][self.g]), int(self.total_drivers),
+                          replace=True)
+
+    def session_numbers(self, weekday, inds):
+        """Number of sessions in each of the charging segments on a weekday option for drivers inds (see drivers)."""
+        speech = self.speech_config.speech
+        zkey = speech.data.zkey_weekday if weekday == 'weekday' else speech.data.zkey_weekend
+        pz = speech.pz[weekday][self.g]
+        numbers = {}
+        for cat in speech.data.categories:
+            if speech.has_gmm(weekday, cat, self.g):
+                # rows of pz are numbered from 0; summed in order, as the pz values of the drivers
+                numbers[cat] = int(sum(pz[cat + zkey].to_numpy()[inds].tolist()))
             else:
-                self.segment_session_numbers['weekend'][cat] = 0
+                numbers[cat] = 0
+        return numbers
+
+    def resampled(self, rng):
+        """Copy of this group configuration with the session numbers drawn again with np.random.Generator rng.
+        The GMM objects are shared with this configuration."""
+        group_config = copy.copy(self)
+        group_config.segment_session_numbers = {'weekday': {}, 'weekend': {}}
+        group_config.segment_gmms = {weekday: dict(gmms) for weekday, gmms in self.segment_gmms.items()}
+        group_config.numbers(rng=rng)
+        group_config.load_gmms()
+        return group_config
 
     def load_gmms(self):
-        """Loads the GMM model object for each of the segments."""
+        """Loads the GMM model object for each of the segments, from the process-wide registry (see load_gmm).
+        Segments that already have a GMM object keep it."""
 
         for cat in self.speech_config.speech.data.categories:
             weekdaykeys = ['weekday', 'weekend']
             for weekday in weekdaykeys:
                 if self.segment_session_numbers[weekday][cat] > 0:
-                    key = self.speech_config.speech.data.folder + 'GMMs/' + weekday + '_' + \
-                          self.speech_config.speech.data.gmm_names[
-                              cat] + '_' + str(self.g) + '.p'
-                    self.segment_gmms[weekday][cat] = pickle.load(
-                        open(key, "rb"))
+                    self.segment_gmm(weekday, cat)
+
+    def segment_gmm(self, weekday, cat):
+        """GMM model object of a segment, loaded from the process-wide registry (see load_gmm) if needed."""
+        if cat not in self.segment_gmms[weekday]:
+            self.segment_gmms[weekday][cat] = load_gmm(
+                self.speech_config.speech.data.folder, weekday,
+                self.speech_config.speech.data.gmm_names[cat], self.g)
+        return self.segment_gmms[weekday][cat]
 
 
 class LoadProfile(object):
@@ -437,6 +1006,8 @@ class LoadProfile(object):
 
     Methods:
          calculate_load: calculate the total load for each segment
+         calculate_expected_load: calculate the expected total load for each segment, without sampling
+         start_times_and_energies: post-process sessions parameters generated by a GMM
          end_times_and_load: calculate the uncontrolled load profiles for a set of sessions
     """
 
@@ -450,13 +1021,18 @@ class LoadProfile(object):
         self.load_segments_array = np.zeros((self.config.num_time_steps,
                                              self.config.speech.data.num_categories))
 
-    def calculate_load(self, return_individual_session_parameters=False):
+    def calculate_load(self, return_individual_session_parameters=False, rng=None):
         """For each segment, calculate the total load profile.
         For each segment, the process is as follows:
             Step 1: generate sessions parameters using the segment GMM, stored in full_output
             Step 2: post-process parameters
             Step 3: calculate sessions load profiles, calling end_times_and_load
             Step 4: store the result
+
+        Parameters:
+            return_individual_session_parameters: also return the parameters of the generated sessions
+            rng: np.random.Generator to generate sessions with, optional. The GMM random states and the global
+                NumPy random state are used if not given.
         """
 
         if return_individual_session_parameters:
@@ -468,21 +1044,16 @@ class LoadProfile(object):
             self.group_config.segment_session_numbers[self.weekday][cat]
             if num_vehicles > 0:
                 gmm = self.group_config.segment_gmms[self.weekday][cat]
-                full_output = gmm.sample(num_vehicles)
-                output = full_output[0]
-                output = output[np.random.choice(np.shape(output)[0],
-                                                 np.shape(output)[0],
-                                                 replace=False), :]
-                if self.config.speech.data.start_mod == 1:
-                    start_times = (
-                                self.config.speech.data.start_time_scaler * np.mod(
-                            24 * 3600 * output[:, 0], 24 * 3600)).astype(int)
+                if rng is None:
+                    full_output = gmm.sample(num_vehicles)
+                    output = full_output[0]
+                    output = output[np.random.choice(np.shape(output)[0],
+                                                     np.shape(output)[0],
+                                                     replace=False), :]
                 else:
-                    start_times = (
-                                self.config.speech.data.start_time_scaler * np.mod(
-                            output[:, 0], 24 * 3600)).astype(int)
-                energies = np.clip(np.abs(output[:, 1]), 0,
-                                   self.config.energy_clip)
+                    output = sample_gmm(gmm, num_vehicles, rng)
+                    output = output[rng.permutation(np.shape(output)[0]), :]
+                start_times, energies = self.start_times_and_energies(output)
                 end_times, load = self.end_times_and_load(start_times, energies,
                                                           self.config.speech.data.rates[
                                                               segment_number])
@@ -507,6 +1078,45 @@ class LoadProfile(object):
         if return_individual_session_parameters:
             return individual_session_parameters
 
+    def start_times_and_energies(self, output):
+        """Post-process sessions parameters generated by a segment GMM into start time indices and energies."""
+        if self.config.speech.data.start_mod == 1:
+            start_times = (
+                        self.config.speech.data.start_time_scaler * np.mod(
+                    24 * 3600 * output[:, 0], 24 * 3600)).astype(int)
+        else:
+            start_times = (
+                        self.config.speech.data.start_time_scaler * np.mod(
+                    output[:, 0], 24 * 3600)).astype(int)
+        energies = np.clip(np.abs(output[:, 1]), 0,
+                           self.config.energy_clip)
+        return start_times, energies
+
+    def calculate_expected_load(self):
+        """For each segment, calculate the expected total load profile, without sampling sessions.
+        The load is the expected number of sessions (drivers in the group times the mean of pz) times the expected
+        load of one session (see expected_session_load), so it doesn't depend on the sampled drivers. The expected
+        load of one session is calculated once per GMM object and reused.
+        """
+        data = self.config.speech.data
+        zkey = data.zkey_weekday if self.weekday == 'weekday' else data.zkey_weekend
+        for segment_number in range(data.num_categories):
+            cat = data.categories[segment_number]
+            load = np.zeros((self.config.num_time_steps,))
+            if self.config.speech.has_gmm(self.weekday, cat, self.group_config.g):
+                gmm = self.group_config.segment_gmm(self.weekday, cat)
+                num_sessions = self.group_config.total_drivers * \
+                    self.config.speech.pz[self.weekday][self.group_config.g][cat + zkey].mean()
+                args = (data.rates[segment_number], self.config.energy_clip, self.config.time_steps_per_hour,
+                        self.config.num_time_steps, data.start_time_scaler, data.start_mod)
+                key = (gmm.weights_.tobytes(),) + args
+                session_loads = _expected_session_loads.setdefault(gmm, {})
+                if key not in session_loads:
+                    session_loads[key] = expected_session_load(gmm, *args)
+                load = num_sessions * session_loads[key]
+            self.load_segments_dict[data.labels[segment_number]] = load
+            self.load_segments_array[:, segment_number] = load
+
     def end_times_and_load(self, start_times, energies, rate):
         """Calculate the load profile given data on individual sessions.
 
@@ -520,40 +1130,9 @@ class LoadProfile(object):
              load: total load from the set of sessions, a time series in kW
             """
 
-        time_steps_per_hour = self.config.time_steps_per_hour
-        num_time_steps = self.config.num_time_steps
-        load = np.zeros((num_time_steps,))
-        end_times = np.zeros(np.shape(start_times)).astype(int)
-
-        lengths = (time_steps_per_hour * energies / rate).astype(int)
-        extra_charges = energies - lengths * rate / time_steps_per_hour
-        inds1 = np.where((start_times + lengths) > num_time_steps)[0]
-        inds2 = np.delete(np.arange(0, np.shape(end_times)[0]), inds1)
-
-        end_times[inds1] = (np.minimum(
-            start_times[inds1].astype(int) + lengths[inds1] - num_time_steps,
-            num_time_steps)).astype(int)
-        end_times[inds2] = (start_times[inds2] + lengths[inds2]).astype(int)
-        inds3 = np.where(end_times >= num_time_steps)[0]
-        inds4 = np.delete(np.arange(0, np.shape(end_times)[0]), inds3)
-
-        for i in range(len(inds1)):
-            idx = int(inds1[i])
-            load[np.arange(int(start_times[idx]),
-                           num_time_steps)] += rate * np.ones(
-                (num_time_steps - int(start_times[idx]),))
-            load[np.arange(0, end_times[idx])] += rate * np.ones(
-                (end_times[idx],))
-        for i in range(len(inds2)):
-            idx = int(inds2[i])
-            load[np.arange(int(start_times[idx]),
-                           end_times[idx])] += rate * np.ones((lengths[idx],))
-        load[0] += np.sum(extra_charges[inds3] * time_steps_per_hour)
-        for i in range(len(inds4)):
-            load[end_times[int(inds4[i])]] += extra_charges[int(
-                inds4[i])] * time_steps_per_hour
-
-        return end_times, load
+        return session_end_times_and_load(start_times, energies, rate,
+                                          self.config.time_steps_per_hour,
+                                          self.config.num_time_steps)
 
 
 class Plotting(object):
@@ -592,7 +1171,10 @@ class Plotting(object):
         nrow = int(np.ceil(np.divide(self.speech.data.ng, 4)))
         fig, axes = plt.subplots(nrow, 4, sharex=True, sharey=True,
                                  figsize=(12, int(nrow * 3)))
-        config = copy.deepcopy(self.config)
+        # Registered GMMs are shared, not copied, as they are reloaded from the registry below anyway
+        with _gmm_registry_lock:
+            memo = {id(gmm): gmm for gmm in _gmm_registry.values()}
+        config = copy.deepcopy(self.config, memo)
         ymax = 0
         for i in range(self.speech.data.ng):
             row = int(np.divide(i, 4))
@@ -714,40 +1296,9 @@ class Plotting(object):
 
     def end_times_and_load(self, start_times, energies, rate):
 
-        time_steps_per_hour = self.config.time_steps_per_hour
-        num_time_steps = self.config.num_time_steps
-        load = np.zeros((num_time_steps,))
-        end_times = np.zeros(np.shape(start_times)).astype(int)
-
-        lengths = (time_steps_per_hour * energies / rate).astype(int)
-        extra_charges = energies - lengths * rate / time_steps_per_hour
-        inds1 = np.where((start_times + lengths) > num_time_steps)[0]
-        inds2 = np.delete(np.arange(0, np.shape(end_times)[0]), inds1)
-
-        end_times[inds1] = (np.minimum(
-            start_times[inds1].astype(int) + lengths[inds1] - num_time_steps,
-            num_time_steps)).astype(int)
-        end_times[inds2] = (start_times[inds2] + lengths[inds2]).astype(int)
-        inds3 = np.where(end_times >= num_time_steps)[0]
-        inds4 = np.delete(np.arange(0, np.shape(end_times)[0]), inds3)
-
-        for i in range(len(inds1)):
-            idx = int(inds1[i])
-            load[np.arange(int(start_times[idx]),
-                           num_time_steps)] += rate * np.ones(
-                (num_time_steps - int(start_times[idx]),))
-            load[np.arange(0, end_times[idx])] += rate * np.ones(
-                (end_times[idx],))
-        for i in range(len(inds2)):
-            idx = int(inds2[i])
-            load[np.arange(int(start_times[idx]),
-                           end_times[idx])] += rate * np.ones((lengths[idx],))
-        load[0] += np.sum(extra_charges[inds3] * time_steps_per_hour)
-        for i in range(len(inds4)):
-            load[end_times[int(inds4[i])]] += extra_charges[int(
-                inds4[i])] * time_steps_per_hour
-
-        return end_times, load
+        return session_end_times_and_load(start_times, energies, rate,
+                                          self.config.time_steps_per_hour,
+                                          self.config.num_time_steps)
 
     def plot_single(self, load_segments_array, load_segments_dict,
                     legend_subset=None, set_ylim=None, save_str=None,
@@ -0,0 +1,202 @@
+"""Class for a precomputed month x daytype x time of day summary (cube) of
+timeseries data, from which 24hr loadshapes are reduced without scanning
+the timeseries again."""
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+class LoadshapeCube:
+    """Sum, count and max of every column of timeseries data binned by
+    month (12), daytype (weekday, weekend), hour of the day (24) and
+    time step within the hour (e.g. 4 for 15-minute data).
+
+    Reducing the cube gives the same 24hr loadshapes as
+    Timeseries.timeseries_aggregate.
+    """
+    def __init__(self, columns, minutes, sums, counts, maxs, rows, float32_columns=None):
+        """ LoadshapeCube initialization, see `from_dataframe` to build one from data.
+
+        Parameters
+        ----------
+        columns : list of str
+            Columns of the data.
+
+        minutes : list of int
+            Minutes of the hour of the time steps in the data.
+
+        sums, counts, maxs : np.ndarray
+            Sum, number of non-missing values and max of each column
+            in each bin, shaped (12, 2, 24, len(minutes), len(columns)).
+
+        rows : np.ndarray
+            Number of rows in each bin, shaped (12, 2, 24, len(minutes)).
+
+        float32_columns : list of str
+            Columns that are float32 in the data, optional.
+        """
+        self.columns = list(columns)
+        self.minutes = list(minutes)
+        self.sums = sums
+        self.counts = counts
+        self.maxs = maxs
+        self.rows = rows
+        self.float32_columns = list(float32_columns) if float32_columns is not None else []
+
+    @classmethod
+    def from_dataframe(cls, df):
+        """Build cube from timeseries data.
+
+        PARAMETERS
+        ----------
+        df : pd.DataFrame
+            Data with a pd.DatetimeIndex. Like in Timeseries.timeseries_aggregate,
+            the last row (first data point of the next year) is left out.
+
+        RETURNS
+        -------
+        cube : LoadshapeCube
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise NotImplementedError("Dataframe index is not pd.DatetimeIndex type; convert index to datetime formate before passing dataframe")
+
+        df = df[:-1].select_dtypes(include=['number', 'bool'])
+        index = df.index
+        minutes = np.unique(index.minute.to_numpy())
+        steps = np.searchsorted(minutes, index.minute.to_numpy())
+        segments = (index.month.to_numpy() - 1) * 2 + (index.weekday.to_numpy() > 4)
+        bins = (segments * 24 + index.hour.to_numpy()) * len(minutes) + steps
+        n_bins = 12 * 2 * 24 * len(minutes)
+
+        grouped = df.astype(float).groupby(bins)
+        present = grouped.size().index.to_numpy()
+        sums = np.zeros((n_bins, len(df.columns)))
+        counts = np.zeros((n_bins, len(df.columns)))
+        maxs = np.full((n_bins, len(df.columns)), np.nan)
+        sums[present] = grouped.sum().to_numpy()
+        counts[present] = grouped.count().to_numpy()
+        maxs[present] = grouped.max().to_numpy()
+        rows = np.bincount(bins, minlength=n_bins)
+
+        shape = (12, 2, 24, len(minutes))
+        float32_columns = [col for col, dtype in df.dtypes.items() if dtype == np.float32]
+        return cls(df.columns, minutes, sums.reshape(*shape, -1), counts.reshape(*shape, -1),
+                   maxs.reshape(*shape, -1), rows.reshape(shape), float32_columns)
+
+    @classmethod
+    def load(cls, filename):
+        """Load cube saved with `save`."""
+        with np.load(filename, allow_pickle=False) as f:
+            return cls(f["columns"].tolist(), f["minutes"].tolist(), f["sums"], f["counts"],
+                       f["maxs"], f["rows"], f["float32_columns"].tolist())
+
+    def save(self, filename):
+        """Save cube to a .npz file."""
+        # Write then rename so readers never see a partial file
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filename)), suffix=".npz")
+        os.close(fd)
+        try:
+            np.savez(tmp_filename, columns=np.array(self.columns, dtype=str),
+                     minutes=np.array(self.minutes, dtype=int),
+                     sums=self.sums, counts=self.counts, maxs=self.maxs, rows=self.rows,
+                     float32_columns=np.array(self.float32_columns, dtype=str))
+            os.replace(tmp_filename, filename)
+        finally:
+            if os.path.exists(tmp_filename):
+                os.remove(tmp_filename)
+
+    @classmethod
+    def cached(cls, filename):
+        """Get the cube of a Parquet data file, stored next to it.
+        The cube is built (and saved) if it doesn't exist or if it's older
+        than the data file.
+
+        PARAMETERS
+        ----------
+        filename : str
+            Full path to Parquet file with the timeseries data.
+
+        RETURNS
+        -------
+        cube : LoadshapeCube
+        """
+        cube_filename = os.path.splitext(filename)[0] + ".cube.npz"
+        if os.path.exists(cube_filename) and \
+                os.path.getmtime(cube_filename) >= os.path.getmtime(filename):
+            return cls.load(cube_filename)
+
+        cube = cls.from_dataframe(pd.read_parquet(filename))
+        cube.save(cube_filename)
+        return cube
+
+    def reduce(self, aggregation='avg', month_start=1, month_end=12, daytype=None, columns=None):
+        """Reduce the cube to a 24hr loadshape. Arguments are the same as
+        for Timeseries.timeseries_aggregate.
+
+        PARAMETERS
+        ----------
+        aggregation : str
+            'avg' (average of each time step in the day), 'sum' (sum across the
+            time period of each time step in the day) or 'max' (max of each hour).
+
+        month_start, month_end : int
+            Month range for aggregation, month_end is excluded.
+
+        daytype : str
+            'weekday', 'weekend' or None for no daytype filtering.
+
+        columns : list of str
+            Columns to return, optional. Columns not in the cube are ignored.
+
+        RETURNS
+        -------
+        df : pd.DataFrame
+            24hr loadshape.
+        """
+        daytypes = {'weekday': slice(0, 1), 'weekend': slice(1, 2), None: slice(0, 2)}
+        if daytype not in daytypes:
+            raise ValueError('Error: Weekday input is not right; have to use either "weekday" or "weekend" ')
+        if aggregation not in ('avg', 'sum', 'max'):
+            raise ValueError('Error: Aggregation input is not right; have to use one of the following: "avg", "sum", "max" ')
+
+        if columns is None:
+            columns = self.columns
+        columns = [col for col in columns if col in self.columns]
+        cols = [self.columns.index(col) for col in columns]
+        months = slice(max(month_start, 1) - 1, max(month_end - 1, 0))
+        selection = (months, daytypes[daytype])
+
+        rows = self.rows[selection].sum(axis=(0, 1))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if aggregation == 'max':
+                maxs = self.maxs[selection][..., cols]
+                maxs = maxs.reshape(-1, 24, len(self.minutes), len(cols)).swapaxes(1, 2).reshape(-1, 24, len(cols))
+                hours = np.full((24, len(cols)), np.nan)
+                has_max = ~np.isnan(maxs).all(axis=0)
+                if has_max.any():
+                    hours[has_max] = np.nanmax(maxs[:, has_max], axis=0)
+            else:
+                # each time step of the day is averaged (or summed), then the time steps of each hour are averaged
+                steps = self.sums[selection][..., cols].sum(axis=(0, 1))
+                if aggregation == 'avg':
+                    steps = steps / self.counts[selection][..., cols].sum(axis=(0, 1))
+                steps[rows == 0] = np.nan
+                steps_valid = ~np.isnan(steps)
+                hours = np.where(steps_valid, steps, 0).sum(axis=1) / steps_valid.sum(axis=1)
+        rows = rows.sum(axis=1)
+        hours[rows == 0] = np.nan
+
+        # hours range from the first to the last with data
+        hours_with_data = np.flatnonzero(rows)
+        if len(hours_with_data):
+            hours = hours[hours_with_data[0]:hours_with_data[-1] + 1]
+        else:
+            hours = hours[:0]
+
+        df = pd.DataFrame(hours, columns=columns)
+        for column in columns:
+            if column in self.float32_columns:
+                df[column] = df[column].astype(np.float32)
+        return df
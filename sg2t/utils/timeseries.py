@@ -1,7 +1,11 @@
 """Class for timeseries data with methods of common time axis manipulations."""
 import datetime
+import numpy as np
 import pandas as pd
 
+# Hour field equal to 24 in a datetime string (e.g. "01/01/1998 24:00")
+_HOUR_24 = r"(?:^|[ T])24(?::|$)"
+
 class Timeseries:
     def __init__(self, data):
         self.data = data
@@ -14,33 +18,58 @@ class Timeseries:
         return data_df
 
     @staticmethod
-    def make_datetime(series):
-        """Make series vals Datetime objects"""
+    def make_datetime(series, format=None):
+        """Make series vals Datetime objects, hour 24 (end of day) is
+        converted to 00 of the next day, see `convert_hour_type`.
+
+        PARAMETERS
+        ----------
+        series : pd.Series
+            Datetimes as strings, or already as datetimes.
+
+        format : str
+            Datetime format, e.g. "%m/%d/%Y %H:%M", optional. Inferred from the
+            first value if not given.
+
+        RETURNS
+        -------
+        series : pd.Series
+            Datetimes.
+        """
+        if pd.api.types.is_datetime64_any_dtype(series):
+            return series
         try:
-            series = pd.to_datetime(series)
+            return Timeseries.convert_hour_type(series, format)
         except ValueError as e:
-            e = str(e)
-            if e[:21] == "hour must be in 0..23":
-                # Data set needs cleaning to convert to
-                # hours following 00-23 format
-                series = self.convert_hour_type(series)
-                series = pd.to_datetime(series)
-            else:
-                raise NotImplementedError("Datetime exception not handled.")
-        return series
-
-    def convert_hour_type(self, series):
-        """Method to convert hours to 00-23 format"""
-        for i in range(len(series)):
-            date = series[i]
-            date_str, time_str = date.split(" ")
-            HH, MM = time_str.split(":")
-
-            if HH == "24":
-                HH = "00"
-                date = date_str + " " + HH + ":" + MM
-                series[i] = date
-        return series
+            raise NotImplementedError(f"Datetime exception not handled: {e}")
+
+    @staticmethod
+    def convert_hour_type(series, format=None):
+        """Method to convert hours to 00-23 format: datetimes with hour 24
+        are parsed as 00 of the next day.
+
+        PARAMETERS
+        ----------
+        series : pd.Series
+            Datetimes as strings.
+
+        format : str
+            Datetime format, optional. Inferred from the first value if not given.
+
+        RETURNS
+        -------
+        series : pd.Series
+            Datetimes.
+        """
+        series = pd.Series(series).astype(str)
+        # Hour 24 is the first time field, after the date
+        end_of_day = series.str.contains(_HOUR_24, regex=True)
+        if not end_of_day.any():
+            return pd.to_datetime(series, format=format)
+
+        series[end_of_day] = series[end_of_day].str.replace(r"(^|[ T])24(:|$)", r"\g<1>00\g<2>", n=1, regex=True)
+        series = pd.to_datetime(series, format=format)
+        return series + pd.to_timedelta(end_of_day.to_numpy(dtype=int), unit="D")
 
     @staticmethod
     def timeseries_aggregate(df, aggregation = 'avg', month_start = 1, month_end = 12, daytype = None):
@@ -77,40 +106,155 @@ class Timeseries:
         df = df[:-1] 
 
         # filter data by month (could be for a specific month or for a range of months)
-        df = df[df.index.month.isin([i for i in range(month_start, month_end)])]
+        months = df.index.month.to_numpy()
+        mask = (months >= month_start) & (months < month_end)
 
         # filter data by daytype
         if daytype == 'weekday':
-            df = df[df.index.weekday <= 4]
+            mask &= df.index.weekday.to_numpy() <= 4
         elif daytype == 'weekend':
-            df = df[df.index.weekday > 4]
+            mask &= df.index.weekday.to_numpy() > 4
         elif daytype == None:
-            df = df
+            pass
         else: 
             raise ValueError('Error: Weekday input is not right; have to use either "weekday" or "weekend" ')
 
-        # aggregate data using groupby with the corresponding aggregation type
-        if aggregation == 'avg':
-            df_aggregated = df.groupby([(df.index.hour),(df.index.minute)]).mean(numeric_only=True)
-        elif aggregation == 'sum':
-            df_aggregated = df.groupby([(df.index.hour),(df.index.minute)]).sum(numeric_only=True)
-        elif aggregation == 'peak_day':
-            # find peak load day based on "Electricity Total" column
-            peak_day = df[df["Electricity Total"] == df["Electricity Total"].max()].index[0]
-            df_aggregated = df[(df.index.day == peak_day.day) & (df.index.month == peak_day.month)]
-        else:
+        if aggregation == 'peak_day':
+            # keep only the peak load day based on "Electricity Total" column
+            load = df["Electricity Total"].to_numpy()
+            peak_day = df.index[np.flatnonzero(mask)[np.nanargmax(load[mask])]]
+            mask &= (df.index.day == peak_day.day) & (df.index.month == peak_day.month)
+        elif aggregation not in ('avg', 'sum'):
             raise ValueError('Error: Aggregation input is not right; have to use one of the following: "avg", "sum", "peak_day" ')
 
-        # change index and group by each hour
-        df_aggregated.index.names = ['hour', 'minute']
-        df_aggregated.reset_index(inplace=True)
-        df_aggregated['datetime'] = pd.to_datetime(df_aggregated['hour'].astype(str) + ':' + df_aggregated['minute'].astype(str), format='%H:%M')
+        df = df.select_dtypes(include=['number', 'bool'])
+        # one row per column (a view of the dataframe's data when it's a single float block)
+        values = df.to_numpy(dtype=float).T.compress(mask, axis=1)
+        bins = (df.index.hour * 60 + df.index.minute).to_numpy().astype(np.intp)[mask]
+        totals, counts, rows = Timeseries._bin_totals(values, bins, 24 * 60)
+        return Timeseries._hourly_profile(totals, counts, rows, aggregation == 'sum', df.columns, df.dtypes)
+
+    @staticmethod
+    def timeseries_aggregate_windows(df, windows):
+        """ 
+        Takes timeseries data and returns the aggregated 24hr dataframe of several windows at once.
+        Same as calling timeseries_aggregate for each window, but the data is only scanned once:
+        it's binned by month, daytype and minute of the day and each window is reduced from the bins.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            dataframe where index is datatime type and include other column/s with numbers
+
+        windows: list of dict
+            each window has the timeseries_aggregate arguments as keys: 'aggregation', 'month_start', 'month_end'
+            and 'daytype' (missing keys take the timeseries_aggregate defaults), and optionally a 'name'
+            for example:
+                [{'name': 'summer weekday', 'month_start': 6, 'month_end': 9, 'daytype': 'weekday'},
+                 {'name': 'january', 'aggregation': 'sum', 'month_start': 1, 'month_end': 2}]
+
+        Returns
+        -------
+        df: pd.DataFrame
+            aggregated dataframes of all windows, indexed by window name and hour
+            windows without a name are named "<aggregation>_<month_start>-<month_end>_<daytype>"
+        """
+        if not isinstance(df.index, pd.DatetimeIndex):
+            raise NotImplementedError("Dataframe index is not pd.DatetimeIndex type; convert index to datetime formate before passing dataframe") 
+
+        windows = [{'aggregation': 'avg', 'month_start': 1, 'month_end': 12, 'daytype': None, **window} for window in windows]
+        for window in windows:
+            if window['daytype'] not in ('weekday', 'weekend', None):
+                raise ValueError('Error: Weekday input is not right; have to use either "weekday" or "weekend" ')
+            if window['aggregation'] not in ('avg', 'sum', 'peak_day'):
+                raise ValueError('Error: Aggregation input is not right; have to use one of the following: "avg", "sum", "peak_day" ')
+            window.setdefault('name', f"{window['aggregation']}_{window['month_start']}-{window['month_end']}_{window['daytype']}")
+
+        # remove last row as df includes next year first data point (01-01 00:00:00)      
+        df_all, df = df, df[:-1]
+        df_numeric = df.select_dtypes(include=['number', 'bool'])
+
+        # bin every row by (month, daytype, minute of the day) in one pass
+        n_minutes = 24 * 60
+        segments = (df.index.month.to_numpy() - 1) * 2 + (df.index.weekday.to_numpy() > 4)
+        bins = segments.astype(np.intp) * n_minutes + (df.index.hour * 60 + df.index.minute).to_numpy()
+        totals, counts, rows = Timeseries._bin_totals(df_numeric.to_numpy(dtype=float).T, bins, 12 * 2 * n_minutes)
+        totals = totals.reshape(12, 2, n_minutes, -1)
+        counts = counts.reshape(12, 2, n_minutes, -1) if counts is not None else None
+        rows = rows.reshape(12, 2, n_minutes)
+
+        profiles = {}
+        for window in windows:
+            if window['aggregation'] == 'peak_day':
+                # depends on the daily peaks, not on the bins
+                profiles[window['name']] = Timeseries.timeseries_aggregate(
+                    df_all, window['aggregation'], window['month_start'], window['month_end'], window['daytype'])
+                continue
+            months = slice(max(window['month_start'], 1) - 1, max(window['month_end'] - 1, 0))
+            daytypes = {'weekday': slice(0, 1), 'weekend': slice(1, 2), None: slice(0, 2)}[window['daytype']]
+            profiles[window['name']] = Timeseries._hourly_profile(
+                totals[months, daytypes].sum(axis=(0, 1)),
+                counts[months, daytypes].sum(axis=(0, 1)) if counts is not None else None,
+                rows[months, daytypes].sum(axis=(0, 1)),
+                window['aggregation'] == 'sum', df_numeric.columns, df_numeric.dtypes)
+
+        return pd.concat(profiles, names=['window', 'hour'])
+
+    @staticmethod
+    def _bin_totals(values, bins, n_bins):
+        """ 
+        Sums values (one row per column) by bin in one pass.
+        Returns the totals and the number of non-missing values (None if no value is missing) of each bin and column,
+        and the number of rows in each bin.
+        """
+        valid = ~np.isnan(values)
+        has_nan = not valid.all()
+        if has_nan:
+            values = np.where(valid, values, 0)
+        # bincount returns integers for an empty selection, whatever the weights
+        totals = np.stack([np.bincount(bins, weights=col, minlength=n_bins) for col in values], axis=1).astype(float)
+        if has_nan:
+            counts = np.stack([np.bincount(bins, weights=col, minlength=n_bins) for col in valid], axis=1).astype(float)
+        else:
+            counts = None
+        rows = np.bincount(bins, minlength=n_bins)
+        return totals, counts, rows
+
+    @staticmethod
+    def _hourly_profile(totals, counts, rows, total, columns, dtypes):
+        """ 
+        Makes the 24hr profile from the binned totals of each minute of the day (see _bin_totals):
+        each minute of the day is averaged (or summed if total is True) and the minutes of each hour are then averaged.
+        Missing values are skipped. Hours range from the first to the last with data.
+        """
+        n_cols = totals.shape[1]
+        if total:
+            minutes = totals.copy()
+        else:
+            if counts is None:
+                counts = rows[:, None]
+            with np.errstate(invalid='ignore', divide='ignore'):
+                minutes = totals / counts
+        # minutes without data are not part of the hourly averages
+        minutes[rows == 0] = np.nan
+
+        minutes = minutes.reshape(24, 60, n_cols)
+        minutes_valid = ~np.isnan(minutes)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            hours = np.where(minutes_valid, minutes, 0).sum(axis=1) / minutes_valid.sum(axis=1)
+
+        hours_with_data = np.flatnonzero(rows.reshape(24, 60).sum(axis=1))
+        if len(hours_with_data):
+            hours = hours[hours_with_data[0]:hours_with_data[-1] + 1]
+        else:
+            hours = hours[:0]
 
-        # Set datetime as the index
-        df_aggregated.set_index('datetime', inplace=True)
-        df_resampled = df_aggregated.resample('h').mean()
-        df_resampled = df_resampled.drop(['hour', 'minute'], axis=1)
-        return df_resampled.reset_index(drop=True)
+        df_aggregated = pd.DataFrame(hours, columns=columns)
+        # keep float32 data as float32
+        for column, dtype in dtypes.items():
+            if dtype == np.float32:
+                df_aggregated[column] = df_aggregated[column].astype(np.float32)
+        return df_aggregated
 
     # adjust below
     def get_daytype(self, value):
@@ -0,0 +1,230 @@
+"""Vectorized derived weather metrics.
+
+All functions take arrays (or scalars) in SI units, with temperatures in
+degrees C, relative humidity in %, pressure in mbar and wind speed in m/s,
+and work on any number of stations and hours at once.
+"""
+import numpy as np
+
+
+# Standard atmospheric pressure in mbar
+STANDARD_PRESSURE = 1013.25
+
+# Magnus formula coefficients over water (Alduchov and Eskridge 1996)
+MAGNUS_A = 17.625
+MAGNUS_B = 243.04
+
+
+def saturation_vapor_pressure(t):
+    """Saturation vapor pressure over water (Magnus formula).
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    Returns
+    -------
+    out : float or array
+        Saturation vapor pressure in mbar.
+    """
+    return 6.1094 * np.exp(MAGNUS_A * t / (t + MAGNUS_B))
+
+
+def dew_point(t, rh):
+    """Dew point temperature (Magnus formula).
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    rh : float or array
+        Relative humidity in %.
+
+    Returns
+    -------
+    out : float or array
+        Dew point temperature in degrees C.
+    """
+    with np.errstate(divide="ignore"):
+        gamma = np.log(np.asarray(rh, dtype=float) / 100) + MAGNUS_A * t / (t + MAGNUS_B)
+    return MAGNUS_B * gamma / (MAGNUS_A - gamma)
+
+
+def humidity_ratio(t, rh, pressure=STANDARD_PRESSURE):
+    """Humidity ratio of moist air.
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    rh : float or array
+        Relative humidity in %.
+
+    pressure : float or array
+        Atmospheric pressure in mbar, default is standard pressure.
+
+    Returns
+    -------
+    out : float or array
+        Humidity ratio in kg water / kg dry air.
+    """
+    vapor_pressure = np.asarray(rh, dtype=float) / 100 * saturation_vapor_pressure(t)
+    return 0.621945 * vapor_pressure / (pressure - vapor_pressure)
+
+
+def enthalpy(t, rh, pressure=STANDARD_PRESSURE):
+    """Specific enthalpy of moist air (ASHRAE Fundamentals).
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    rh : float or array
+        Relative humidity in %.
+
+    pressure : float or array
+        Atmospheric pressure in mbar, default is standard pressure.
+
+    Returns
+    -------
+    out : float or array
+        Enthalpy in kJ/kg dry air.
+    """
+    w = humidity_ratio(t, rh, pressure)
+    return 1.006 * t + w * (2501 + 1.86 * t)
+
+
+def wet_bulb(t, rh, pressure=STANDARD_PRESSURE, iterations=4):
+    """Psychrometric (thermodynamic) wet bulb temperature.
+
+    Solved with Newton iterations on the psychrometric equation
+    (ASHRAE Fundamentals), starting from Stull's (2011) approximation.
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    rh : float or array
+        Relative humidity in %.
+
+    pressure : float or array
+        Atmospheric pressure in mbar, default is standard pressure.
+
+    iterations : int
+        Number of Newton iterations, default is 4.
+
+    Returns
+    -------
+    out : float or array
+        Wet bulb temperature in degrees C.
+    """
+    t = np.asarray(t, dtype=float)
+    rh = np.asarray(rh, dtype=float)
+    w = humidity_ratio(t, rh, pressure)
+
+    # Stull (2011), within about 1 degree C for usual conditions
+    tw = t * np.arctan(0.151977 * np.sqrt(rh + 8.313659)) + np.arctan(t + rh) \
+        - np.arctan(rh - 1.676331) + 0.00391838 * rh ** 1.5 * np.arctan(0.023101 * rh) - 4.686035
+    tw = np.minimum(tw, t)
+
+    def residual(tw):
+        ws = humidity_ratio(tw, 100, pressure)
+        return ((2501 - 2.326 * tw) * ws - 1.006 * (t - tw)) / (2501 + 1.86 * t - 4.186 * tw) - w
+
+    step = 1e-3
+    for _ in range(iterations):
+        f = residual(tw)
+        slope = (residual(tw + step) - f) / step
+        tw = np.minimum(tw - f / slope, t)
+    return tw
+
+
+def wind_chill(t, wind_speed):
+    """Wind chill temperature (NWS 2001 formula), equal to the dry bulb
+    temperature where it's not defined (above 10 degrees C or wind
+    speeds under 4.8 km/h).
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    wind_speed : float or array
+        Wind speed in m/s.
+
+    Returns
+    -------
+    out : float or array
+        Wind chill temperature in degrees C.
+    """
+    t = np.asarray(t, dtype=float)
+    v = np.asarray(wind_speed, dtype=float) * 3.6  # km/h
+    with np.errstate(invalid="ignore"):
+        v16 = v ** 0.16
+    chill = 13.12 + 0.6215 * t - 11.37 * v16 + 0.3965 * t * v16
+    return np.where((t <= 10) & (v > 4.8), chill, t)
+
+
+def apparent_temperature(t, rh, wind_speed, heat_index):
+    """Apparent temperature, as used by NWS: heat index above 80 degrees F
+    (26.7 degrees C), wind chill where it's defined and dry bulb
+    temperature otherwise.
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    rh : float or array
+        Relative humidity in %.
+
+    wind_speed : float or array
+        Wind speed in m/s.
+
+    heat_index : callable
+        Heat index in degrees F from temperature in degrees F and
+        relative humidity, e.g. Weather.heat_index_array.
+
+    Returns
+    -------
+    out : float or array
+        Apparent temperature in degrees C.
+    """
+    t = np.asarray(t, dtype=float)
+    t_f = t * 9 / 5 + 32
+    hi = (heat_index(t_f, rh) - 32) * 5 / 9
+    return np.where(t_f >= 80, hi, wind_chill(t, wind_speed))
+
+
+def degree_hours(t, base, kind="heating", hours=1.0):
+    """Heating or cooling degree hours of each time step.
+
+    Parameters
+    ----------
+    t : float or array
+        Dry bulb temperature in degrees C.
+
+    base : float
+        Base temperature in degrees C.
+
+    kind : str
+        "heating" (base - t when t < base) or "cooling" (t - base when t > base).
+
+    hours : float or array
+        Duration of the time steps in hours, default is 1.
+
+    Returns
+    -------
+    out : float or array
+        Degree hours in degrees C h.
+    """
+    if kind == "heating":
+        return np.maximum(base - np.asarray(t, dtype=float), 0) * hours
+    elif kind == "cooling":
+        return np.maximum(np.asarray(t, dtype=float) - base, 0) * hours
+    raise ValueError('Error: Degree hours kind input is not right; have to use either "heating" or "cooling" ')
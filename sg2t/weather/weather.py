@@ -1,6 +1,7 @@
 """This is the main class for working with weather data."""
 import os
 import datetime
+import hashlib
 from math import sqrt
 
 import numpy as np
@@ -9,10 +10,32 @@ import json
 
 from sg2t.config import load_config
 from sg2t.utils.io import load_metadata
+from sg2t.weather import metrics as wm
 
 
 # add here required desc of weather data based on schema
 
+# Derived metrics (see get_metrics) and their units
+METRICS = {
+    "Dew Point": "degrees C",
+    "Wet Bulb": "degrees C",
+    "Enthalpy": "kJ/kg",
+    "Wind Chill": "degrees C",
+    "Apparent Temperature": "degrees C",
+    "Heat Index": "degrees C",
+    "Heating Degree Hours": "degrees C h",
+    "Cooling Degree Hours": "degrees C h",
+}
+
+# Names of the columns used by the derived metrics in the
+# sg2t weather formats (TMY3, TMY3Stock)
+INPUT_COLUMNS = {
+    "temperature": ["Temperature", "Dry-bulb Temperature"],
+    "rh": ["Rel Humidity", "Relative Humidity"],
+    "pressure": ["Pressure"],
+    "wind_speed": ["Wspd", "Wind Speed"],
+}
+
 
 class Weather:
     """Weather class for working with weather data."""
@@ -45,6 +68,9 @@ class Weather:
         self.config = self.load_config(config_name, config_key)
         self.metadata_file = metadata_file
         self.metadata = self.load_metadata(self.metadata_file)
+        # Derived metrics already computed, by (station, metric, parameters),
+        # with the fingerprint of the inputs they were computed from
+        self._metrics_cache = {}
 
     def load_config(self, config_name=None, key=None):
         """Load weather configuration.
@@ -120,34 +146,66 @@ class Weather:
                         marker=marker,
                         **kwargs)
 
-    def between_dates(self, start, end, columns=None):
+    def between_dates(self, start=None, end=None, columns=None, windows=None):
         """Method to get data between two specific dates.
          Includes both end-points in the result *if* they
          are in the index. Columns optional otherwise all
          are returned.
 
+         Data with a sorted pandas.DatetimeIndex (as from sg2t.io)
+         is selected by binary search on the index.
+
         Parameters
         ----------
         start : str
-            Start date in form 'YYYY-M-D'.
+            Start date in form 'YYYY-M-D' (or any datetime).
 
         end : str
-            End date in form 'YYYY-M-D'.
+            End date in form 'YYYY-M-D' (or any datetime).
 
         columns : list of str
             List of columns to include. Optional.
 
+        windows : list of tuple
+            List of (start, end) windows to select at once instead of
+            start and end, optional. Rows of each window are returned
+            in the order of the windows.
+
         Returns
         -------
         out : pandas.DataFrame
             Returns the subset of the original DF that
              falls between start and end.
         """
-        # check that date col is datetime object?
-        # or do validation at instantiation?
-        l_cond = self.data['Date'] > start
-        r_cond = self.data['Date'] <= end
-        data_cond = self.data[(l_cond) & (r_cond)]
+        if windows is None:
+            windows = [(start, end)]
+
+        data = self.data
+        if isinstance(data.index, pd.DatetimeIndex):
+            if not data.index.is_monotonic_increasing:
+                data = data.sort_index(kind="stable")
+            index = data.index
+            bounds = []
+            for window_start, window_end in windows:
+                left = 0 if window_start is None else index.searchsorted(pd.Timestamp(window_start), side="left")
+                right = len(index) if window_end is None else index.searchsorted(pd.Timestamp(window_end), side="right")
+                bounds.append((left, max(left, right)))
+            if len(bounds) == 1:
+                data_cond = data.iloc[bounds[0][0]:bounds[0][1]]
+            else:
+                data_cond = data.iloc[np.concatenate([np.arange(left, right) for left, right in bounds])]
+        else:
+            # check that date col is datetime object?
+            # or do validation at instantiation?
+            masks = []
+            for window_start, window_end in windows:
+                mask = pd.Series(True, index=data.index)
+                if window_start is not None:
+                    mask &= data['Date'] > window_start
+                if window_end is not None:
+                    mask &= data['Date'] <= window_end
+                masks.append(mask)
+            data_cond = pd.concat([data[mask] for mask in masks])
 
         if columns:
             data_cond = data_cond[columns]
@@ -174,7 +232,7 @@ class Weather:
         # Check both exist
         if "Temperature" not in self.data.columns or \
                 "Rel Humidity" not in self.data.columns:
-            raise("Missing Temperature or Rel Humidity columns for calculating HI.")
+            raise KeyError("Missing Temperature or Rel Humidity columns for calculating HI.")
 
         # Data
         temp = self.data["Temperature"]
@@ -189,7 +247,7 @@ class Weather:
                   "To convert, use Weather.c_to_f method.")
 
         # Calculate HI
-        hi_array_f = np.vectorize(self.heat_index)(temp, rh)
+        hi_array_f = self.heat_index_array(temp.to_numpy(dtype=float), rh.to_numpy(dtype=float))
         hi_array_c = self.f_to_c(hi_array_f)
 
         # Add to df and metadata and return series
@@ -202,6 +260,176 @@ class Weather:
 
         return self.data["Heat Index"]
 
+    def get_metrics(self, metrics=None, heating_base=18.0, cooling_base=18.0, station_column=None):
+        """Method to calculate derived weather metrics (see METRICS) in one pass
+        over the data. Metrics are added as columns to the data with their
+        units in the metadata. Results are cached per station, so only
+        stations that weren't computed before with the same parameters and
+        input data are.
+
+        Parameters
+        ----------
+        metrics : list of str
+            Names of the metrics, as in METRICS, optional. All metrics
+            are calculated if not given.
+
+        heating_base, cooling_base : float
+            Base temperatures for heating and cooling degree hours
+            in degrees C, default is 18.
+
+        station_column : str
+            Column with the station of each row for data of several
+            stations (e.g. "Station" in TMY3Catalog.get_data), optional.
+
+        Returns
+        -------
+        out : pandas.DataFrame
+            Returns the metrics columns.
+        """
+        if metrics is None:
+            metrics = list(METRICS.keys())
+        unknown = [metric for metric in metrics if metric not in METRICS]
+        if unknown:
+            raise ValueError(f"Unknown weather metrics: {unknown}; have to use the following: {list(METRICS.keys())}")
+
+        params = {"Heating Degree Hours": heating_base, "Cooling Degree Hours": cooling_base}
+        n_rows = len(self.data)
+        if station_column:
+            codes, stations = pd.factorize(self.data[station_column])
+        else:
+            codes, stations = np.zeros(n_rows, dtype=np.intp), [self.metadata.get("station", {}).get("station_number")]
+        order = np.argsort(codes, kind="stable")
+        positions = np.split(order, np.cumsum(np.bincount(codes, minlength=len(stations)))[:-1])
+
+        fingerprints = self._fingerprints(positions)
+
+        def cached(i, metric):
+            entry = self._metrics_cache.get((stations[i], metric, params.get(metric)))
+            return entry is not None and entry[0] == fingerprints[i]
+
+        todo = [i for i in range(len(stations)) if not all(cached(i, metric) for metric in metrics)]
+        if todo:
+            rows = np.concatenate([positions[i] for i in todo])
+            values = self._calculate_metrics(metrics, rows, heating_base, cooling_base)
+            start = 0
+            for i in todo:
+                end = start + len(positions[i])
+                for metric in metrics:
+                    self._metrics_cache[(stations[i], metric, params.get(metric))] = \
+                        (fingerprints[i], values[metric][start:end])
+                start = end
+
+        for metric in metrics:
+            column = np.empty(n_rows)
+            for i in range(len(stations)):
+                column[positions[i]] = self._metrics_cache[(stations[i], metric, params.get(metric))][1]
+            self.data[metric] = column
+            if self.metadata:
+                self.metadata["columns"][metric] = metric.lower()
+                self.metadata["col_units"][metric] = METRICS[metric]
+                self.metadata["col_types"][metric] = "float"
+
+        return self.data[metrics]
+
+    def degree_days(self, kind="heating", base=18.0, station_column=None):
+        """Method to calculate daily heating or cooling degree days,
+        as the daily sum of degree hours divided by 24. Data needs
+        a pandas.DatetimeIndex.
+
+        Parameters
+        ----------
+        kind : str
+            "heating" or "cooling".
+
+        base : float
+            Base temperature in degrees C, default is 18.
+
+        station_column : str
+            Column with the station of each row for data of several
+            stations, optional.
+
+        Returns
+        -------
+        out : pandas.Series
+            Degree days (degrees C day) per day (and station).
+        """
+        if kind not in ("heating", "cooling"):
+            raise ValueError('Error: Degree days kind input is not right; have to use either "heating" or "cooling" ')
+        metric = f"{kind.title()} Degree Hours"
+        self.get_metrics([metric], heating_base=base, cooling_base=base, station_column=station_column)
+
+        keys = [self.data[station_column]] if station_column else []
+        keys.append(self.data.index.normalize().rename("Date"))
+        degree_days = self.data[metric].groupby(keys, sort=True).sum() / 24
+        return degree_days.rename(f"{kind.title()} Degree Days")
+
+    def _fingerprints(self, positions):
+        """Hash of the inputs of the metrics (input columns, temperature units
+        and time step) at the rows of each station, so cached metrics are only
+        reused while the data they were computed from is unchanged."""
+        columns = [next((col for col in columns if col in self.data.columns), None)
+                   for columns in INPUT_COLUMNS.values()]
+        values = [self.data[column].to_numpy(dtype=float) for column in columns if column]
+        settings = repr((columns, self.metadata.get("col_units", {}).get(columns[0]), self._step_hours()))
+
+        fingerprints = []
+        for rows in positions:
+            fingerprint = hashlib.sha1(settings.encode())
+            for column_values in values:
+                fingerprint.update(column_values[rows].tobytes())
+            fingerprints.append(fingerprint.hexdigest())
+        return fingerprints
+
+    def _calculate_metrics(self, metrics, rows, heating_base, cooling_base):
+        """Calculate metrics on the given rows of the data."""
+        inputs = {}
+        for name, columns in INPUT_COLUMNS.items():
+            column = next((col for col in columns if col in self.data.columns), None)
+            inputs[name] = self.data[column].to_numpy(dtype=float)[rows] if column else None
+            if column and name == "temperature" and \
+                    self.metadata.get("col_units", {}).get(column) in ("degrees F", "F"):
+                inputs[name] = self.f_to_c(inputs[name])
+
+        def require(*names):
+            missing = [name for name in names if inputs[name] is None]
+            if missing:
+                raise KeyError(f"Missing {missing} columns for calculating weather metrics, "
+                               f"expected one of {[INPUT_COLUMNS[name] for name in missing]}.")
+            return [inputs[name] for name in names]
+
+        pressure = inputs["pressure"] if inputs["pressure"] is not None else wm.STANDARD_PRESSURE
+        values = {}
+        for metric in metrics:
+            if metric == "Dew Point":
+                values[metric] = wm.dew_point(*require("temperature", "rh"))
+            elif metric == "Wet Bulb":
+                values[metric] = wm.wet_bulb(*require("temperature", "rh"), pressure)
+            elif metric == "Enthalpy":
+                values[metric] = wm.enthalpy(*require("temperature", "rh"), pressure)
+            elif metric == "Wind Chill":
+                values[metric] = wm.wind_chill(*require("temperature", "wind_speed"))
+            elif metric == "Apparent Temperature":
+                values[metric] = wm.apparent_temperature(*require("temperature", "rh", "wind_speed"),
+                                                         self.heat_index_array)
+            elif metric == "Heat Index":
+                t, rh = require("temperature", "rh")
+                values[metric] = self.f_to_c(self.heat_index_array(self.c_to_f(t), rh))
+            else:
+                kind = "heating" if metric == "Heating Degree Hours" else "cooling"
+                base = heating_base if kind == "heating" else cooling_base
+                values[metric] = wm.degree_hours(require("temperature")[0], base, kind, self._step_hours())
+        return values
+
+    def _step_hours(self):
+        """Duration of the time steps of the data in hours (1 if unknown)."""
+        if not isinstance(self.data.index, pd.DatetimeIndex) or len(self.data) < 2:
+            return 1.0
+        steps = np.diff(self.data.index.values.astype("datetime64[ns]").astype(np.int64))
+        steps = steps[steps > 0]
+        if not len(steps):
+            return 1.0
+        return float(np.median(steps)) / 3.6e12
+
     @staticmethod
     def heat_index(t, rh):
         """Heat index (HI) calculation.
@@ -251,6 +479,55 @@ class Weather:
 
         return hi
 
+    @staticmethod
+    def heat_index_array(t, rh):
+        """Heat index (HI) calculation for arrays, see `heat_index`.
+        Gives the same results as `heat_index` applied to each element.
+
+        Parameters
+        ----------
+        t : array
+            Dry bulb temperature in degrees F.
+
+        rh : array
+            Relative humidity in %.
+
+        Returns
+        -------
+        out : array
+            Heat index.
+        """
+        t = np.asarray(t, dtype=float)
+        rh = np.asarray(rh, dtype=float)
+
+        # use simple formula if HI<80 degF
+        hi = 0.5 * (t + 61.0  + ((t - 68.0) * 1.2)  + (rh * 0.094))
+
+        # Rothfusz regression where HI>80 degF
+        regression = hi > 80
+        t_r = t[regression]
+        rh_r = rh[regression]
+        hi_r = -42.379 \
+               + 2.04901523 * t_r \
+               + 10.14333127 * rh_r \
+               - .22475541 * t_r * rh_r \
+               - .00683783 * t_r * t_r \
+               - .05481717 * rh_r * rh_r \
+               + .00122874 * t_r * t_r * rh_r \
+               + .00085282 * t_r * rh_r * rh_r \
+               - .00000199 * t_r * t_r * rh_r * rh_r
+
+        # adjustments to regression
+        low_rh = (rh_r < 13) & (t_r > 80) & (t_r < 112)
+        high_rh = ~low_rh & (rh_r > 85) & (t_r > 80) & (t_r < 87)
+        t_low, rh_low = t_r[low_rh], rh_r[low_rh]
+        hi_r[low_rh] -= ((13 - rh_low) / 4) * np.sqrt((17 - np.abs(t_low - 95.)) / 17)
+        t_high, rh_high = t_r[high_rh], rh_r[high_rh]
+        hi_r[high_rh] += ((rh_high - 85) / 10) * ((87 - t_high) / 5)
+
+        hi[regression] = hi_r
+        return hi
+
     @staticmethod
     def c_to_f(temp):
         """Degrees C to F conversion.
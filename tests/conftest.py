@@ -0,0 +1,22 @@
+"""Fixtures shared by the sg2t tests."""
+import time
+
+import numpy as np
+import pytest
+
+
+def _median_time(function, repeat=5):
+    """Median wall time of repeat calls to function, in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return np.median(times)
+
+
+@pytest.fixture
+def median_time():
+    """Times a function for the benchmarks (marked slow), which report timings
+    rather than assert them, since they depend on the machine."""
+    return _median_time
@@ -0,0 +1,117 @@
+"""Tests of reading NREL API data through the cache, against a local HTTP server."""
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.io.loadshapes.nrel.api import API
+from sg2t.io.loadshapes.nrel.cache import APICache
+
+ENERGY_COLUMNS = ["out.electricity.cooling.energy_consumption.kwh",
+                  "out.electricity.total.energy_consumption.kwh",
+                  "out.natural_gas.total.energy_consumption.kwh"]
+
+
+def make_csv(seed=0):
+    """Aggregate file in the layout of the data lake, timestamps in the 4th column."""
+    rng = np.random.default_rng(seed)
+    index = pd.date_range("2018-01-01 00:15", periods=96 * 3, freq="15min")
+    df = pd.DataFrame({
+        "in.state": "CA",
+        "in.geometry_building_type_recs": "Mobile Home",
+        "upgrade": 0,
+        "timestamp": index.strftime("%Y-%m-%d %H:%M:%S"),
+        "models_used": 12,
+        "units_represented": rng.random(len(index)) * 1000,
+    })
+    for column in ENERGY_COLUMNS:
+        df[column] = rng.random(len(index)) * 10
+    return df.to_csv(index=False).encode()
+
+
+def make_api(tmp_path, server, float32=False):
+    cache = APICache(cache_dir=str(tmp_path / "cache"), max_size_mb=10, max_age=0, offline=False)
+    api = API(cache=cache, float32=float32)
+    api.paths_amy_2018_v1["end_use_loads"] = server.url("/")
+    return api
+
+
+def serve(server, content, etag='"v1"'):
+    path = "/resstock_amy2018_release_1/timeseries_aggregates/by_state/upgrade=0/state=CA/up00-ca-mobile_home.csv"
+    server.files["/2022" + path] = (content, etag)
+
+
+def csv_read(content):
+    df = pd.read_csv(io.BytesIO(content), index_col=3)
+    df.index = pd.to_datetime(df.index)
+    return df
+
+
+def test_parquet_read_equals_csv_read(tmp_path, server):
+    content = make_csv()
+    serve(server, content)
+    api = make_api(tmp_path, server)
+    first = api.get_data_resstock_by_state("CA", "mobile_home")
+    # read again from the Parquet file
+    second = api.get_data_resstock_by_state("CA", "mobile_home")
+    pd.testing.assert_frame_equal(first, csv_read(content))
+    pd.testing.assert_frame_equal(second, csv_read(content))
+    assert server.downloads == 1
+
+
+def test_float32_only_changes_energy_columns(tmp_path, server):
+    content = make_csv()
+    serve(server, content)
+    df = make_api(tmp_path, server, float32=True).get_data_resstock_by_state("CA", "mobile_home")
+    expected = csv_read(content)
+    for column in df.columns:
+        if column in ENERGY_COLUMNS:
+            assert df[column].dtype == np.float32
+            np.testing.assert_array_equal(df[column], expected[column].astype(np.float32))
+        else:
+            pd.testing.assert_series_equal(df[column], expected[column])
+
+    # float64 and float32 copies are kept side by side
+    df64 = make_api(tmp_path, server).get_data_resstock_by_state("CA", "mobile_home")
+    pd.testing.assert_frame_equal(df64, expected)
+
+
+def test_derived_files_removed_on_download(tmp_path, server):
+    serve(server, make_csv(seed=0))
+    api = make_api(tmp_path, server)
+    api.get_data_resstock_by_state("CA", "mobile_home")
+    make_api(tmp_path, server, float32=True).get_data_resstock_by_state("CA", "mobile_home")
+    entry_dir = api.cache.entry_dir(api._key("resstock", "by_state", 0, "CA", "mobile_home"))
+    assert sorted(os.listdir(entry_dir)) == ["up00-ca-mobile_home.csv", "up00-ca-mobile_home.float32.parquet",
+                                             "up00-ca-mobile_home.parquet"]
+
+    content = make_csv(seed=1)
+    serve(server, content, etag='"v2"')
+    df = api.get_data_resstock_by_state("CA", "mobile_home")
+    pd.testing.assert_frame_equal(df, csv_read(content))
+    # the float32 copy of the old file is gone
+    assert sorted(os.listdir(entry_dir)) == ["up00-ca-mobile_home.csv", "up00-ca-mobile_home.parquet"]
+
+
+def test_columns_only_reads_requested_columns(tmp_path, server, monkeypatch):
+    content = make_csv()
+    serve(server, content)
+    api = make_api(tmp_path, server)
+    api.get_data_resstock_by_state("CA", "mobile_home")
+
+    read_columns = []
+    read_parquet = pd.read_parquet
+
+    def spy(path, columns=None, **kwargs):
+        read_columns.append(columns)
+        return read_parquet(path, columns=columns, **kwargs)
+
+    monkeypatch.setattr(pd, "read_parquet", spy)
+    # unknown names (e.g. columns of another release) are ignored, as is the timestamp index
+    requested = ["timestamp", ENERGY_COLUMNS[1], "out.unknown.energy_consumption.kwh", ENERGY_COLUMNS[0]]
+    df = api.get_data_resstock_by_state("CA", "mobile_home", columns=requested)
+
+    assert read_columns == [[ENERGY_COLUMNS[1], ENERGY_COLUMNS[0]]]
+    pd.testing.assert_frame_equal(df, csv_read(content)[[ENERGY_COLUMNS[1], ENERGY_COLUMNS[0]]])
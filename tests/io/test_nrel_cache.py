@@ -0,0 +1,149 @@
+"""Tests of the NREL API cache against a local HTTP server standing in for the data lake."""
+import os
+import multiprocessing
+import warnings
+
+import pytest
+
+from sg2t.io.loadshapes.nrel.cache import APICache, DEFAULT_CONFIG
+
+
+def make_cache(tmp_path, **kwargs):
+    settings = {"max_size_mb": 1, "max_age": 3600, "offline": False}
+    settings.update(kwargs)
+    return APICache(cache_dir=str(tmp_path / "cache"), **settings)
+
+
+def test_fetch_within_max_age_does_not_access_server(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    cache = make_cache(tmp_path)
+    filename = cache.fetch(server.url("/a.csv"), "a")
+    assert open(filename, "rb").read() == b"a,b\n1,2\n"
+    assert cache.fetch(server.url("/a.csv"), "a") == filename
+    assert (server.downloads, server.not_modified) == (1, 0)
+
+
+def test_revalidation_not_modified_keeps_cached_file(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    cache = make_cache(tmp_path, max_age=0)
+    filename = cache.fetch(server.url("/a.csv"), "a")
+    derived = os.path.join(cache.entry_dir("a"), "a.parquet")
+    open(derived, "wb").close()
+
+    assert cache.fetch(server.url("/a.csv"), "a") == filename
+    assert (server.downloads, server.not_modified) == (1, 1)
+    assert os.path.exists(derived)
+    assert cache.entry("a")["etag"] == '"v1"'
+
+
+def test_revalidation_changed_file_is_downloaded_again(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    cache = make_cache(tmp_path, max_age=0)
+    cache.fetch(server.url("/a.csv"), "a")
+    derived = os.path.join(cache.entry_dir("a"), "a.parquet")
+    open(derived, "wb").close()
+
+    server.files["/a.csv"] = (b"a,b\n3,4\n5,6\n", '"v2"')
+    filename = cache.fetch(server.url("/a.csv"), "a")
+    assert open(filename, "rb").read() == b"a,b\n3,4\n5,6\n"
+    assert server.downloads == 2
+    assert cache.entry("a")["etag"] == '"v2"'
+    # Files derived from the old copy are removed
+    assert not os.path.exists(derived)
+
+
+def test_lru_eviction(tmp_path, server):
+    for name in "abc":
+        server.files[f"/{name}.csv"] = (name.encode() * 600, f'"{name}"')
+    cache = make_cache(tmp_path, max_size_mb=1500 / 1024 / 1024)
+    cache.fetch(server.url("/a.csv"), "a")
+    cache.fetch(server.url("/b.csv"), "b")
+    # a is now more recently used than b
+    cache.fetch(server.url("/a.csv"), "a")
+    cache.fetch(server.url("/c.csv"), "c")
+
+    assert cache.entry("b") is None
+    assert not os.path.exists(cache.entry_dir("b"))
+    assert cache.entry("a") is not None
+    assert cache.entry("c") is not None
+
+
+def test_offline(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    filename = make_cache(tmp_path).fetch(server.url("/a.csv"), "a")
+
+    cache = make_cache(tmp_path, max_age=0, offline=True)
+    assert cache.fetch(server.url("/a.csv"), "a") == filename
+    assert (server.downloads, server.not_modified) == (1, 0)
+    with pytest.raises(FileNotFoundError):
+        cache.fetch(server.url("/b.csv"), "b")
+
+
+def test_stale_copy_served_when_server_unreachable(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    cache = make_cache(tmp_path, max_age=0)
+    url = server.url("/a.csv")
+    filename = cache.fetch(url, "a")
+    server.close()
+
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        assert cache.fetch(url, "a") == filename
+    assert any("Could not revalidate" in str(warning.message) for warning in caught)
+
+
+def test_config_without_cache_section_uses_defaults(tmp_path):
+    cache = APICache(config_key="io.nrel.missing", cache_dir=str(tmp_path / "cache"))
+    assert cache.config == DEFAULT_CONFIG
+    assert cache.max_size_mb == DEFAULT_CONFIG["max_size_mb"]
+
+
+def corrupt(filename):
+    """Change the content of a file, keeping its size."""
+    with open(filename, "r+b") as f:
+        first = f.read(1)
+        f.seek(0)
+        f.write(b"x" if first != b"x" else b"y")
+
+
+def test_corrupted_copy_is_downloaded_again_on_revalidation(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    cache = make_cache(tmp_path, max_age=0)
+    filename = cache.fetch(server.url("/a.csv"), "a")
+    corrupt(filename)
+
+    with pytest.warns(UserWarning, match="checksum"):
+        assert cache.fetch(server.url("/a.csv"), "a") == filename
+    assert open(filename, "rb").read() == b"a,b\n1,2\n"
+    assert (server.downloads, server.not_modified) == (2, 0)
+
+
+def test_corrupted_copy_is_not_served_offline(tmp_path, server):
+    server.files["/a.csv"] = (b"a,b\n1,2\n", '"v1"')
+    filename = make_cache(tmp_path).fetch(server.url("/a.csv"), "a")
+    corrupt(filename)
+
+    cache = make_cache(tmp_path, offline=True)
+    with pytest.warns(UserWarning, match="checksum"), pytest.raises(FileNotFoundError):
+        cache.fetch(server.url("/a.csv"), "a")
+
+
+def update_entries(cache_dir, worker, n_entries):
+    cache = APICache(cache_dir=cache_dir, max_size_mb=1, max_age=3600, offline=False)
+    for i in range(n_entries):
+        cache._update_entry(f"{worker}/{i}", {"filename": "x", "size": 0, "fetched": 0, "accessed": 0})
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="index is only locked across processes with fcntl")
+def test_index_updates_from_several_processes(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=update_entries, args=(cache_dir, worker, 50)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    assert all(process.exitcode == 0 for process in processes)
+
+    index = APICache(cache_dir=cache_dir)._load_index()
+    assert sorted(index) == sorted(f"{worker}/{i}" for worker in range(4) for i in range(50))
@@ -0,0 +1,174 @@
+"""Tests of ResStock._format_data against the column-by-column implementation
+it replaced, with a benchmark of both (marked slow), and of the chunked
+ResStock.iter_data against get_data and of ResStock.get_dataset."""
+import contextlib
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from sg2t.io.loadshapes.nrel.resstock import ResStock
+from sg2t.io.loadshapes.nrel.mapping import get_map
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data", "resstock_tmy3_loads")
+METADATA_FILE = os.path.join(os.path.dirname(__file__), "..", "..", "sg2t", "io", "loadshapes", "nrel", "resstock.json")
+
+
+def columnwise_format(raw_data, keys_map):
+    """Previous implementation of ResStock._format_data (without its prints)."""
+    data = pd.DataFrame(columns=list(keys_map.keys()))
+    for key in list(keys_map.keys()):
+        data[key] = raw_data[keys_map[key]]
+    data["Datetime"] = ResStock.make_datetime(data["Datetime"])
+    data.sort_values("Datetime", inplace=True, ascending=True)
+    data.set_index("Datetime", inplace=True, drop=True)
+    return data
+
+
+def format_data(raw_data, resstock=None):
+    resstock = resstock or ResStock(metadata_file=METADATA_FILE)
+    resstock.data = raw_data
+    resstock._format_data()
+    return resstock.data
+
+
+@pytest.fixture
+def raw_data():
+    return pd.read_parquet(os.path.join(DATA_DIR, "AL_bldg_100066-0.parquet"))
+
+
+@pytest.mark.parametrize("order", ["sorted", "shuffled", "strings"])
+def test_format_data_matches_columnwise(raw_data, order):
+    if order == "shuffled":
+        raw_data = raw_data.sample(frac=1, random_state=0)
+    elif order == "strings":
+        raw_data = raw_data.assign(timestamp=raw_data["timestamp"].dt.strftime("%Y-%m-%d %H:%M:%S"))
+    expected = columnwise_format(raw_data, get_map(METADATA_FILE))
+    result = format_data(raw_data)
+    pd.testing.assert_frame_equal(result, expected, check_index_type=False, check_freq=False)
+    assert result.index.is_monotonic_increasing
+
+
+@pytest.fixture
+def row_groups_file(raw_data, tmp_path):
+    """The test building file, written in several row groups."""
+    filename = str(tmp_path / "AL_bldg_100066-0.parquet")
+    pq.write_table(pa.Table.from_pandas(raw_data), filename, row_group_size=10000)
+    assert pq.ParquetFile(filename).num_row_groups == 4
+    return filename
+
+
+@pytest.mark.parametrize("batch_size", [None, 1000, 7777, 100000])
+@pytest.mark.parametrize("row_groups", [False, True])
+def test_iter_data_matches_get_data(row_groups_file, batch_size, row_groups):
+    filename = row_groups_file if row_groups else os.path.join(DATA_DIR, "AL_bldg_100066-0.parquet")
+    expected = ResStock(metadata_file=METADATA_FILE).get_data(filename)
+
+    resstock = ResStock(metadata_file=METADATA_FILE)
+    chunks = list(resstock.iter_data(filename, batch_size=batch_size))
+    if batch_size is not None:
+        assert all(len(chunk) <= batch_size for chunk in chunks)
+    n_chunks = 4 if row_groups else 1
+    if batch_size is None:
+        assert len(chunks) == n_chunks
+    pd.testing.assert_frame_equal(pd.concat(chunks), expected, check_freq=False)
+    assert resstock.bldg_id == 100066
+    assert resstock.metadata["file"]["Building ID"] == 100066
+    assert resstock.metadata["columns"] == get_map(METADATA_FILE)
+
+
+def test_iter_data_missing_file(tmp_path):
+    resstock = ResStock(metadata_file=METADATA_FILE)
+    with pytest.raises(FileNotFoundError):
+        next(resstock.iter_data(str(tmp_path / "missing.parquet")))
+
+
+def write_buildings(path, n_buildings=3):
+    """Synthetic building files with the mapped columns and a bldg_id index;
+    the last building is missing the first day. Returns the data of all buildings."""
+    keys_map = get_map(METADATA_FILE)
+    rng = np.random.default_rng(0)
+    buildings = []
+    for i in range(n_buildings):
+        timestamps = pd.date_range("2018-01-01 00:15", "2018-01-08 00:00", freq="15min")
+        if i == n_buildings - 1:
+            timestamps = timestamps[96:]
+        data = pd.DataFrame({col: rng.random(len(timestamps)) for col in keys_map.values() if col != "timestamp"})
+        data.insert(0, "timestamp", timestamps)
+        data.index = pd.Index(np.full(len(data), 100000 + i), name="bldg_id")
+        data.to_parquet(os.path.join(path, f"AL_bldg_{100000 + i}-0.parquet"))
+        buildings.append(data)
+    return pd.concat(buildings)
+
+
+def expected_dataset(buildings, start=None, end=None, aggregation=None):
+    """Row-by-row selection and pandas aggregation of the building data."""
+    keys_map = get_map(METADATA_FILE)
+    mask = np.ones(len(buildings), dtype=bool)
+    if start is not None:
+        mask &= buildings["timestamp"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= buildings["timestamp"] < pd.Timestamp(end)
+    buildings = buildings[mask]
+    if aggregation is None:
+        data = buildings.reset_index().set_index("timestamp").sort_index(kind="stable")
+        data = data.rename(columns={"bldg_id": "Building ID"})
+    else:
+        data = buildings.groupby("timestamp").agg(aggregation)
+    data = data.rename(columns={value: key for key, value in keys_map.items()})
+    data.index.name = "Datetime"
+    return data[[key for key in keys_map if key != "Datetime"] + (["Building ID"] if aggregation is None else [])]
+
+
+@pytest.mark.parametrize("aggregation", [None, "sum", "mean"])
+@pytest.mark.parametrize("dates", [(None, None), ("2018-01-02", "2018-01-05"), ("2018-01-03 12:00", None), (None, "2018-01-01 06:00")])
+def test_get_dataset(tmp_path, aggregation, dates):
+    buildings = write_buildings(tmp_path)
+    expected = expected_dataset(buildings, *dates, aggregation)
+    result = ResStock(metadata_file=METADATA_FILE).get_dataset(str(tmp_path), *dates, aggregation=aggregation)
+    assert len(result)
+    # [start, end)
+    if dates[0] is not None:
+        assert result.index[0] == pd.Timestamp(dates[0])
+    if dates[1] is not None:
+        assert result.index[-1] < pd.Timestamp(dates[1])
+    pd.testing.assert_frame_equal(result, expected, check_index_type=False, check_dtype=False, check_exact=False, rtol=1e-12)
+
+
+def test_get_dataset_glob_and_errors(tmp_path):
+    buildings = write_buildings(tmp_path)
+    resstock = ResStock(metadata_file=METADATA_FILE)
+    result = resstock.get_dataset(str(tmp_path / "AL_bldg_100000-*.parquet"))
+    assert (result["Building ID"] == 100000).all()
+    assert len(result) == (buildings.index == 100000).sum()
+    with pytest.raises(ValueError):
+        resstock.get_dataset(str(tmp_path), aggregation="max")
+    with pytest.raises(ValueError):
+        resstock.get_dataset(str(tmp_path), start="2019-01-01", aggregation="sum")
+    with pytest.raises(FileNotFoundError):
+        resstock.get_dataset(str(tmp_path / "missing"))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("order", ["sorted", "shuffled"])
+def test_format_data_benchmark(raw_data, order, median_time):
+    if order == "shuffled":
+        raw_data = raw_data.sample(frac=1, random_state=0)
+    keys_map = get_map(METADATA_FILE)
+
+    def columnwise():
+        # the previous implementation printed the raw data and mapping
+        with contextlib.redirect_stdout(io.StringIO()):
+            print(raw_data.head(1))
+            print(raw_data["timestamp"])
+            columnwise_format(raw_data, keys_map)
+
+    before = median_time(columnwise, repeat=10)
+    resstock = ResStock(metadata_file=METADATA_FILE)
+    after = median_time(lambda: format_data(raw_data, resstock), repeat=10)
+    print(f"\nResStock._format_data, {order} {raw_data.shape[0]} rows x {raw_data.shape[1]} columns: "
+          f"column by column {before * 1e3:.1f} ms, one step {after * 1e3:.1f} ms")
@@ -0,0 +1,104 @@
+"""Tests of TMY3Catalog.nearest against a brute-force haversine search,
+and of the catalog cached in the sg2t cache."""
+import os
+
+import numpy as np
+import pytest
+
+from sg2t.io.weather.tmy3 import catalog as catalog_module
+from sg2t.io.weather.tmy3.catalog import EARTH_RADIUS, TMY3Catalog
+
+
+def write_stations(data_dir, latitudes, longitudes, first=0):
+    """TMY3 files with only the station line, listed in the index. Returns their filenames."""
+    filenames = []
+    for i, (lat, lon) in enumerate(zip(latitudes, longitudes), start=first):
+        filename = f"XX-Station_{i:04d}.tmy3"
+        with open(os.path.join(data_dir, filename), "wt") as f:
+            f.write(f'{700000 + i},"STATION {i}",XX,-8.0,{float(lat)!r},{float(lon)!r},{i}\n')
+        filenames.append(filename)
+    index_filename = os.path.join(data_dir, ".index")
+    existing = open(index_filename).read().split() if os.path.exists(index_filename) else []
+    with open(index_filename, "wt") as f:
+        f.write("\n".join(existing + filenames) + "\n")
+    return filenames
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(a))
+
+
+@pytest.fixture
+def stations(tmp_path, monkeypatch):
+    """Data directory with 300 random stations, and its cache directory."""
+    monkeypatch.setattr(catalog_module, "cache_dir", str(tmp_path / "cache"))
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    rng = np.random.default_rng(0)
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, 300)))
+    longitudes = rng.uniform(-180, 180, 300)
+    write_stations(data_dir, latitudes, longitudes)
+    return str(data_dir), latitudes, longitudes
+
+
+@pytest.mark.parametrize("k", [1, 3, 10])
+def test_nearest_matches_haversine(stations, k):
+    data_dir, latitudes, longitudes = stations
+    catalog = TMY3Catalog(data_dir)
+    rng = np.random.default_rng(1)
+    queries = np.column_stack([np.degrees(np.arcsin(rng.uniform(-1, 1, 50))), rng.uniform(-180, 180, 50)])
+    queries = np.vstack([queries, [[90, 0], [-90, 0], [0, 180], [latitudes[7], longitudes[7]]]])
+
+    result = catalog.nearest(queries[:, 0], queries[:, 1], k=k)
+    assert len(result) == len(queries) * k
+    assert (result["location"].to_numpy() == np.repeat(np.arange(len(queries)), k)).all()
+    for i, (lat, lon) in enumerate(queries):
+        distances = haversine(lat, lon, latitudes, longitudes)
+        expected = np.argsort(distances, kind="stable")[:k]
+        rows = result[result["location"] == i]
+        assert rows["station_number"].tolist() == (700000 + expected).tolist()
+        assert np.allclose(rows["distance"].to_numpy(), distances[expected], rtol=1e-9, atol=1e-6)
+        assert rows["distance"].is_monotonic_increasing
+
+
+def test_nearest_scalar(stations):
+    data_dir, latitudes, longitudes = stations
+    catalog = TMY3Catalog(data_dir)
+    distances = haversine(37.4, -122.2, latitudes, longitudes)
+    expected = np.argsort(distances)[:4]
+
+    result = catalog.nearest(37.4, -122.2, k=4)
+    assert (result["location"] == 0).all()
+    assert result["filename"].tolist() == [f"XX-Station_{i:04d}.tmy3" for i in expected]
+    assert np.allclose(result["distance"].to_numpy(), distances[expected], rtol=1e-9)
+    assert np.allclose(result[["latitude", "longitude"]].to_numpy(),
+                       np.column_stack([latitudes[expected], longitudes[expected]]))
+
+    # k is capped to the number of stations
+    assert len(catalog.nearest(37.4, -122.2, k=1000)) == len(latitudes)
+
+
+def test_catalog_rebuilt_when_index_is_newer(stations):
+    data_dir, latitudes, longitudes = stations
+    catalog = TMY3Catalog(data_dir)
+    catalog_filename = catalog._catalog_filename()
+    assert os.path.exists(catalog_filename)
+    assert len(catalog.stations) == len(latitudes)
+
+    # an index older than the cached table: the table is read, not rebuilt
+    saved = os.stat(catalog_filename).st_mtime_ns
+    assert len(TMY3Catalog(data_dir).stations) == len(latitudes)
+    assert os.stat(catalog_filename).st_mtime_ns == saved
+
+    # a new station, with an index newer than the cached table
+    write_stations(data_dir, [10.0], [20.0], first=len(latitudes))
+    index_filename = os.path.join(data_dir, ".index")
+    os.utime(index_filename, ns=(saved + 10**9, saved + 10**9))
+    catalog = TMY3Catalog(data_dir)
+    assert len(catalog.stations) == len(latitudes) + 1
+    nearest = catalog.nearest(10.0, 20.0)
+    assert nearest["station_number"].tolist() == [700000 + len(latitudes)]
+    assert nearest["distance"].iloc[0] == pytest.approx(0, abs=1e-6)
+    assert os.stat(catalog_filename).st_mtime_ns > saved
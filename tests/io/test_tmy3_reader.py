@@ -0,0 +1,74 @@
+"""Tests of the single-pass TMY3 reader against pandas parsing of the file."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.io.weather.tmy3.reader import (DATE_COLUMN, TIME_COLUMN, make_tmy3_datetime,
+                                         read_tmy3, read_tmy3_station)
+
+TMY3_FILE = os.path.join(os.path.dirname(__file__), "data", "tmy3", "US", "AK-Adak_Nas.tmy3")
+
+
+def pandas_datetime(dates, times):
+    """TMY3 datetimes parsed by pandas, rolling 24:00 to 00:00 of the next day."""
+    dates, times = pd.Series(dates), pd.Series(times)
+    midnight = times == "24:00"
+    datetimes = pd.to_datetime(dates + " " + times.where(~midnight, "00:00"), format="%m/%d/%Y %H:%M")
+    return (datetimes + pd.to_timedelta(midnight.astype(int), unit="D")).to_numpy()
+
+
+def test_read_tmy3_matches_pandas():
+    station, data = read_tmy3(TMY3_FILE)
+    assert station == {"station_number": 704540, "station_name": "ADAK NAS", "state": "AK",
+                       "tzoffset": -10.0, "latitude": 51.883, "longitude": -176.650, "elevation": 5.0}
+    assert read_tmy3_station(TMY3_FILE) == station
+
+    expected = pd.read_csv(TMY3_FILE, skiprows=1)
+    assert len(data) == len(expected) == 8760
+    pd.testing.assert_frame_equal(data.drop(columns="Datetime"), expected)
+    assert np.array_equal(data["Datetime"].to_numpy(), pandas_datetime(expected[DATE_COLUMN], expected[TIME_COLUMN]))
+
+
+def test_read_tmy3_columns():
+    _, data = read_tmy3(TMY3_FILE, columns=["Dry-bulb (C)", "RHum (%)", DATE_COLUMN])
+    assert list(data.columns) == [DATE_COLUMN, TIME_COLUMN, "Dry-bulb (C)", "RHum (%)", "Datetime"]
+    assert data["RHum (%)"].dtype == float
+    _, all_data = read_tmy3(TMY3_FILE)
+    pd.testing.assert_frame_equal(data, all_data[data.columns], check_dtype=False)
+
+
+def test_make_tmy3_datetime_rolls_24_00_forward():
+    dates = ["12/31/1998", "12/31/1998", "02/28/2000", "02/28/2001", "06/30/2005", "01/01/1998"]
+    times = ["23:00", "24:00", "24:00", "24:00", "24:00", "00:30"]
+    result = make_tmy3_datetime(pd.Series(dates), pd.Series(times))
+    expected = pd.to_datetime(["1998-12-31 23:00", "1999-01-01 00:00", "2000-02-29 00:00",
+                               "2001-03-01 00:00", "2005-07-01 00:00", "1998-01-01 00:30"]).to_numpy()
+    assert result.dtype == np.dtype("datetime64[ns]")
+    assert np.array_equal(result, expected)
+    assert np.array_equal(result, pandas_datetime(dates, times))
+
+
+@pytest.mark.parametrize("date, time", [
+    ("1/01/1998", "01:00"),
+    ("01-01-1998", "01:00"),
+    ("01/01/98", "01:00"),
+    ("01/01/1998 ", "01:00"),
+    ("0a/01/1998", "01:00"),
+    ("", "01:00"),
+    ("13/01/1998", "01:00"),
+    ("00/01/1998", "01:00"),
+    ("01/00/1998", "01:00"),
+    ("01/32/1998", "01:00"),
+    ("01/01/1998", "1:00"),
+    ("01/01/1998", "01.00"),
+    ("01/01/1998", "ab:00"),
+    ("01/01/1998", "25:00"),
+    ("01/01/1998", "01:60"),
+])
+def test_make_tmy3_datetime_malformed(date, time):
+    dates = pd.Series(["01/01/1998", date])
+    times = pd.Series(["01:00", time])
+    with pytest.raises(ValueError):
+        make_tmy3_datetime(dates, times)
@@ -0,0 +1,103 @@
+"""Tests of the on-disk WeatherCache of formatted TMY3 data: a round trip
+through TMY3.get_data and each of the changes that invalidate a cache file."""
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.io.weather.tmy3 import cache as cache_module
+from sg2t.io.weather.tmy3 import mapping
+from sg2t.io.weather.tmy3.cache import WeatherCache
+from sg2t.io.weather.tmy3.tmy3 import TMY3
+
+TMY3_FILE = os.path.join(os.path.dirname(__file__), "data", "tmy3", "US", "AK-Adak_Nas.tmy3")
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    """A copy of the test TMY3 file, with the sg2t cache in tmp_path."""
+    monkeypatch.setenv("SG2T_CACHE", str(tmp_path / "cache"))
+    filename = str(tmp_path / "AK-Adak_Nas.tmy3")
+    shutil.copy(TMY3_FILE, filename)
+    return filename
+
+
+def cached(filename, kind="tmy3"):
+    return WeatherCache().load(filename, kind)[0] is not None
+
+
+def test_get_data_round_trip(source):
+    fresh = TMY3()
+    expected = fresh.get_data(source, use_cache=False)
+    assert not cached(source)
+
+    first = TMY3()
+    data = first.get_data(source)
+    assert cached(source)
+    second = TMY3()
+    cached_data = second.get_data(source)
+
+    for result, tmy3 in [(data, first), (cached_data, second)]:
+        pd.testing.assert_frame_equal(result, expected)
+        assert tmy3.metadata["station"] == fresh.metadata["station"]
+        assert tmy3.metadata["columns"] == fresh.metadata["columns"]
+        assert tmy3.metadata["col_units"] == fresh.metadata["col_units"]
+        assert tmy3.station_name == fresh.station_name == "ADAK NAS"
+        assert tmy3.latitude == fresh.latitude
+
+
+def test_save_load(source):
+    cache = WeatherCache()
+    data = pd.DataFrame({"a": np.arange(5.0), "b": list("abcde")},
+                        index=pd.date_range("2018-01-01", periods=5, freq="h", name="Datetime"))
+    info = {"station": {"station_number": np.int64(1), "latitude": 1.5}, "keys_map": {"a": "A"}}
+    assert cache.load(source, "tmy3") == (None, None)
+    cache.save(source, "tmy3", data, info)
+    loaded, loaded_info = cache.load(source, "tmy3")
+    pd.testing.assert_frame_equal(loaded, data, check_freq=False)
+    assert loaded_info == {"station": {"station_number": 1, "latitude": 1.5}, "keys_map": {"a": "A"}}
+    # no partial files left
+    assert [name.endswith(".feather") for name in os.listdir(cache.cache_dir)] == [True]
+    # another type of data of the same file
+    assert not cached(source, "tmy3_stock")
+
+
+def test_invalidated_by_source_mtime(source):
+    TMY3().get_data(source)
+    assert cached(source)
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert not cached(source)
+
+
+def test_invalidated_by_source_size(source):
+    TMY3().get_data(source)
+    stat = os.stat(source)
+    with open(source, "at") as f:
+        f.write("\n")
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert os.stat(source).st_size != stat.st_size
+    assert not cached(source)
+
+
+def test_invalidated_by_mapping(source, monkeypatch):
+    TMY3().get_data(source)
+    load_metadata = mapping.load_metadata
+
+    def edited_metadata(filename):
+        md = load_metadata(filename)
+        md["col_units"] = {**md["col_units"], "RHum (%)": "percent"}
+        return md
+
+    monkeypatch.setattr(mapping, "load_metadata", edited_metadata)
+    assert not cached(source)
+    monkeypatch.setattr(mapping, "load_metadata", load_metadata)
+    assert cached(source)
+
+
+def test_invalidated_by_mapping_version(source, monkeypatch):
+    TMY3().get_data(source)
+    monkeypatch.setattr(cache_module, "MAPPING_VERSION", mapping.MAPPING_VERSION + 1)
+    assert not cached(source)
@@ -0,0 +1,84 @@
+"""Tests of LoadshapeRollup: checkpoints, resume after failures and restart."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.loadshape.loadshape_nrel import LoadshapeNrel
+from sg2t.loadshape.rollup import LoadshapeRollup
+
+COLUMNS = ["out.electricity.cooling.energy_consumption.kwh", "out.electricity.heating.energy_consumption.kwh"]
+
+
+class GetData:
+    """Stands in for an API get_data method: a year of 15-minute float32 data per (location, type),
+    counting calls and failing for the given tasks."""
+    def __init__(self, fail=()):
+        self.fail = set(fail)
+        self.calls = []
+
+    def __call__(self, location, type_, columns=None, cube=False):
+        self.calls.append((location, type_))
+        if (location, type_) in self.fail:
+            raise IOError(f"Could not pull {location}, {type_}")
+        index = pd.date_range("2018-01-01 00:15", "2019-01-01 00:00", freq="15min", name="timestamp")
+        rng = np.random.default_rng(abs(hash((location, type_))) % 2 ** 32)
+        return pd.DataFrame(rng.random((len(index), len(COLUMNS))).astype(np.float32), index=index, columns=COLUMNS)
+
+
+LOCATIONS = ["CA", "OR"]
+TYPES = ["mobile_home", "single-family_detached"]
+
+
+@pytest.fixture
+def rollup(tmp_path):
+    return LoadshapeRollup(LoadshapeNrel(max_workers=2), checkpoint_dir=str(tmp_path))
+
+
+def expected_total(rollup, get_data):
+    df = 0
+    for location in LOCATIONS:
+        df_location = 0
+        for type_ in TYPES:
+            df_location += rollup.loadshape.loadshape(get_data, location, type_)
+        df += df_location
+    return df
+
+
+def test_run_removes_checkpoints(rollup):
+    get_data = GetData()
+    df = rollup.run("test", get_data, LOCATIONS, TYPES)
+    pd.testing.assert_frame_equal(df, expected_total(rollup, GetData()))
+    assert (df.dtypes == np.float32).all()
+    assert not os.path.exists(rollup.rollup_dir("test"))
+
+
+def test_resume_after_failure(rollup):
+    failing = GetData(fail=[("OR", "mobile_home")])
+    with pytest.raises(Exception, match="1 of 4 loadshapes failed"):
+        rollup.run("test", failing, LOCATIONS, TYPES)
+    assert len(os.listdir(rollup.rollup_dir("test"))) == 3
+
+    get_data = GetData()
+    df = rollup.run("test", get_data, LOCATIONS, TYPES)
+    # only the failed loadshape is pulled again, the others are read from their checkpoints
+    assert get_data.calls == [("OR", "mobile_home")]
+    # same result and dtypes as an uninterrupted run
+    pd.testing.assert_frame_equal(df, rollup.run("other", GetData(), LOCATIONS, TYPES))
+    assert not os.path.exists(rollup.rollup_dir("test"))
+
+
+def test_restart_discards_checkpoints(rollup):
+    with pytest.raises(Exception):
+        rollup.run("test", GetData(fail=[("CA", "mobile_home")]), LOCATIONS, TYPES)
+
+    get_data = GetData()
+    rollup.run("test", get_data, LOCATIONS, TYPES, restart=True)
+    assert sorted(get_data.calls) == sorted((location, type_) for location in LOCATIONS for type_ in TYPES)
+
+
+def test_rollup_dir_depends_on_settings(rollup):
+    rollup_dir = rollup.rollup_dir("test")
+    rollup.loadshape.nrel_api.float32 = not rollup.loadshape.nrel_api.float32
+    assert rollup.rollup_dir("test") != rollup_dir
@@ -0,0 +1,77 @@
+"""Fixtures of the sg2t.transportation tests: a small synthetic SPEECh data set
+(pg and pz tables and segment GMMs) with the layout of the Original16 one."""
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.transportation.speech import DataSetConfigurations, SPEECh, SPEEChGeneralConfiguration
+
+COVARIANCE_TYPES = ["full", "tied", "diag", "spherical"]
+
+
+def make_gmm(covariance_type, rng, energy=10.0, n_components=3):
+    """GaussianMixture of (start time in s, energy in kWh, duration in s), set up without fitting."""
+    from sklearn.mixture import GaussianMixture
+
+    gmm = GaussianMixture(n_components, covariance_type=covariance_type, random_state=0)
+    gmm.weights_ = rng.dirichlet(np.full(n_components, 3.0))
+    gmm.means_ = np.column_stack([rng.uniform(6, 20, n_components) * 3600,
+                                  rng.uniform(0.5, 1.5, n_components) * energy,
+                                  rng.uniform(1, 8, n_components) * 3600])
+
+    def covariance():
+        sd = np.array([rng.uniform(0.5, 3) * 3600, rng.uniform(0.3, 0.6) * energy, 3600])
+        correlation = np.eye(3)
+        correlation[0, 1] = correlation[1, 0] = rng.uniform(-0.6, 0.6)
+        correlation[1, 2] = correlation[2, 1] = 0.3
+        return correlation * np.outer(sd, sd)
+
+    if covariance_type == "full":
+        gmm.covariances_ = np.stack([covariance() for _ in range(n_components)])
+    elif covariance_type == "tied":
+        gmm.covariances_ = covariance()
+    elif covariance_type == "diag":
+        gmm.covariances_ = np.stack([np.diag(covariance()) for _ in range(n_components)])
+    else:
+        # one variance for all the features: start times within minutes of the mean
+        gmm.covariances_ = (rng.uniform(0.3, 0.6, n_components) * energy) ** 2
+    return gmm
+
+
+@pytest.fixture(scope="session")
+def speech_data(tmp_path_factory):
+    """Path to the data (path_to_data of DataSetConfigurations) of a synthetic Original16 data set.
+    Driver group g has GMMs of covariance type COVARIANCE_TYPES[g % 4], and some segments have no GMM."""
+    pytest.importorskip("sklearn")
+    path_to_data = tmp_path_factory.mktemp("speech")
+    data = DataSetConfigurations("Original16", path_to_data=str(path_to_data) + "/")
+    os.makedirs(data.folder + "GMMs")
+    rng = np.random.default_rng(0)
+
+    pd.DataFrame({"pg": rng.dirichlet(np.full(data.ng, 5.0))}).to_csv(data.folder + "pg.csv", index=False)
+    for g in range(data.ng):
+        for weekday, zkey in [("weekday", data.zkey_weekday), ("weekend", data.zkey_weekend)]:
+            pz = pd.DataFrame({cat + zkey: rng.uniform(0, 0.6, 50) for cat in data.categories})
+            pz.to_csv(data.folder + f"pz_{weekday}_g_{g}.csv", index=False)
+            for i, cat in enumerate(data.categories):
+                if (g + i) % 7 == 0:
+                    continue
+                gmm = make_gmm(COVARIANCE_TYPES[g % 4], rng, energy=25.0 if cat == "Other Fast" else 10.0)
+                with open(data.folder + f"GMMs/{weekday}_{data.gmm_names[cat]}_{g}.p", "wb") as f:
+                    pickle.dump(gmm, f)
+    return str(path_to_data) + "/"
+
+
+@pytest.fixture
+def make_config(speech_data):
+    """Makes a SPEECh general configuration of the synthetic data set for n_evs EVs."""
+    def make_config(n_evs=1600):
+        data = DataSetConfigurations("Original16", path_to_data=speech_data)
+        config = SPEEChGeneralConfiguration(SPEECh(data))
+        config.num_evs(n_evs)
+        config.groups()
+        return config
+    return make_config
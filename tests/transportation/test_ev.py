@@ -0,0 +1,120 @@
+"""Tests of the seeded realizations and Monte Carlo ensembles of EV loadshapes
+on the synthetic SPEECh data set (see conftest.py)."""
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.io.loadshapes.ev import EV
+
+
+def reseed_global_state():
+    np.random.seed(int(np.random.default_rng().integers(2**31)))
+
+
+def test_run_realization_seeded(make_config):
+    config = make_config()
+    numbers = copy.deepcopy({g: group.segment_session_numbers for g, group in config.group_configs.items()})
+    first = config.run_realization(seed=np.random.SeedSequence(7))
+    reseed_global_state()
+    second = config.run_realization(seed=7)
+    assert first.keys() == set(config.speech.data.labels)
+    for key, val in first.items():
+        assert np.array_equal(second[key], val)
+    assert sum(val.sum() for val in first.values()) > 0
+    other = config.run_realization(seed=8)
+    assert not all(np.array_equal(other[key], val) for key, val in first.items())
+    # the configuration isn't changed
+    assert {g: group.segment_session_numbers for g, group in config.group_configs.items()} == numbers
+
+
+def test_run_realization_draws_session_numbers(make_config):
+    config = make_config()
+    totals = [sum(val.sum() for val in config.run_realization(seed=seed).values()) for seed in range(5)]
+    assert len(set(totals)) == 5
+
+
+@pytest.fixture
+def ev():
+    ev = EV(total_evs=1600)
+    ev.weekday_option = "weekend"
+    return ev
+
+
+def test_ensemble_independent_of_workers(ev, make_config):
+    expected = ev.generate_ensemble(12, seed=11, config=make_config(), max_workers=1).copy()
+    expected_peaks = ev.ensemble_peaks.copy()
+    for max_workers in [4, None]:
+        reseed_global_state()
+        result = ev.generate_ensemble(12, seed=11, config=make_config(), max_workers=max_workers)
+        pd.testing.assert_frame_equal(result, expected, check_exact=True)
+        pd.testing.assert_frame_equal(ev.ensemble_peaks, expected_peaks, check_exact=True)
+    result = ev.generate_ensemble(12, seed=12, config=make_config(), max_workers=1)
+    assert not result.equals(expected)
+
+
+def test_ensemble_statistics(ev, make_config):
+    # few realizations, for which the quantiles are exact
+    n_realizations, quantiles = 5, (0, 0.25, 0.5, 1)
+    config = make_config()
+    ensemble = ev.generate_ensemble(n_realizations, seed=2, quantiles=quantiles, config=config, max_workers=2)
+
+    labels = list(config.speech.data.labels)
+    hourly = []
+    for seed in np.random.SeedSequence(2).spawn(n_realizations):
+        loads = config.run_realization(ev.weekday_option, seed)
+        loads = np.column_stack([loads[label] for label in labels])
+        loads = np.column_stack([loads, loads.sum(axis=1)])
+        hourly.append(loads.reshape(24, 60, -1).mean(axis=1))
+    hourly = np.stack(hourly)
+
+    assert list(ensemble.index) == list(range(24))
+    assert list(ensemble.columns.get_level_values("Segment").unique()) == labels + ["Total"]
+    for i, segment in enumerate(labels + ["Total"]):
+        np.testing.assert_allclose(ensemble[segment, "mean"], hourly[..., i].mean(axis=0), rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(ensemble[segment, "std"], hourly[..., i].std(axis=0, ddof=1), rtol=1e-9, atol=1e-9)
+        assert np.array_equal(ensemble[segment, "min"], hourly[..., i].min(axis=0))
+        assert np.array_equal(ensemble[segment, "max"], hourly[..., i].max(axis=0))
+        for q in quantiles:
+            np.testing.assert_allclose(ensemble[segment, f"p{100 * q:g}"], np.quantile(hourly[..., i], q, axis=0))
+
+    peaks = hourly.max(axis=1)
+    np.testing.assert_allclose(ev.ensemble_peaks["mean"], peaks.mean(axis=0), rtol=1e-12)
+    assert np.array_equal(ev.ensemble_peaks["max"], peaks.max(axis=0))
+
+
+def test_ensemble_errors(ev, make_config):
+    with pytest.raises(ValueError):
+        ev.generate_ensemble(0, config=make_config())
+    with pytest.raises(ValueError):
+        ev.generate_ensemble(3, quantiles=(0.5, 1.2), config=make_config())
+
+
+def test_generate_days(ev, make_config):
+    loads = ev.generate_days("2023-03-03", "2023-03-07", seed=4, chunk_days=2, config=make_config())
+    assert list(loads.columns) == ev.config.speech.data.labels
+    assert loads.index.name == "Datetime"
+    assert (loads.index == pd.date_range("2023-03-03", periods=5 * 24, freq="h")).all()
+    assert (loads.to_numpy() >= 0).all() and loads.to_numpy().sum() > 0
+
+    # chunk_days doesn't change the result
+    same = ev.generate_days("2023-03-03", "2023-03-07", seed=4, chunk_days=5, config=make_config())
+    pd.testing.assert_frame_equal(same, loads, check_exact=True)
+
+    # 15-minute loads average to the hourly ones
+    quarters = ev.generate_days("2023-03-03", "2023-03-07", freq="15min", seed=4, config=make_config())
+    assert len(quarters) == 4 * len(loads)
+    np.testing.assert_allclose(quarters.to_numpy().reshape(-1, 4, loads.shape[1]).mean(axis=1), loads.to_numpy(),
+                               rtol=1e-12, atol=1e-12)
+    np.testing.assert_allclose(quarters.resample("h").mean().to_numpy(), loads.to_numpy(), rtol=1e-12, atol=1e-12)
+
+
+def test_generate_days_errors(ev, make_config):
+    # end before start
+    with pytest.raises(ValueError, match="End"):
+        ev.generate_days("2023-03-07", "2023-03-03", config=make_config())
+    # frequencies that don't divide a day, or aren't a multiple of the minute time step
+    for freq in ["7min", "90s", "5h"]:
+        with pytest.raises(ValueError, match="Frequency"):
+            ev.generate_days("2023-03-03", "2023-03-04", freq=freq, config=make_config())
@@ -0,0 +1,293 @@
+"""Tests of the SPEECh load calculations against the implementations they replaced,
+and of seeded simulations on a synthetic data set (see conftest.py)."""
+import gc
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.transportation import speech
+from sg2t.transportation.speech import (LoadProfile, clear_gmm_registry, expected_session_load, sample_gmm,
+                                        session_end_times_and_load, timeline_sessions_load)
+from tests.transportation.conftest import COVARIANCE_TYPES, make_gmm
+
+
+def loop_end_times_and_load(start_times, energies, rate, time_steps_per_hour, num_time_steps):
+    """Previous implementation of LoadProfile.end_times_and_load, one session at a time."""
+    load = np.zeros((num_time_steps,))
+    end_times = np.zeros(np.shape(start_times)).astype(int)
+
+    lengths = (time_steps_per_hour * energies / rate).astype(int)
+    extra_charges = energies - lengths * rate / time_steps_per_hour
+    inds1 = np.where((start_times + lengths) > num_time_steps)[0]
+    inds2 = np.delete(np.arange(0, np.shape(end_times)[0]), inds1)
+
+    end_times[inds1] = (np.minimum(
+        start_times[inds1].astype(int) + lengths[inds1] - num_time_steps,
+        num_time_steps)).astype(int)
+    end_times[inds2] = (start_times[inds2] + lengths[inds2]).astype(int)
+    inds3 = np.where(end_times >= num_time_steps)[0]
+    inds4 = np.delete(np.arange(0, np.shape(end_times)[0]), inds3)
+
+    for i in range(len(inds1)):
+        idx = int(inds1[i])
+        load[np.arange(int(start_times[idx]),
+                       num_time_steps)] += rate * np.ones(
+            (num_time_steps - int(start_times[idx]),))
+        load[np.arange(0, end_times[idx])] += rate * np.ones(
+            (end_times[idx],))
+    for i in range(len(inds2)):
+        idx = int(inds2[i])
+        load[np.arange(int(start_times[idx]),
+                       end_times[idx])] += rate * np.ones((lengths[idx],))
+    load[0] += np.sum(extra_charges[inds3] * time_steps_per_hour)
+    for i in range(len(inds4)):
+        load[end_times[int(inds4[i])]] += extra_charges[int(
+            inds4[i])] * time_steps_per_hour
+
+    return end_times, load
+
+
+def random_sessions(n_sessions, rate, time_steps_per_hour, num_time_steps, seed, max_days=0.9, zeros=0.1):
+    """Start times and energies of sessions lasting up to max_days days, with a fraction of zero-energy ones."""
+    rng = np.random.default_rng(seed)
+    start_times = rng.integers(0, num_time_steps, n_sessions)
+    energies = rng.uniform(0, max_days * 24 * rate, n_sessions)
+    energies[rng.random(n_sessions) < zeros] = 0
+    # sessions of a whole number of time steps, without extra charge
+    whole = rng.random(n_sessions) < 0.1
+    energies[whole] = np.round(energies[whole] * time_steps_per_hour / rate) * rate / time_steps_per_hour
+    return start_times, energies
+
+
+@pytest.mark.parametrize("rate", [6.6, 7.2, 150])
+@pytest.mark.parametrize("max_days", [0.2, 0.9, 3])
+@pytest.mark.parametrize("time_steps_per_hour, num_time_steps", [(60, 1440), (4, 96)])
+@pytest.mark.parametrize("seed", range(3))
+def test_session_load_matches_loop(rate, max_days, time_steps_per_hour, num_time_steps, seed):
+    start_times, energies = random_sessions(500, rate, time_steps_per_hour, num_time_steps, seed, max_days)
+    expected_end_times, expected_load = loop_end_times_and_load(
+        start_times, energies, rate, time_steps_per_hour, num_time_steps)
+    end_times, load = session_end_times_and_load(start_times, energies, rate, time_steps_per_hour, num_time_steps)
+    # bit-identical
+    assert np.array_equal(end_times, expected_end_times)
+    assert np.array_equal(load, expected_load)
+
+
+@pytest.mark.parametrize("start_times, energies", [
+    # wraparound past midnight, ending exactly at midnight, and starting at the last time step
+    ([1400, 1380, 1439], [10.0, 6.6, 0.05]),
+    # longer than a day, and longer than two days
+    ([600, 5], [200.0, 400.0]),
+    # zero energy only
+    ([0, 700, 1439], [0.0, 0.0, 0.0]),
+    # no sessions
+    ([], []),
+])
+@pytest.mark.parametrize("rate", [6.6, 150])
+def test_session_load_edge_cases(start_times, energies, rate):
+    start_times, energies = np.array(start_times, dtype=int), np.array(energies, dtype=float)
+    expected_end_times, expected_load = loop_end_times_and_load(start_times, energies, rate, 60, 1440)
+    end_times, load = session_end_times_and_load(start_times, energies, rate, 60, 1440)
+    assert np.array_equal(end_times, expected_end_times)
+    assert np.array_equal(load, expected_load)
+    # the energy of the sessions is kept, except the full days of sessions longer than a day
+    lengths = (60 * energies / rate).astype(int)
+    if (lengths <= 1440).all():
+        assert load.sum() / 60 == pytest.approx(energies.sum())
+
+
+@pytest.mark.parametrize("covariance_type", COVARIANCE_TYPES)
+def test_sample_gmm_moments(covariance_type):
+    pytest.importorskip("sklearn")
+    gmm = make_gmm(covariance_type, np.random.default_rng(1))
+    n_samples = 200_000
+    samples = sample_gmm(gmm, n_samples, np.random.default_rng(0))
+    expected = gmm.sample(n_samples)[0]
+    assert samples.shape == expected.shape == (n_samples, 3)
+
+    # same mixture: means within a few standard errors, covariances within a few percent
+    sd = expected.std(axis=0)
+    assert np.all(np.abs(samples.mean(axis=0) - expected.mean(axis=0)) < 5 * sd * np.sqrt(2 / n_samples))
+    covariance, expected_covariance = np.cov(samples.T), np.cov(expected.T)
+    assert np.allclose(covariance, expected_covariance, rtol=0.03, atol=0.03 * np.outer(sd, sd))
+    assert np.allclose(np.quantile(samples, [0.1, 0.5, 0.9], axis=0),
+                       np.quantile(expected, [0.1, 0.5, 0.9], axis=0), rtol=0, atol=0.02 * sd)
+
+    # draws only from rng: reproducible, and the model isn't changed
+    state = gmm.random_state
+    assert np.array_equal(sample_gmm(gmm, 1000, np.random.default_rng(5)), sample_gmm(gmm, 1000, np.random.default_rng(5)))
+    assert gmm.random_state == state
+
+
+def test_run_all_seeded_independent_of_workers(make_config):
+    config = make_config()
+    config.run_all(seed=3, max_workers=1)
+    expected = {key: val.copy() for key, val in config.total_load_dict.items()}
+    expected_groups = {g: dict(val) for g, val in config.all_load_dicts.items()}
+    assert sum(val.sum() for val in expected.values()) > 0
+
+    for kwargs in [dict(max_workers=4), dict(max_workers=2, use_processes=True),
+                   dict(max_workers=1, seed=np.random.SeedSequence(3))]:
+        kwargs.setdefault("seed", 3)
+        # the global random state isn't used
+        np.random.seed(int(np.random.default_rng().integers(2**31)))
+        config.run_all(**kwargs)
+        assert config.total_load_dict.keys() == expected.keys()
+        for key, val in expected.items():
+            assert np.array_equal(config.total_load_dict[key], val), kwargs
+        for g, loads in expected_groups.items():
+            for key, val in loads.items():
+                assert np.array_equal(config.all_load_dicts[g][key], val), kwargs
+        assert np.array_equal(config.total_load_segments, np.column_stack(list(expected.values())))
+
+    config.run_all(seed=4, max_workers=1)
+    assert not all(np.array_equal(config.total_load_dict[key], val) for key, val in expected.items())
+
+
+def monte_carlo_session_load(gmm, rate, energy_clip, n_sessions, seed):
+    """Mean load per session of n_sessions sampled like in LoadProfile.calculate_load (minutes, start times in s)."""
+    output = sample_gmm(gmm, n_sessions, np.random.default_rng(seed))
+    start_times = (np.mod(output[:, 0], 24 * 3600) / 60).astype(int)
+    energies = np.clip(np.abs(output[:, 1]), 0, energy_clip)
+    return session_end_times_and_load(start_times, energies, rate, 60, 1440)[1] / n_sessions
+
+
+@pytest.mark.parametrize("covariance_type", COVARIANCE_TYPES)
+@pytest.mark.parametrize("energy, energy_clip, rate", [
+    (10, 100, 6.6),
+    # many sessions clipped to the energy clip
+    (10, 12, 6.6),
+    # many negative energy parameters, folded to their absolute value, and clipped
+    (None, 8, 6.6),
+    (25, 100, 150),
+])
+def test_expected_session_load_matches_monte_carlo(covariance_type, energy, energy_clip, rate):
+    pytest.importorskip("sklearn")
+    gmm = make_gmm(covariance_type, np.random.default_rng(3), energy=energy or 10)
+    if energy is None:
+        gmm.means_[:, 1] = 1.0
+    expected = expected_session_load(gmm, rate, energy_clip, 60, 1440, 1 / 60, 24 * 3600)
+    result = monte_carlo_session_load(gmm, rate, energy_clip, 400_000, seed=0)
+    # energy of a session, in kWh
+    assert expected.sum() / 60 == pytest.approx(result.sum() / 60, rel=2e-3)
+    hourly = lambda load: load.reshape(24, 60).mean(axis=1)
+    assert np.abs(hourly(expected) - hourly(result)).max() < 0.02 * hourly(expected).max()
+
+
+def test_expected_session_load_errors():
+    pytest.importorskip("sklearn")
+    gmm = make_gmm("full", np.random.default_rng(3))
+    # the start time scaler has to map a day to the time steps
+    with pytest.raises(ValueError, match="start time scaler"):
+        expected_session_load(gmm, 6.6, 100, 60, 1440, 1 / 30, 24 * 3600)
+    # sessions of up to 200 kWh at 6.6 kW last more than a day
+    with pytest.raises(ValueError, match="shorter than a day"):
+        expected_session_load(gmm, 6.6, 200, 60, 1440, 1 / 60, 24 * 3600)
+
+
+def test_run_all_expected(make_config):
+    config = make_config()
+    for kwargs in [dict(seed=1), dict(max_workers=2), dict(use_processes=True)]:
+        with pytest.raises(ValueError):
+            config.run_all(expected=True, **kwargs)
+
+    config.run_all(expected=True)
+    expected = {key: val.copy() for key, val in config.total_load_dict.items()}
+    # the mean of many realizations, with the session numbers drawn again in each
+    realizations = [config.run_realization(seed=seed) for seed in range(100)]
+    for key, val in expected.items():
+        mean = np.mean([realization[key] for realization in realizations], axis=0)
+        if not val.any():
+            assert not mean.any()
+            continue
+        assert mean.sum() == pytest.approx(val.sum(), rel=0.03)
+        assert np.abs(mean.reshape(24, 60).mean(axis=1) - val.reshape(24, 60).mean(axis=1)).max() < 0.1 * val.max()
+
+
+def test_expected_session_loads_cached(make_config, monkeypatch):
+    clear_gmm_registry()
+    calls = []
+
+    def counted(*args):
+        calls.append(args[0])
+        return expected_session_load(*args)
+
+    monkeypatch.setattr(speech, "expected_session_load", counted)
+    config = make_config()
+    config.run_all(expected=True)
+    n_calls = len(calls)
+    assert n_calls and len(set(map(id, calls))) == n_calls
+    assert all(gmm in speech._expected_session_loads for gmm in calls)
+
+    # reused by other configurations sharing the GMMs
+    other = make_config(n_evs=800)
+    other.run_all(expected=True)
+    assert len(calls) == n_calls
+
+    # changed weights are calculated again
+    g, cat = next((g, cat) for g in range(16) for cat in config.speech.data.categories
+                  if config.speech.has_gmm('weekday', cat, g))
+    group = config.group_configs[g]
+    model = LoadProfile(config, group, weekday='weekday')
+    model.calculate_expected_load()
+    before = dict(model.load_segments_dict)
+    config.change_ps_zg(g, cat, 'weekday', {0: 0.9})
+    model.calculate_expected_load()
+    assert len(calls) == n_calls + 1
+    label = config.speech.data.labels[config.speech.data.categories.index(cat)]
+    assert not np.array_equal(model.load_segments_dict[label], before[label])
+
+    # entries go away with the GMM objects
+    del calls[:], config, other, group, model
+    clear_gmm_registry()
+    gc.collect()
+    assert len(speech._expected_session_loads) == 0
+
+
+@pytest.mark.parametrize("rate", [6.6, 150])
+@pytest.mark.parametrize("num_days", [1, 2, 3])
+def test_timeline_load_folds_to_circular_load(rate, num_days):
+    # sessions shorter than a day, which wrap around midnight once in the circular load
+    start_times, energies = random_sessions(2000, rate, 60, 1440, seed=num_days, max_days=0.95)
+    end_times, circular = session_end_times_and_load(start_times, energies, rate, 60, 1440)
+    timeline = timeline_sessions_load(start_times, energies, rate, 60, num_days * 1440)
+    if num_days == 1:
+        # sessions past midnight are cut
+        assert np.all(timeline <= circular + 1e-9)
+        return
+    folded = timeline.reshape(num_days, 1440).sum(axis=0)
+    np.testing.assert_allclose(folded, circular, rtol=1e-12, atol=1e-9)
+    assert not timeline[2 * 1440:].any()
+
+
+@pytest.mark.parametrize("chunk_days", [1, 3, 7, 30])
+def test_iter_days_independent_of_chunks(make_config, chunk_days):
+    config = make_config()
+    dates = pd.date_range("2023-03-01", "2023-03-10")
+    expected = np.concatenate(list(config.iter_days(dates, seed=5, chunk_days=10)))
+    chunks = list(config.iter_days(dates, seed=5, chunk_days=chunk_days))
+    assert [len(chunk) for chunk in chunks[:-1]] == [chunk_days * 1440] * (len(chunks) - 1)
+    assert np.array_equal(np.concatenate(chunks), expected)
+    assert expected.shape == (len(dates) * 1440, config.speech.data.num_categories)
+    # the sessions of the lead-in day and of the previous days go on past midnight
+    assert expected[0].sum() > 0
+
+
+def test_iter_days_carries_sessions_over(make_config):
+    config = make_config()
+    dates = pd.date_range("2023-03-01", "2023-03-04")
+    seeds = np.random.SeedSequence(9).spawn(len(dates) + 1)
+    margin = int(60 * config.energy_clip / min(config.speech.data.rates)) // 1440 + 1
+    # each day's sessions on a timeline from that day, added at their offsets
+    expected = np.zeros(((len(dates) + 1 + margin) * 1440, config.speech.data.num_categories))
+    for i, day in enumerate([dates[0] - pd.Timedelta(days=1)] + list(dates)):
+        expected[i * 1440:(i + 1 + margin) * 1440] += config._day_load(day, seeds[i], 1 + margin)
+    result = np.concatenate(list(config.iter_days(dates, seed=9, chunk_days=2)))
+    np.testing.assert_allclose(result, expected[1440:(len(dates) + 1) * 1440], rtol=1e-12, atol=1e-12)
+
+
+def test_iter_days_errors(make_config):
+    config = make_config()
+    with pytest.raises(ValueError):
+        next(config.iter_days(pd.DatetimeIndex(["2023-03-01", "2023-03-03"])))
@@ -0,0 +1,74 @@
+"""Tests of the running moments and quantiles against NumPy on the full samples."""
+import numpy as np
+import pytest
+
+from sg2t.utils.accumulators import RunningMoments, RunningQuantiles
+
+
+@pytest.mark.parametrize("n_samples", [1, 2, 7, 500])
+def test_moments_match_numpy(n_samples):
+    rng = np.random.default_rng(0)
+    samples = rng.normal(1e3, 5, (n_samples, 24, 6))
+    moments = RunningMoments()
+    for sample in samples:
+        moments.update(sample)
+    assert moments.count == n_samples
+    np.testing.assert_allclose(moments.mean, samples.mean(axis=0), rtol=1e-12)
+    assert np.array_equal(moments.min, samples.min(axis=0))
+    assert np.array_equal(moments.max, samples.max(axis=0))
+    if n_samples < 2:
+        assert np.isnan(moments.var).all() and np.isnan(moments.std).all()
+    else:
+        np.testing.assert_allclose(moments.var, samples.var(axis=0, ddof=1), rtol=1e-9)
+        np.testing.assert_allclose(moments.std, samples.std(axis=0, ddof=1), rtol=1e-9)
+
+
+def test_moments_do_not_keep_the_samples():
+    moments = RunningMoments()
+    sample = np.zeros(3)
+    moments.update(sample)
+    moments.update(np.ones(3))
+    assert np.array_equal(sample, np.zeros(3))
+    assert np.array_equal(moments.mean, np.full(3, 0.5))
+
+
+@pytest.mark.parametrize("n_samples", [1, 3, 5])
+def test_quantiles_exact_for_few_samples(n_samples):
+    samples = np.random.default_rng(0).standard_normal((n_samples, 10))
+    quantiles = RunningQuantiles((0, 0.1, 0.5, 0.9, 1))
+    for sample in samples:
+        quantiles.update(sample)
+    assert np.array_equal(quantiles.result(), np.quantile(samples, quantiles.quantiles, axis=0))
+
+
+def samples_and_quantiles(n_samples, quantiles, n_elements=2000, seed=0):
+    samples = np.random.default_rng(seed).standard_normal((n_samples, n_elements))
+    running = RunningQuantiles(quantiles)
+    for sample in samples:
+        running.update(sample)
+    return samples, running.result()
+
+
+def test_quantiles_min_max_exact():
+    samples, result = samples_and_quantiles(300, (0, 0.5, 1))
+    assert np.array_equal(result[0], samples.min(axis=0))
+    assert np.array_equal(result[2], samples.max(axis=0))
+
+
+@pytest.mark.parametrize("n_samples, mean_error, error_95", [(100, 0.08, 0.25), (400, 0.05, 0.12)])
+def test_quantiles_error(n_samples, mean_error, error_95):
+    # see the RunningQuantiles docstring for the measured errors
+    quantiles = (0.1, 0.5, 0.9)
+    samples, result = samples_and_quantiles(n_samples, quantiles)
+    errors = np.abs(result - np.quantile(samples, quantiles, axis=0)) / samples.std(axis=0)
+    assert (errors.mean(axis=1) < mean_error).all()
+    assert (np.quantile(errors, 0.95, axis=1) < error_95).all()
+
+
+def test_quantiles_errors():
+    with pytest.raises(ValueError):
+        RunningQuantiles((0.5, 1.5))
+    with pytest.raises(ValueError):
+        RunningQuantiles((-0.1,))
+    with pytest.raises(ValueError):
+        RunningQuantiles().result()
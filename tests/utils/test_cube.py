@@ -0,0 +1,92 @@
+"""Tests of LoadshapeCube.reduce against Timeseries.timeseries_aggregate,
+and of the cube cached next to a Parquet data file."""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.utils.cube import LoadshapeCube
+from sg2t.utils.timeseries import Timeseries
+from tests.utils.test_timeseries import make_data
+
+
+def hourly_max(df, month_start=1, month_end=12, daytype=None):
+    """Max of each hour of the day, selected like in Timeseries.timeseries_aggregate."""
+    df = df[:-1]
+    df = df[(df.index.month >= month_start) & (df.index.month < month_end)]
+    if daytype == "weekday":
+        df = df[df.index.weekday <= 4]
+    elif daytype == "weekend":
+        df = df[df.index.weekday > 4]
+    df = df.groupby(df.index.hour).max()
+    # hours range from the first to the last with data
+    if len(df):
+        df = df.reindex(range(df.index[0], df.index[-1] + 1))
+    return df.reset_index(drop=True)
+
+
+@pytest.fixture(scope="module")
+def data():
+    df = make_data()
+    df.iloc[::97, 1] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("aggregation", ["avg", "sum", "max"])
+@pytest.mark.parametrize("months", [(1, 12), (1, 2), (6, 9), (1, 13), (3, 3)])
+@pytest.mark.parametrize("daytype", [None, "weekday", "weekend"])
+def test_reduce_matches_aggregate(data, aggregation, months, daytype):
+    cube = LoadshapeCube.from_dataframe(data)
+    if aggregation == "max":
+        expected = hourly_max(data, *months, daytype)
+    else:
+        expected = Timeseries.timeseries_aggregate(data, aggregation, *months, daytype)
+    result = cube.reduce(aggregation, *months, daytype)
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize("aggregation", ["avg", "sum", "max"])
+def test_reduce_empty_selection(data, aggregation):
+    weekends = data[data.index.weekday > 4]
+    result = LoadshapeCube.from_dataframe(weekends).reduce(aggregation, daytype="weekday")
+    assert result.shape == (0, data.shape[1])
+    assert list(result.columns) == list(data.columns)
+
+
+def test_reduce_keeps_float32_and_columns(data):
+    cube = LoadshapeCube.from_dataframe(data.astype(np.float32))
+    result = cube.reduce(columns=["column 2", "missing", "Electricity Total"])
+    assert list(result.columns) == ["column 2", "Electricity Total"]
+    assert (result.dtypes == np.float32).all()
+
+
+def test_save_load(data, tmp_path):
+    cube = LoadshapeCube.from_dataframe(data)
+    cube.save(tmp_path / "data.cube.npz")
+    loaded = LoadshapeCube.load(tmp_path / "data.cube.npz")
+    pd.testing.assert_frame_equal(loaded.reduce("sum", 6, 9), cube.reduce("sum", 6, 9))
+    assert os.listdir(tmp_path) == ["data.cube.npz"]
+
+
+def test_cached_rebuilds_stale_cube(tmp_path):
+    filename = str(tmp_path / "data.parquet")
+    cube_filename = str(tmp_path / "data.cube.npz")
+    make_data(seed=0).to_parquet(filename)
+    first = LoadshapeCube.cached(filename)
+    assert os.path.exists(cube_filename)
+
+    # an up to date cube is loaded, not rebuilt
+    saved = os.stat(cube_filename).st_mtime_ns
+    pd.testing.assert_frame_equal(LoadshapeCube.cached(filename).reduce(), first.reduce())
+    assert os.stat(cube_filename).st_mtime_ns == saved
+
+    # a cube older than the data file is rebuilt
+    new_data = make_data(seed=1)
+    new_data.to_parquet(filename)
+    os.utime(cube_filename, ns=(saved, saved))
+    os.utime(filename, ns=(saved + 10**9, saved + 10**9))
+    result = LoadshapeCube.cached(filename)
+    expected = Timeseries.timeseries_aggregate(new_data)
+    pd.testing.assert_frame_equal(result.reduce(), expected, check_exact=False, rtol=1e-12)
+    pd.testing.assert_frame_equal(LoadshapeCube.load(cube_filename).reduce(), result.reduce())
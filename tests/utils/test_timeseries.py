@@ -0,0 +1,98 @@
+"""Tests of Timeseries.timeseries_aggregate against the groupby/resample
+implementation it replaced, with a benchmark of both (marked slow)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.utils.timeseries import Timeseries
+
+
+def groupby_aggregate(df, aggregation="avg", month_start=1, month_end=12, daytype=None):
+    """Previous implementation of Timeseries.timeseries_aggregate ('avg' and 'sum')."""
+    df = df[:-1]
+    df = df[df.index.month.isin([i for i in range(month_start, month_end)])]
+    if daytype == "weekday":
+        df = df[df.index.weekday <= 4]
+    elif daytype == "weekend":
+        df = df[df.index.weekday > 4]
+    grouped = df.groupby([df.index.hour, df.index.minute])
+    df_aggregated = grouped.mean(numeric_only=True) if aggregation == "avg" else grouped.sum(numeric_only=True)
+    df_aggregated.index.names = ["hour", "minute"]
+    df_aggregated = df_aggregated.reset_index()
+    df_aggregated["datetime"] = pd.to_datetime(
+        df_aggregated["hour"].astype(str) + ":" + df_aggregated["minute"].astype(str), format="%H:%M")
+    df_aggregated = df_aggregated.set_index("datetime")
+    df_resampled = df_aggregated.resample("h").mean()
+    df_resampled = df_resampled.drop(["hour", "minute"], axis=1)
+    return df_resampled.reset_index(drop=True)
+
+
+def make_data(n_columns=5, freq="15min", seed=0):
+    """A year of random data, including the first data point of the next year."""
+    index = pd.date_range("2018-01-01 00:15", "2019-01-01 00:00", freq=freq)
+    rng = np.random.default_rng(seed)
+    columns = ["Electricity Total"] + [f"column {i}" for i in range(1, n_columns)]
+    return pd.DataFrame(rng.random((len(index), n_columns)), index=index, columns=columns)
+
+
+@pytest.mark.parametrize("aggregation", ["avg", "sum"])
+@pytest.mark.parametrize("months", [(1, 12), (1, 2), (6, 9), (1, 13)])
+@pytest.mark.parametrize("daytype", [None, "weekday", "weekend"])
+def test_aggregate_matches_groupby(aggregation, months, daytype):
+    df = make_data()
+    df.iloc[::97, 1] = np.nan
+    expected = groupby_aggregate(df, aggregation, *months, daytype)
+    result = Timeseries.timeseries_aggregate(df, aggregation, *months, daytype)
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-12)
+
+
+def test_aggregate_keeps_float32():
+    df = make_data().astype(np.float32)
+    result = Timeseries.timeseries_aggregate(df)
+    assert (result.dtypes == np.float32).all()
+    assert result.shape == (24, df.shape[1])
+
+
+@pytest.mark.parametrize("aggregation", ["avg", "sum"])
+def test_aggregate_empty_months(aggregation):
+    # month_end is exclusive, so no month is selected
+    df = make_data()
+    expected = groupby_aggregate(df, aggregation, 3, 3)
+    result = Timeseries.timeseries_aggregate(df, aggregation, 3, 3)
+    pd.testing.assert_frame_equal(result, expected)
+    assert result.shape == (0, df.shape[1])
+
+
+@pytest.mark.parametrize("aggregation", ["avg", "sum"])
+def test_aggregate_empty_daytype(aggregation):
+    df = make_data()
+    df = df[df.index.weekday > 4]
+    expected = groupby_aggregate(df, aggregation, daytype="weekday")
+    result = Timeseries.timeseries_aggregate(df, aggregation, daytype="weekday")
+    pd.testing.assert_frame_equal(result, expected)
+    assert result.shape == (0, df.shape[1])
+
+
+def test_aggregate_windows_empty_selections():
+    df = make_data()
+    weekends = df[df.index.weekday > 4]
+    result = Timeseries.timeseries_aggregate_windows(df, [{"aggregation": "sum", "month_start": 3, "month_end": 3}])
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), groupby_aggregate(df, "sum", 3, 3))
+    result = Timeseries.timeseries_aggregate_windows(weekends, [{"daytype": "weekday"}])
+    pd.testing.assert_frame_equal(result.reset_index(drop=True), groupby_aggregate(weekends, daytype="weekday"))
+
+
+@pytest.mark.slow
+def test_aggregate_benchmark(median_time):
+    df = make_data(n_columns=20)
+    before = median_time(lambda: groupby_aggregate(df))
+    after = median_time(lambda: Timeseries.timeseries_aggregate(df))
+    print(f"\ntimeseries_aggregate, {df.shape[0]} rows x {df.shape[1]} columns: "
+          f"groupby {before * 1e3:.1f} ms, bincount {after * 1e3:.1f} ms")
+
+
+def test_make_datetime_rolls_hour_24_forward():
+    series = pd.Series(["12/31/1998 23:00", "12/31/1998 24:00", "01/01/1998 01:00"])
+    result = Timeseries.make_datetime(series, format="%m/%d/%Y %H:%M")
+    expected = pd.to_datetime(["1998-12-31 23:00", "1999-01-01 00:00", "1998-01-01 01:00"])
+    assert (result.to_numpy() == expected.to_numpy()).all()
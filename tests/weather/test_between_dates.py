@@ -0,0 +1,83 @@
+"""Tests of Weather.between_dates against a boolean mask selection."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sg2t.weather.weather import Weather
+
+
+def make_data(shuffle=False, n_stations=1, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(np.tile(pd.date_range("2020-07-01", "2020-07-10 23:00", freq="h"), n_stations),
+                             name="Datetime")
+    data = pd.DataFrame({"Temperature": rng.uniform(10, 35, len(index)),
+                         "Rel Humidity": rng.uniform(10, 90, len(index))}, index=index)
+    if shuffle:
+        data = data.iloc[rng.permutation(len(data))]
+    return data
+
+
+def mask_selection(data, windows, columns=None):
+    """Rows of each window, both end points included, in the order of the windows."""
+    data = data.sort_index(kind="stable")
+    selections = []
+    for start, end in windows:
+        mask = np.ones(len(data), dtype=bool)
+        if start is not None:
+            mask &= data.index >= pd.Timestamp(start)
+        if end is not None:
+            mask &= data.index <= pd.Timestamp(end)
+        selections.append(data[mask])
+    data = pd.concat(selections)
+    return data[columns] if columns else data
+
+
+WINDOWS = [
+    [("2020-07-02", "2020-07-04")],
+    [("2020-07-02 05:00", "2020-07-02 05:00")],
+    [("2020-07-02 05:30", "2020-07-02 06:30")],
+    [(None, "2020-07-03 12:00")],
+    [("2020-07-08", None)],
+    [(None, None)],
+    [("2020-07-05", "2020-07-03")],
+    [("2020-06-01", "2020-06-30")],
+    [("2020-07-02", "2020-07-03"), ("2020-07-06 12:00", "2020-07-07"), ("2020-07-01", "2020-07-01 03:00")],
+    [("2020-07-02", "2020-07-04"), ("2020-07-03", "2020-07-05"), (None, "2020-07-01 01:00")],
+]
+
+
+@pytest.mark.parametrize("windows", WINDOWS)
+@pytest.mark.parametrize("shuffle", [False, True])
+@pytest.mark.parametrize("n_stations", [1, 3])
+def test_windows_match_mask(windows, shuffle, n_stations):
+    data = make_data(shuffle, n_stations)
+    weather = Weather(data)
+    expected = mask_selection(data, windows)
+    pd.testing.assert_frame_equal(weather.between_dates(windows=windows), expected)
+    if len(windows) == 1:
+        pd.testing.assert_frame_equal(weather.between_dates(*windows[0]), expected)
+    # the data itself isn't reordered
+    pd.testing.assert_frame_equal(weather.data, data)
+
+
+def test_columns():
+    data = make_data(shuffle=True)
+    windows = WINDOWS[-2]
+    result = Weather(data).between_dates(columns=["Rel Humidity"], windows=windows)
+    pd.testing.assert_frame_equal(result, mask_selection(data, windows, ["Rel Humidity"]))
+
+
+@pytest.mark.parametrize("windows", WINDOWS)
+def test_date_column(windows):
+    data = make_data(shuffle=True).reset_index().rename(columns={"Datetime": "Date"})
+    result = Weather(data).between_dates(windows=windows)
+    selections = []
+    for start, end in windows:
+        # the start is excluded when selecting on the 'Date' column
+        mask = np.ones(len(data), dtype=bool)
+        if start is not None:
+            mask &= data["Date"] > pd.Timestamp(start)
+        if end is not None:
+            mask &= data["Date"] <= pd.Timestamp(end)
+        selections.append(data[mask])
+    pd.testing.assert_frame_equal(result, pd.concat(selections))
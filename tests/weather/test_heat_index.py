@@ -0,0 +1,40 @@
+"""Tests of Weather.heat_index_array against the scalar Weather.heat_index,
+with a benchmark of both (marked slow)."""
+import numpy as np
+import pytest
+
+from sg2t.weather.weather import Weather
+
+
+def random_points(n=200_000, seed=0):
+    """Temperatures (degrees F) and relative humidities (%) covering both
+    formulas and both regression adjustments."""
+    rng = np.random.default_rng(seed)
+    t = rng.uniform(-20, 130, n)
+    rh = rng.uniform(0, 100, n)
+    # exact boundaries of the adjustments
+    t[:6] = [80, 87, 95, 112, 86.9, 80.1]
+    rh[:6] = [13, 85, 12.9, 85.1, 100, 0]
+    return t, rh
+
+
+def test_heat_index_array_matches_scalar():
+    t, rh = random_points()
+    expected = np.array([Weather.heat_index(t_i, rh_i) for t_i, rh_i in zip(t.tolist(), rh.tolist())])
+    result = Weather.heat_index_array(t, rh)
+    # bit-identical
+    assert np.array_equal(result, expected)
+
+
+@pytest.mark.slow
+def test_heat_index_benchmark(median_time):
+    t, rh = random_points()
+    t_list, rh_list = t.tolist(), rh.tolist()
+
+    def scalar_loop():
+        for t_i, rh_i in zip(t_list, rh_list):
+            Weather.heat_index(t_i, rh_i)
+
+    before = median_time(scalar_loop)
+    after = median_time(lambda: Weather.heat_index_array(t, rh))
+    print(f"\nheat index of {len(t)} points: scalar loop {before * 1e3:.1f} ms, array {after * 1e3:.1f} ms")
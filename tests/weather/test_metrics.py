@@ -0,0 +1,47 @@
+"""Tests of the derived weather metrics cache of Weather.get_metrics."""
+import numpy as np
+import pandas as pd
+
+from sg2t.weather.weather import Weather
+
+
+def make_weather(n_stations=2, n_hours=48, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.DatetimeIndex(np.tile(pd.date_range("2020-07-01", periods=n_hours, freq="h"), n_stations),
+                             name="Datetime")
+    data = pd.DataFrame({
+        "Station": np.repeat([f"station {i}" for i in range(n_stations)], n_hours),
+        "Temperature": rng.uniform(10, 35, n_stations * n_hours),
+        "Rel Humidity": rng.uniform(10, 90, n_stations * n_hours),
+        "Wspd": rng.uniform(0, 10, n_stations * n_hours),
+    }, index=index)
+    return Weather(data)
+
+
+def test_cached_metrics_are_reused():
+    weather = make_weather()
+    first = weather.get_metrics(["Dew Point"], station_column="Station").copy()
+    entries = dict(weather._metrics_cache)
+    second = weather.get_metrics(["Dew Point"], station_column="Station")
+    pd.testing.assert_frame_equal(first, second)
+    # the cached arrays were used, not recomputed
+    assert all(weather._metrics_cache[key][1] is entries[key][1] for key in entries)
+
+
+def test_changed_data_is_recomputed():
+    weather = make_weather()
+    before = weather.get_metrics(["Dew Point"], station_column="Station")["Dew Point"].mean()
+    weather.data["Temperature"] += 10
+    after = weather.get_metrics(["Dew Point"], station_column="Station")["Dew Point"]
+    assert after.mean() != before
+    fresh = make_weather()
+    fresh.data["Temperature"] += 10
+    np.testing.assert_array_equal(after, fresh.get_metrics(["Dew Point"], station_column="Station")["Dew Point"])
+
+
+def test_replaced_data_is_recomputed():
+    weather = make_weather(n_stations=1)
+    before = weather.get_metrics(["Heat Index"])["Heat Index"].to_numpy().copy()
+    weather.data = make_weather(n_stations=1, seed=1).data
+    after = weather.get_metrics(["Heat Index"])["Heat Index"].to_numpy()
+    assert not np.array_equal(before, after)